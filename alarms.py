@@ -0,0 +1,144 @@
+# --------------------------------
+# Written for the Cooler-Shaker System
+# Github: https://github.com/alopez505/cooler_shaker
+# --------------------------------
+#
+# --------------------------------
+# AlarmEngine keeps the alarm status bits of the TC-36-25 and reports when an alarm turns on or off
+#
+# Alarm status bits (TC-36-25 command 05):
+#   bit 0 - High Temperature        bit 4 - Open Input 1 (primary sensor)
+#   bit 1 - Low Temperature         bit 5 - Open Input 2 (secondary sensor)
+#   bit 2 - Computer Controlled     bit 6 - Driver Low Input Voltage
+#   bit 3 - Over Current
+#
+# "update" is given the bits read from the controller. It compares them with the last bits read (raised = bits
+# that turned on, cleared = bits that turned off), logs each change once and records it as an AlarmEvent in a
+# bounded history (the oldest event is dropped when full). Nothing is logged while the alarms stay the same.
+#
+# "changes" counts every alarm that turned on or off since the start (wraps at 65536), so a reader
+# only has to read the alarm history again when it changed.
+#
+# "update" is called from one thread, "events" / "snapshot" may be called from any thread.
+# --------------------------------
+import collections
+import logging
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+ALARM_HIGH_TEMP = 0x01
+ALARM_LOW_TEMP = 0x02
+ALARM_COMPUTER = 0x04
+ALARM_OVER_CURRENT = 0x08
+ALARM_OPEN_INPUT1 = 0x10
+ALARM_OPEN_INPUT2 = 0x20
+ALARM_LOW_VOLTAGE = 0x40
+
+# bit, short name (log and history), message shown in "General Settings"
+ALARMS = [
+    (ALARM_HIGH_TEMP, 'High Temperature', "High Temperature Alarm Detected!"),
+    (ALARM_LOW_TEMP, 'Low Temperature', "Low Temperature Alarm Detected!"),
+    (ALARM_COMPUTER, 'Computer Controlled', "Computer Controlled Alarm Detected!"),
+    (ALARM_OVER_CURRENT, 'Over Current', "Over Current Detected! TEC attempted to draw more current than allowed."),
+    (ALARM_OPEN_INPUT1, 'Open Input 1', "OPEN INPUT1! There is a problem with the primary temperature sensor."),
+    (ALARM_OPEN_INPUT2, 'Open Input 2', "OPEN INPUT2! There is a problem with the secondary temperature sensor."),
+    (ALARM_LOW_VOLTAGE, 'Driver Low Input Voltage',
+     "Driver Low Input Voltage Detected! The controller does not have a high enough voltage to properly operate."),
+]
+ALARM_MASK = 0x7F
+ALARM_NAMES = dict((bit, name) for bit, name, message in ALARMS)
+
+HISTORY_SIZE = 16
+EVENT_REGISTERS = 4     # registers per event, see "events_to_registers"
+
+# time - clock time the change was seen (s since epoch)
+# bit - alarm bit that changed (one of ALARM_*)
+# active - True if the alarm turned on, False if it turned off
+AlarmEvent = collections.namedtuple('AlarmEvent', ['time', 'bit', 'active'])
+
+
+# ----------------
+# "alarm_text" returns the messages of the alarms set in bits, one per line
+# ----------------
+def alarm_text(bits):
+    return "".join(message + "\n" for bit, name, message in ALARMS if bits & bit)
+
+
+# ----------------
+# "event_text" returns one line describing an AlarmEvent (ex: "2026-10-17 14:02:11  High Temperature on")
+# ----------------
+def event_text(event):
+    return "%s  %s %s" % (time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(event.time)),
+                          ALARM_NAMES.get(event.bit, hex(event.bit)), "on" if event.active else "off")
+
+
+# ----------------
+# "events_to_registers" packs alarm events into 16-bit register values, 4 registers per event:
+#   time (2 registers, whole seconds since epoch, high word first), alarm bit, 1 = on / 0 = off
+#
+# Parameter:    events - AlarmEvents, newest first
+#               size - Number of events the registers hold, unused events are all 0
+# ----------------
+def events_to_registers(events, size=HISTORY_SIZE):
+    registers = []
+    for event in events[:size]:
+        seconds = int(event.time) & 0xFFFFFFFF
+        registers += [seconds >> 16, seconds & 0xFFFF, event.bit, int(event.active)]
+    return registers + [0] * (EVENT_REGISTERS * size - len(registers))
+
+
+class AlarmEngine(object):
+
+    # ----------------
+    # Parameter:    size - Number of alarm events kept
+    # ----------------
+    def __init__(self, size=HISTORY_SIZE):
+        self._lock = threading.Lock()
+        self._events = collections.deque(maxlen=size)
+        self.bits = 0           # alarm bits last read
+        self.changes = 0        # alarms turned on or off since the start (16 bit counter)
+
+    # ----------------
+    # "update" compares the bits read from the controller with the last bits read and records the changes
+    #
+    # Parameter:    bits - Alarm status bits read from the controller
+    #               t - Time they were read (s since epoch)
+    #
+    # Return:       raised - Bits that turned on
+    #               cleared - Bits that turned off
+    # ----------------
+    def update(self, bits, t):
+        bits &= ALARM_MASK
+        raised = bits & ~self.bits
+        cleared = self.bits & ~bits
+        if not (raised or cleared):
+            return 0, 0
+        with self._lock:
+            for bit, name, message in ALARMS:
+                if raised & bit:
+                    log.warning(name + " alarm on")
+                    self._events.append(AlarmEvent(t, bit, True))
+                elif cleared & bit:
+                    log.info(name + " alarm off")
+                    self._events.append(AlarmEvent(t, bit, False))
+                else:
+                    continue
+                self.changes = (self.changes + 1) & 0xFFFF
+            self.bits = bits
+        return raised, cleared
+
+    # ----------------
+    # "events" returns the alarm events kept, newest first
+    # ----------------
+    def events(self):
+        with self._lock:
+            return list(reversed(self._events))
+
+    # ----------------
+    # "snapshot" returns the alarm bits, change counter and events (newest first) as read together
+    # ----------------
+    def snapshot(self):
+        with self._lock:
+            return self.bits, self.changes, list(reversed(self._events))
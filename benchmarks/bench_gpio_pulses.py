@@ -0,0 +1,80 @@
+# --------------------------------
+# Fastest step rate MotionEngine reaches on each GPIO backend, with nothing else running
+#
+# Plays one stroke asking for far more steps per second than any backend can make, so every edge is written
+# as soon as the one before is done (the same code path as a shake, deadlines, stop checks and step timing
+# included):
+#
+#   SimulatedGPIO output           - cost of the engine with the per-pin "output" calls (no pins driven)
+#   SimulatedGPIO prepared         - same with prepared pin states
+#   RPi.GPIO output                - one output call per edge (how the motor is stepped with RPi.GPIO)
+#   gpiochip output                - one GpiochipGPIO.output call per edge (one ioctl each)
+#   gpiochip prepared              - prepared DIR + STEP states, one ioctl per edge (how the motor is stepped
+#                                    with the gpiochip backend)
+#
+# Backends that are not available (not on a Raspberry Pi, no access to the pins) are listed as skipped.
+# Run on the Pi as a user that may use the pins (ex: in the "gpio" group), with STEP and DIR unplugged
+# from the motor driver or the motor free to turn.
+#
+# Run from the repository root:
+#   python benchmarks/bench_gpio_pulses.py [steps] [/dev/gpiochipN]
+# --------------------------------
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from gpio_backends import SimulatedGPIO, GpiochipGPIO
+from motion import MotionEngine, step_times, stroke_schedule
+
+DIR = 20
+STEP = 21
+RATE = 1e7          # steps/s asked for, far above what any backend makes
+
+
+def engine_rate(gpio, steps, prepare):
+    engine = MotionEngine(gpio, prepare=prepare)
+    times, duration = step_times(steps, RATE)
+    schedule = stroke_schedule(DIR, STEP, 1, times, duration)
+    engine.prepare(schedule)            # made ahead of time, like MotorService does during the dwell
+    start = time.perf_counter()
+    engine.play(schedule)
+    return steps / (time.perf_counter() - start)
+
+
+def report(name, rate):
+    print("%-26s %9.0f steps/s  (%.2f us per step)" % (name, rate, 1e6 / rate))
+
+
+if __name__ == "__main__":
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    chip = sys.argv[2] if len(sys.argv) > 2 else '/dev/gpiochip0'
+
+    for prepare, name in ((False, "SimulatedGPIO output"), (True, "SimulatedGPIO prepared")):
+        sim = SimulatedGPIO(max_events=1000)
+        sim.setup(DIR, sim.OUT)
+        sim.setup(STEP, sim.OUT)
+        report(name, engine_rate(sim, steps, prepare))
+
+    try:
+        import RPi.GPIO as rpi
+        rpi.setwarnings(False)
+        rpi.setmode(rpi.BCM)
+        rpi.setup([DIR, STEP], rpi.OUT)
+        report("RPi.GPIO output", engine_rate(rpi, steps, False))
+        rpi.cleanup()
+    except (ImportError, RuntimeError) as e:
+        print("%-26s skipped (%s)" % ("RPi.GPIO output", e))
+
+    try:
+        gpio = GpiochipGPIO(chip)
+        gpio.setup(DIR, gpio.OUT)
+        gpio.setup(STEP, gpio.OUT)
+    except OSError as e:
+        print("%-26s skipped (%s: %s)" % ("gpiochip", chip, e.strerror))
+    else:
+        report("gpiochip output", engine_rate(gpio, steps, False))
+        report("gpiochip prepared", engine_rate(gpio, steps, True))
+        gpio.output([DIR, STEP], [0, 0])
+        gpio.cleanup()
@@ -0,0 +1,47 @@
+# --------------------------------
+# Points drawn and query time of MinMaxPyramid for each graph time range, against drawing every sample
+#
+# Fills a pyramid with 24 hours of 4 Hz samples (a slow cool down with noise and one spike) and
+# queries each range of the main screen graph for a 520 pixel wide plot.
+#
+# Run from the repository root:
+#   python benchmarks/bench_graph_decimation.py
+# --------------------------------
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from decimation import MinMaxPyramid
+
+RATE = 4.0
+HORIZON = 24 * 3600
+WIDTH = 520
+RANGES = [('1 min', 60), ('10 min', 600), ('1 hour', 3600), ('6 hours', 6 * 3600), ('24 hours', 24 * 3600)]
+
+
+if __name__ == "__main__":
+    rng = random.Random(1)
+    count = int(HORIZON * RATE)
+    times = [k / RATE for k in range(count)]
+    values = [4.0 + 18.0 * math.exp(-t / 1800.0) + rng.gauss(0.0, 0.02) for t in times]
+    values[count // 2] += 3.0           # spike that must stay visible at every zoom level
+    pyramid = MinMaxPyramid(count)
+    start = time.perf_counter()
+    pyramid.extend(times, values)
+    elapsed = time.perf_counter() - start
+    print("filled %d samples in %.2f s (%.2f us per sample)" % (count, elapsed, elapsed / count * 1e6))
+    now = times[-1]
+    for name, seconds in RANGES:
+        runs = 20
+        start = time.perf_counter()
+        for r in range(runs):
+            x, y, level = pyramid.query(now - seconds, now, WIDTH)
+        elapsed = (time.perf_counter() - start) / runs
+        raw = int(seconds * RATE)
+        spike = values[count // 2] in y if now - seconds <= times[count // 2] else None
+        print("%-9s level %d  points %5d (every sample: %6d)  query %6.2f ms%s" % (
+            name, level, len(x), raw, elapsed * 1e3, "" if spike is None else "  spike shown: " + str(spike)))
@@ -0,0 +1,98 @@
+# --------------------------------
+# Step timing accuracy of MotionEngine against the original MotorWorker loop
+# (GPIO.output + 2 relative time.sleep calls per step), both run on SimulatedGPIO
+#
+# The last line is the interval error the engine measured itself (MotionEngine.step_timing), it should be close
+# to the engine line above (it differs where the engine resynced, the recorder measures against the shifted deadlines)
+#
+# Run from the repository root:
+#   python benchmarks/bench_motion_timing.py [speed] [degrees] [dwell] [cycles]
+# --------------------------------
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from gpio_backends import SimulatedGPIO
+from motion import MotionEngine, shake_schedules, DEG_PER_STEP
+from step_timing import timing_text
+
+DIR = 20
+STEP = 21
+CW = 1
+CCW = 0
+
+
+# ----------------
+# Original MotorWorker.work loop, without the print per step
+# ----------------
+def legacy_run(gpio, speed, dor, dwell, cycles):
+    sec_per_step = 0.1/speed
+    for c in range(cycles):
+        time.sleep(dwell)
+        gpio.output(DIR, CW)
+        for x in range(round(dor/1.8)):
+            gpio.output(STEP, gpio.HIGH)
+            time.sleep(sec_per_step)
+            gpio.output(STEP, gpio.LOW)
+            time.sleep(sec_per_step)
+        time.sleep(dwell)
+        gpio.output(DIR, CCW)
+        for x in range(round(dor/1.8)):
+            gpio.output(STEP, gpio.HIGH)
+            time.sleep(sec_per_step)
+            gpio.output(STEP, gpio.LOW)
+            time.sleep(sec_per_step)
+
+
+def engine_run(gpio, speed, dor, dwell, cycles):
+    engine = MotionEngine(gpio)
+    schedules = shake_schedules(DIR, STEP, speed, dor, dwell, CW, CCW)
+    start = None
+    for c in range(cycles):
+        for schedule in schedules:
+            start = engine.play(schedule, start)
+    return engine
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+
+# ----------------
+# Compares every rising edge with where it should be, measured from the first rising edge
+# ----------------
+def report(name, gpio, speed, dor, dwell, cycles):
+    schedules = shake_schedules(DIR, STEP, speed, dor, dwell, CW, CCW)
+    ideal = []
+    t = 0.0
+    for c in range(cycles):
+        for schedule in schedules:
+            ideal.extend(t + offset for offset, pin, value in schedule.edges if pin == STEP and value)
+            t += schedule.duration
+    actual = gpio.rising_edges(STEP)
+    t0 = actual[0] - ideal[0]
+    errors = [abs((a - t0) - i) * 1e6 for a, i in zip(actual, ideal)]
+    intervals = [(actual[k+1] - actual[k]) - (ideal[k+1] - ideal[k]) for k in range(len(actual) - 1)]
+    interval_errors = [abs(e) * 1e6 for e in intervals]
+    print("%-8s steps %5d  position error p50 %8.1f us  max %9.1f us | interval error p50 %7.1f us  p99 %8.1f us  max %8.1f us" % (
+        name, len(actual), percentile(errors, 50), max(errors),
+        percentile(interval_errors, 50), percentile(interval_errors, 99), max(interval_errors)))
+
+
+if __name__ == "__main__":
+    speed = float(sys.argv[1]) if len(sys.argv) > 1 else 90.0
+    dor = float(sys.argv[2]) if len(sys.argv) > 2 else 90.0
+    dwell = float(sys.argv[3]) if len(sys.argv) > 3 else 0.05
+    cycles = int(sys.argv[4]) if len(sys.argv) > 4 else 3
+    print("speed %.1f deg/s, %.1f deg (%d steps), dwell %.3f s, %d cycles" % (speed, dor, round(dor/DEG_PER_STEP), dwell, cycles))
+    gpio = SimulatedGPIO()
+    legacy_run(gpio, speed, dor, dwell, cycles)
+    report("legacy", gpio, speed, dor, dwell, cycles)
+    gpio = SimulatedGPIO()
+    engine = engine_run(gpio, speed, dor, dwell, cycles)
+    report("engine", gpio, speed, dor, dwell, cycles)
+    print("engine stats: " + str(engine.stats()))
+    print("engine step_timing: " + timing_text(engine.step_timing.snapshot()))
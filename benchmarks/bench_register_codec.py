@@ -0,0 +1,102 @@
+# --------------------------------
+# Micro-benchmark of register_codec against the original string based conversion
+# functions that ServerWorker used (float_to_ieee / ieee745_to_float)
+#
+# Run from the repository root:
+#   python benchmarks/bench_register_codec.py
+# --------------------------------
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from register_codec import floats_to_registers, registers_to_floats
+
+# One Modbus update cycle: 4 holding register floats + 1 input register float
+VALUES = [21.37, 90.0, 360.0, 0.5, -4.18]
+REGISTERS = floats_to_registers(VALUES)
+NUMBER = 2000
+
+
+# ----------------
+# Original ServerWorker.float_to_ieee, kept here as the benchmark baseline
+# ----------------
+def legacy_float_to_ieee(n):
+    sign = '0'
+    if n < 0:
+        sign = '1'
+        n = n * -1
+    elif n == 0.0:
+        return 0, 0
+    whole_num, dec_num = str(n).split('.')
+    dec = str(bin(int(whole_num)))[2:]+'.'
+    for x in range(30):
+        dec_num = str('0.')+dec_num
+        temp = str(float(dec_num)*2)
+        whole_num, dec_num = temp.split('.')
+        dec += whole_num
+    dotPlace = dec.find('.')
+    onePlace = dec.find('1')
+    dec = dec.replace(".", "")
+    dotPlace -= 1
+    if onePlace > dotPlace:
+        onePlace -= 1
+    mantissa = dec[onePlace+1:]
+    mantissa = mantissa[0:23]
+    exp = dotPlace - onePlace
+    exp_bits = exp + 127
+    exp_bits = bin(exp_bits)[2:].zfill(8)
+    ieee_num = sign + exp_bits + mantissa
+    fin1, fin2 = ieee_num[0:16], ieee_num[16:32]
+    return int(fin1, 2), int(fin2, 2)
+
+
+# ----------------
+# Original ServerWorker.ieee745_to_float, including the bin().zfill() string building done in updating_writer
+# ----------------
+def legacy_ieee745_to_float(N):
+    if N == '00000000000000000000000000000000':
+        return 0.0
+    a = int(N[0])
+    b = int(N[1:9], 2)
+    c = int("1"+N[9:], 2)
+    return (-1)**a * c / (1 << (len(N)-9 - (b-127)))
+
+
+def legacy_pack():
+    out = []
+    for v in VALUES:
+        out.extend(legacy_float_to_ieee(v))
+    return out
+
+
+def legacy_unpack():
+    r = REGISTERS
+    return [legacy_ieee745_to_float(bin(r[i]).replace('0b', '').zfill(16)+bin(r[i+1]).replace('0b', '').zfill(16))
+            for i in range(0, len(r), 2)]
+
+
+def codec_pack():
+    return floats_to_registers(VALUES)
+
+
+def codec_unpack():
+    return registers_to_floats(REGISTERS)
+
+
+def report(name, func):
+    best = min(timeit.repeat(func, number=NUMBER, repeat=5))
+    per_call = best / NUMBER
+    print("%-16s %10.2f us/block %12.0f floats/s" % (name, per_call * 1e6, len(VALUES) / per_call))
+    return per_call
+
+
+if __name__ == "__main__":
+    print("Block of %d floats (%d registers), best of 5 x %d calls" % (len(VALUES), len(REGISTERS), NUMBER))
+    old_pack = report("legacy pack", legacy_pack)
+    new_pack = report("codec pack", codec_pack)
+    old_unpack = report("legacy unpack", legacy_unpack)
+    new_unpack = report("codec unpack", codec_unpack)
+    print("pack speedup:   %.1fx" % (old_pack / new_pack))
+    print("unpack speedup: %.1fx" % (old_unpack / new_unpack))
@@ -0,0 +1,49 @@
+# --------------------------------
+# Round trips through the whole temperature controller stack on the simulated TC-36-25
+# (SerialArbiter -> TC36Driver -> TC36Transport -> SimulatedTC36)
+#
+# Polls the current temperature and alarms like the Modbus server does while a set temperature write
+# is submitted now and then, and reports round trips per second and how long each priority waited.
+# The simulator answers right away, so this measures the cost of the program and not of the RS-485 bus.
+#
+# Run from the repository root:
+#   python benchmarks/bench_serial_stack.py [seconds]
+# --------------------------------
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from tc36_sim import SimulatedTC36
+from tc36_transport import TC36Transport
+from tc36_driver import TC36Driver
+from serial_arbiter import SerialArbiter, PRIORITY_SETPOINT, PRIORITY_ALARM, PRIORITY_TEMP
+
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+    sim = SimulatedTC36()
+    arbiter = SerialArbiter(TC36Driver(TC36Transport(sim)))
+    arbiter.start()
+    count = 0
+    end = time.perf_counter() + seconds
+    started = time.perf_counter()
+    while time.perf_counter() < end:
+        futures = [arbiter.submit(PRIORITY_TEMP, 'read_current_temp') for i in range(8)]
+        futures.append(arbiter.submit(PRIORITY_ALARM, 'read_alarms'))
+        if count % 10 == 0:
+            futures.append(arbiter.submit(PRIORITY_SETPOINT, 'write_set_temp', 4.0 + count % 7))
+        for future in futures:
+            future.result()
+        count += 1
+    elapsed = time.perf_counter() - started
+    arbiter.stop()
+    arbiter.join()
+    print("%d round trips in %.2f s: %.0f round trips/s, %.1f us each" % (
+        sim.frames, elapsed, sim.frames / elapsed, elapsed / sim.frames * 1e6))
+    stats = arbiter.stats()
+    for name in ('setpoint', 'alarm', 'temp'):
+        print("%-8s count %6d  mean wait %7.1f us  max wait %8.1f us" % (
+            name, stats[name]['count'], stats[name]['mean_wait'] * 1e6, stats[name]['max_wait'] * 1e6))
+    print("bad frames: %d" % sim.bad_frames)
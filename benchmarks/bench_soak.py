@@ -0,0 +1,96 @@
+# --------------------------------
+# Accelerated soak run: cooling and shaking against the simulated hardware on a warped clock
+#
+# The simulated TC-36-25, SimulatedGPIO, MotionEngine and the polling loop all follow one Clock running
+# "speed" times faster than real time. The temperature is polled at the Modbus server rate (4 Hz clock time)
+# while MotorService shakes. At the end the step count is compared with the count the shake settings give
+# for the simulated time, and the temperature with the set temperature.
+#
+# When the machine cannot keep up with the warped clock, the engine shifts the rest of a stroke back
+# (resync) instead of squeezing steps together, the motor makes no steps in the shifted time. At 60x a
+# step edge is due every ~19 real us, so a busy machine resyncs hundreds of times and falls a few percent
+# short of the plain count. The check takes the shifted time off: the steps made must be within
+# TOLERANCE of the count the shake settings give for the rest of the simulated time, else exit code 1.
+#
+# Run from the repository root:
+#   python benchmarks/bench_soak.py [clock hours] [speed]
+# --------------------------------
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from clock import Clock
+from gpio_backends import SimulatedGPIO
+from motion import MotionEngine, shake_schedules, SPIN
+from motor_service import MotorService, ShakeParams
+from tc36_sim import SimulatedTC36
+from tc36_transport import TC36Transport
+from tc36_driver import TC36Driver
+
+DIR = 20
+STEP = 21
+SET_TEMP = 4.0
+POLL_PERIOD = 0.25      # same as ServerWorker.TEMP_PERIOD (clock s)
+PARAMS = ShakeParams(90.0, 90.0, 0.5)
+TOLERANCE = 0.5         # % of the expected step count
+
+
+if __name__ == "__main__":
+    hours = float(sys.argv[1]) if len(sys.argv) > 1 else 0.25
+    speed = float(sys.argv[2]) if len(sys.argv) > 2 else 60.0
+    clock = Clock(speed)
+    controller = TC36Driver(TC36Transport(SimulatedTC36(now=clock.now)))
+    gpio = SimulatedGPIO(now=clock.now, max_events=1000)
+    steps = [0]
+    output = gpio.output
+
+    def count_steps(pin, value):
+        if pin == STEP and value:
+            steps[0] += 1
+        output(pin, value)
+    gpio.output = count_steps
+    output_prepared = gpio.output_prepared
+
+    def count_prepared_steps(prepared):
+        if (STEP, 1) in prepared:
+            steps[0] += 1
+        output_prepared(prepared)
+    gpio.output_prepared = count_prepared_steps
+
+    motor = MotorService(MotionEngine(gpio, now=clock.now, sleep=clock.sleep, spin=SPIN*speed), DIR, STEP)
+    motor.start()
+    controller.write_set_temp(SET_TEMP)
+    real_start = time.perf_counter()
+    start = clock.now()
+    motor.shake(PARAMS)
+    end = start + hours * 3600
+    polls = 0
+    deadline = start
+    while clock.now() < end:
+        temp = controller.read_current_temp()
+        polls += 1
+        deadline += POLL_PERIOD
+        clock.sleep(deadline - clock.now())
+    motor.halt()
+    elapsed = clock.now() - start
+    real = time.perf_counter() - real_start
+    motor.stop()
+    motor.join()
+
+    schedules = shake_schedules(DIR, STEP, PARAMS.speed, PARAMS.dor, PARAMS.dwell)
+    cycle = sum(schedule.duration for schedule in schedules)
+    per_cycle = sum(schedule.steps for schedule in schedules)
+    stats = motor.engine.stats()
+    plain = elapsed / cycle * per_cycle
+    expected = (elapsed - stats['resync_time']) / cycle * per_cycle
+    error = (steps[0] - expected) / expected * 100
+    print("%.2f clock hours in %.1f real seconds (%.0fx)" % (elapsed / 3600, real, elapsed / real))
+    print("temperature polls %d, final temperature %.2f C (set %.2f C)" % (polls, temp, SET_TEMP))
+    print("steps %d, %.0f for the whole time (%.2f%%)" % (steps[0], plain, (steps[0] - plain) / plain * 100))
+    print("%d resyncs shifted the strokes back %.1f clock s" % (stats['resyncs'], stats['resync_time']))
+    print("steps %d, expected %.0f without the shifted time (%+.2f%%, tolerance %.1f%%) %s"
+          % (steps[0], expected, error, TOLERANCE, "ok" if abs(error) <= TOLERANCE else "OUTSIDE TOLERANCE"))
+    print("engine stats: " + str(stats))
+    sys.exit(0 if abs(error) <= TOLERANCE else 1)
@@ -0,0 +1,83 @@
+# --------------------------------
+# Stop latency of MotionEngine on SimulatedGPIO
+#
+# Starts a shake cycle in a thread, requests a stop at random times (during dwell and part way
+# through strokes) and measures the time from "request_stop" until the motor is at rest.
+# Each measurement is checked against motion.stop_latency_bound, and the position the motor stopped at
+# must be inside the stroke (between the start position and degrees of rotation, a stop never turns the
+# motor past the end of the stroke it is in). The script exits with status 1 if any stop took longer than
+# the bound plus TOLERANCE or ended outside the stroke.
+#
+# Run from the repository root:
+#   python benchmarks/bench_stop_latency.py [runs]
+# --------------------------------
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from gpio_backends import SimulatedGPIO
+from motion import MotionEngine, shake_schedules, stop_latency_bound, PROFILE_NONE, PROFILE_TRAPEZOID, PROFILE_SCURVE
+
+DIR = 20
+STEP = 21
+TOLERANCE = 0.005       # operating system wake up delay allowed on top of the bound (s)
+
+# (speed deg/s, degrees of rotation, dwell s, accel deg/s^2, jerk deg/s^3, profile)
+CASES = [
+    (90.0, 360.0, 10.0, 0.0, 0.0, PROFILE_NONE),            # longest dwell the GUI allows
+    (90.0, 360.0, 0.5, 0.0, 0.0, PROFILE_NONE),
+    (90.0, 90.0, 0.2, 0.0, 0.0, PROFILE_NONE),              # stroke shorter than slowing down from full speed
+    (180.0, 180.0, 0.5, 4000.0, 0.0, PROFILE_TRAPEZOID),
+    (180.0, 180.0, 0.5, 4000.0, 40000.0, PROFILE_SCURVE),
+]
+
+
+def shake(engine, schedules, result):
+    start = None
+    while not engine.stopped:
+        for schedule in schedules:
+            start = engine.play(schedule, start)
+            if engine.stopped:
+                break
+    result.append(start)        # time the motor came to rest
+
+
+def measure(case, delay):
+    speed, dor, dwell, accel, jerk, profile = case
+    gpio = SimulatedGPIO()
+    engine = MotionEngine(gpio)
+    schedules = shake_schedules(DIR, STEP, speed, dor, dwell, 1, 0, accel, jerk, profile)
+    result = []
+    thread = threading.Thread(target=shake, args=(engine, schedules, result))
+    thread.start()
+    time.sleep(delay)
+    requested = time.perf_counter()
+    engine.request_stop()
+    thread.join()
+    inside = 0 <= engine.position <= schedules[0].steps
+    return max(result[0] - requested, 0.0), max(stop_latency_bound(schedule) for schedule in schedules), inside
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    rng = random.Random(1)
+    failed = False
+    for case in CASES:
+        latencies = []
+        bound = 0.0
+        outside = 0
+        for r in range(runs):
+            latency, bound, inside = measure(case, rng.uniform(0.0, 1.5))
+            latencies.append(latency)
+            outside += not inside
+        worst = max(latencies)
+        ok = worst <= bound + TOLERANCE
+        failed = failed or not ok or outside > 0
+        print("speed %5.0f dor %5.0f dwell %4.1f profile %d: worst stop %7.1f ms  mean %7.1f ms  bound %7.1f ms  %s  %s" % (
+            case[0], case[1], case[2], case[5], worst * 1e3, sum(latencies) / len(latencies) * 1e3, bound * 1e3,
+            "ok" if ok else "EXCEEDED", "inside stroke" if not outside else "%d stops PAST STROKE" % outside))
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,54 @@
+# --------------------------------
+# Written for the Cooler-Shaker System
+# Github: https://github.com/alopez505/cooler_shaker
+# --------------------------------
+#
+# --------------------------------
+# CallbackDataBlock is a ModbusSequentialDataBlock that calls functions when a Modbus master writes to it
+#
+# The Modbus server writes to the data block with "setValues", so every write from a client
+# calls each registered callback with the address and the values written.
+# The program updates the data block with "update", which changes the values without calling callbacks,
+# so values read from the controller or set on the GUI are not seen as Modbus writes.
+#
+# Callbacks run in the twisted reactor thread (the ServerWorker thread)
+# --------------------------------
+import logging
+
+from pymodbus.datastore import ModbusSequentialDataBlock
+
+log = logging.getLogger(__name__)
+
+
+class CallbackDataBlock(ModbusSequentialDataBlock):
+
+    def __init__(self, address, values):
+        super(CallbackDataBlock, self).__init__(address, values)
+        self.callbacks = []
+
+    # ----------------
+    # "add_callback" registers a function called on every Modbus write
+    #
+    # Parameter:    callback - function(address, values), address is the first address written
+    # ----------------
+    def add_callback(self, callback):
+        self.callbacks.append(callback)
+
+    # ----------------
+    # "setValues" is used by the Modbus server for writes from a Modbus master
+    # ----------------
+    def setValues(self, address, values):
+        if not isinstance(values, list):
+            values = [values]
+        super(CallbackDataBlock, self).setValues(address, values)
+        for callback in self.callbacks:
+            try:
+                callback(address, values)
+            except Exception:
+                log.exception("Modbus write callback failed")
+
+    # ----------------
+    # "update" changes values from inside the program without calling the callbacks
+    # ----------------
+    def update(self, address, values):
+        super(CallbackDataBlock, self).setValues(address, values)
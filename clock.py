@@ -0,0 +1,69 @@
+# --------------------------------
+# Written for the Cooler-Shaker System
+# Github: https://github.com/alopez505/cooler_shaker
+# --------------------------------
+#
+# --------------------------------
+# Clock is the time source of the whole program
+#
+# Every delay and timestamp goes through one Clock instead of calling time.sleep / time.time directly:
+#   now     - seconds since the clock started, used for deadlines (motor steps, periodic tasks, simulated plant)
+#   time    - wall clock time in seconds since the epoch, used for timestamps (graph, history)
+#   sleep   - waits a number of clock seconds
+#
+# A clock with speed 1 runs in real time. With speed N (time-warp) every clock second lasts 1/N real seconds,
+# so a 12 hour soak run against the simulated hardware finishes in 12/N hours. Only the simulated backends
+# can follow a warped clock, real hardware always needs speed 1.
+#
+# ReactorClock gives the twisted reactor the same warped time (IReactorTime: seconds, callLater),
+# so the LoopingCalls of TaskScheduler run at N times their period too.
+# --------------------------------
+import time
+
+
+class Clock(object):
+
+    # ----------------
+    # Parameter:    speed - Clock seconds per real second (1 = real time)
+    #               real - Real time source (s)
+    #               real_sleep - Real sleep function
+    #               wall - Wall clock at start (s since epoch)
+    # ----------------
+    def __init__(self, speed=1.0, real=time.perf_counter, real_sleep=time.sleep, wall=time.time):
+        if speed <= 0:
+            raise ValueError("clock speed must be positive, got %r" % (speed,))
+        self.speed = float(speed)
+        self.real = real
+        self.real_sleep = real_sleep
+        self.real_start = real()
+        self.wall_start = wall()
+
+    def now(self):
+        return (self.real() - self.real_start) * self.speed
+
+    def time(self):
+        return self.wall_start + self.now()
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self.real_sleep(seconds / self.speed)
+
+
+class ReactorClock(object):
+
+    # ----------------
+    # Parameter:    clock - Clock giving the time
+    #               reactor - twisted reactor that runs the calls
+    # ----------------
+    def __init__(self, clock, reactor):
+        self.clock = clock
+        self.reactor = reactor
+
+    def seconds(self):
+        return self.clock.now()
+
+    def callLater(self, delay, callable, *args, **kw):
+        return self.reactor.callLater(max(delay, 0.0) / self.clock.speed, callable, *args, **kw)
+
+    def getDelayedCalls(self):
+        return self.reactor.getDelayedCalls()
@@ -0,0 +1,183 @@
+# --------------------------------
+# Written for the Cooler-Shaker System
+# Github: https://github.com/alopez505/cooler_shaker
+# --------------------------------
+#
+# --------------------------------
+# MinMaxPyramid keeps a time series at several resolutions so a graph of any length can be drawn
+# with about one point per pixel
+#
+# Level 0 holds the samples themselves. Each level above holds one bucket for every FACTOR buckets of
+# the level below, with the time of its first sample and the lowest and highest value in it:
+#
+#   level 0:  every sample (0.25s apart at 4 Hz)
+#   level 1:  min / max of 2 samples
+#   level 2:  min / max of 4 samples      ...
+#
+# With FACTOR 2 the level picked for a window always draws between half and all of the requested points.
+# All levels together take about twice the memory of level 0.
+#
+# Keeping the min and max (instead of an average) means a short spike still shows up when zoomed out.
+#
+# "append" adds a sample to level 0 and to the partly filled bucket of each level above, a bucket is
+# stored when it is full. This is O(1) per sample (O(levels) at most).
+#
+# "query" picks the finest level that fits the window in the requested number of points and returns
+# its buckets as (x, y) arrays, each bucket drawn as its min and max point. Samples not yet in a full
+# bucket of that level are drawn as one extra bucket, so the newest sample is always on the graph.
+#
+# Each level is a ring of array('d') values, the oldest buckets are replaced when it is full.
+#
+# The binary search of "query" needs the samples in time order, a sample older than the last sample
+# is added with the time of the last sample (see history.py for how a clock going back is handled).
+# After a larger step back of the clock, make a new pyramid from the samples.
+# --------------------------------
+from array import array
+
+FACTOR = 2
+
+
+class _Level(object):
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.times = array('d', bytes(8 * capacity))
+        self.lows = array('d', bytes(8 * capacity))
+        self.highs = array('d', bytes(8 * capacity))
+        self.count = 0          # buckets stored since the start
+        # partly filled bucket
+        self.fill = 0
+        self.time = 0.0
+        self.low = 0.0
+        self.high = 0.0
+
+    def store(self, t, low, high):
+        i = self.count % self.capacity
+        self.times[i] = t
+        self.lows[i] = low
+        self.highs[i] = high
+        self.count += 1
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    # ----------------
+    # "first_at_or_after" returns the index (0 = oldest bucket kept) of the first bucket starting at or after t
+    # ----------------
+    def first_at_or_after(self, t):
+        kept = len(self)
+        first = self.count - kept
+        times = self.times
+        capacity = self.capacity
+        lo, hi = 0, kept
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if times[(first + mid) % capacity] < t:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+
+class MinMaxPyramid(object):
+
+    # ----------------
+    # Parameter:    capacity - Number of samples kept at level 0 (ex: 24 hours at 4 Hz = 345600)
+    #               levels - Number of levels, level n bucket holds FACTOR**n samples
+    # ----------------
+    def __init__(self, capacity, levels=12):
+        self.capacity = capacity
+        self.levels = [_Level(max(capacity // FACTOR**n, 1)) for n in range(levels)]
+        self.last_time = None
+
+    # ----------------
+    # "append" adds one sample, a sample older than the last one gets the time of the last one
+    # ----------------
+    def append(self, t, value):
+        if self.last_time is not None and t < self.last_time:
+            t = self.last_time
+        self.last_time = t
+        levels = self.levels
+        levels[0].store(t, value, value)
+        low = high = value
+        for n in range(1, len(levels)):
+            level = levels[n]
+            if level.fill == 0:
+                level.time = t
+                level.low = low
+                level.high = high
+            else:
+                if low < level.low:
+                    level.low = low
+                if high > level.high:
+                    level.high = high
+            level.fill += 1
+            if level.fill < FACTOR:
+                return
+            # bucket full, store it and pass it up as one sample of the next level
+            level.store(level.time, level.low, level.high)
+            level.fill = 0
+            t, low, high = level.time, level.low, level.high
+
+    def extend(self, times, values):
+        append = self.append
+        for t, value in zip(times, values):
+            append(t, value)
+
+    def __len__(self):
+        return len(self.levels[0])
+
+    # ----------------
+    # "query" returns the samples between t0 and t1 at the finest level drawn in at most "points" points
+    #
+    # Parameter:    t0, t1 - Time window
+    #               points - Largest number of points wanted (about the graph width in pixels)
+    #
+    # Return:       x, y - array('d') of times and values, 2 points (min and max) per bucket above level 0
+    #               level - Level used
+    # ----------------
+    def query(self, t0, t1, points):
+        for n in range(len(self.levels)):
+            level = self.levels[n]
+            start = level.first_at_or_after(t0)
+            end = level.first_at_or_after(t1 + 1e-9)
+            per_bucket = 1 if n == 0 else 2
+            if (end - start) * per_bucket <= points or n == len(self.levels) - 1:
+                break
+        if n > 0 and start > 0:
+            start -= 1          # bucket starting before t0 still covers part of the window
+        x = array('d')
+        y = array('d')
+        first = level.count - len(level)
+        capacity = level.capacity
+        times, lows, highs = level.times, level.lows, level.highs
+        if n == 0:
+            for k in range(start, end):
+                i = (first + k) % capacity
+                x.append(times[i])
+                y.append(lows[i])
+            return x, y, n
+        for k in range(start, end):
+            i = (first + k) % capacity
+            t = times[i]
+            x.append(t)
+            x.append(t)
+            y.append(lows[i])
+            y.append(highs[i])
+        # newest samples are still in the partly filled buckets of levels 1 to n, draw them as one more bucket
+        tail = None
+        for m in range(n, 0, -1):
+            partial = self.levels[m]
+            if partial.fill == 0:
+                continue
+            if tail is None:
+                tail = [partial.time, partial.low, partial.high]
+            else:
+                tail[1] = min(tail[1], partial.low)
+                tail[2] = max(tail[2], partial.high)
+        if tail is not None and t0 <= tail[0] <= t1:
+            x.append(tail[0])
+            x.append(tail[0])
+            y.append(tail[1])
+            y.append(tail[2])
+        return x, y, n
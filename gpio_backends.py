@@ -0,0 +1,353 @@
+# --------------------------------
+# Written for the Cooler-Shaker System
+# Github: https://github.com/alopez505/cooler_shaker
+# --------------------------------
+#
+# --------------------------------
+# GPIO backends used to drive the STEP / DIR motor driver
+#
+# Every backend has the same functions as the RPi.GPIO module that the program uses
+# (setmode, setup, output, cleanup and the BCM, OUT, HIGH, LOW constants),
+# so the RPi.GPIO module itself is the backend used on the Raspberry Pi.
+#
+# SimulatedGPIO records a timestamp for every output change instead of driving pins,
+# so motor timing can be run and measured on any computer.
+#
+# GpiochipGPIO drives the pins through the Linux GPIO character device (/dev/gpiochipN). All output pins are
+# requested as one line handle, so every write sets all of them (ex: DIR and STEP) with a single ioctl.
+# "prepare" packs a sequence of pin states ahead of time, "output_prepared" writes one of them (one ioctl,
+# nothing left to work out) and "output_sequence" writes them back to back. MotionEngine prepares the
+# edges of each step schedule once and writes them with "output_prepared" at their deadlines, so the
+# time per STEP edge is only the ioctl (SimulatedGPIO has the same functions, to run that path in the sim).
+# It needs no extra Python package and also works where RPi.GPIO does not (ex: Raspberry Pi 5).
+#
+# Step pulsers make a steady train of STEP pulses at a set frequency without a Python loop, used to turn
+# the motor continuously (toggle jog). Software only starts, changes and stops them:
+#   SysfsPWMPulser      - hardware PWM channel of the Raspberry Pi through /sys/class/pwm
+#                         (STEP wired to a PWM pin, ex: GPIO 18 with "dtoverlay=pwm" in /boot/config.txt)
+#   GPIOPWMPulser       - RPi.GPIO.PWM on the STEP pin, timed by a C thread of RPi.GPIO (no rewiring needed)
+#   SimulatedPulser     - records every frequency set with a timestamp
+#
+# Every pulser has "start(frequency)", "stop()" and "frequency" (0 when stopped). "stop" returns the number of
+# pulses made since "start", worked out from the time it ran (the pulses themselves are not counted).
+# MAX_FREQUENCY is the fastest pulse rate the pulser makes evenly (None = no limit).
+# --------------------------------
+import collections
+import fcntl
+import logging
+import os
+import struct
+import time
+
+log = logging.getLogger(__name__)
+
+
+class SimulatedGPIO(object):
+
+    BCM = 11
+    BOARD = 10
+    OUT = 0
+    IN = 1
+    HIGH = 1
+    LOW = 0
+
+    # ----------------
+    # Parameter:    now - Function returning the time used for the timestamps (s)
+    #               max_events - Number of output changes kept, oldest are dropped first (None keeps all)
+    # ----------------
+    def __init__(self, now=time.perf_counter, max_events=None):
+        self.now = now
+        self.mode = None
+        self.pins = {}          # pin: direction
+        self.levels = {}        # pin: last output value
+        self.events = collections.deque(maxlen=max_events)      # (timestamp, pin, value) for every output call
+
+    def setmode(self, mode):
+        self.mode = mode
+
+    def setup(self, pin, direction):
+        self.pins[pin] = direction
+        self.levels.setdefault(pin, self.LOW)
+
+    def output(self, pin, value):
+        self.events.append((self.now(), pin, value))
+        self.levels[pin] = value
+
+    # ----------------
+    # "prepare" / "output_prepared" work like GpiochipGPIO's, a prepared state is the (pin, value) changes
+    # ----------------
+    def prepare(self, states):
+        return [tuple(state.items()) for state in states]
+
+    def output_prepared(self, prepared):
+        t = self.now()
+        for pin, value in prepared:
+            self.events.append((t, pin, value))
+            self.levels[pin] = value
+
+    def cleanup(self):
+        self.pins.clear()
+
+    # ----------------
+    # "rising_edges" returns the timestamps of every LOW to HIGH change on a pin
+    # ----------------
+    def rising_edges(self, pin):
+        edges = []
+        level = self.LOW
+        for t, p, value in self.events:
+            if p != pin:
+                continue
+            if value and not level:
+                edges.append(t)
+            level = value
+        return edges
+
+    def clear(self):
+        self.events.clear()
+
+
+# Linux GPIO character device, version 1 line handle API (linux/gpio.h)
+GPIOHANDLES_MAX = 64
+GPIOHANDLE_REQUEST_OUTPUT = 1 << 1
+_HANDLE_REQUEST = struct.Struct('<64II64B32sIi')     # struct gpiohandle_request
+_HANDLE_DATA = struct.Struct('<64B')                 # struct gpiohandle_data
+
+
+def _iowr(number, size):
+    return (3 << 30) | (size << 16) | (0xB4 << 8) | number
+
+
+GPIO_GET_LINEHANDLE_IOCTL = _iowr(0x03, _HANDLE_REQUEST.size)
+GPIOHANDLE_SET_LINE_VALUES_IOCTL = _iowr(0x09, _HANDLE_DATA.size)
+
+
+class GpiochipGPIO(object):
+
+    BCM = 11
+    BOARD = 10
+    OUT = 0
+    IN = 1
+    HIGH = 1
+    LOW = 0
+
+    # ----------------
+    # Parameter:    path - GPIO character device, line numbers are the BCM pin numbers on the Raspberry Pi
+    #               consumer - Name shown for the lines by "gpioinfo"
+    # ----------------
+    def __init__(self, path='/dev/gpiochip0', consumer='cooler_shaker'):
+        self.path = path
+        self.consumer = consumer
+        self.mode = None
+        self.pins = []          # output pins, in line handle order
+        self.values = []        # last value written to each pin
+        self._chip = None
+        self._handle = None
+        self._written = None    # prepared state written last, "values" is brought up to date from it when needed
+
+    def setmode(self, mode):
+        self.mode = mode
+
+    def setup(self, pin, direction):
+        if direction != self.OUT:
+            raise ValueError("GpiochipGPIO only drives outputs")
+        self._sync()
+        if pin not in self.pins:
+            if len(self.pins) == GPIOHANDLES_MAX:
+                raise ValueError("at most %d output pins" % GPIOHANDLES_MAX)
+            self.pins.append(pin)
+            self.values.append(self.LOW)
+            self._request()
+
+    # requests (again) a line handle holding every output pin, with their current values
+    def _request(self):
+        if self._chip is None:
+            self._chip = os.open(self.path, os.O_RDWR | os.O_CLOEXEC)
+        if self._handle is not None:
+            os.close(self._handle)
+            self._handle = None
+        count = len(self.pins)
+        request = bytearray(_HANDLE_REQUEST.pack(*(
+            self.pins + [0] * (GPIOHANDLES_MAX - count) + [GPIOHANDLE_REQUEST_OUTPUT] +
+            self.values + [0] * (GPIOHANDLES_MAX - count) + [self.consumer.encode()[:31], count, -1])))
+        fcntl.ioctl(self._chip, GPIO_GET_LINEHANDLE_IOCTL, request)
+        self._handle = _HANDLE_REQUEST.unpack(bytes(request))[-1]
+
+    # ----------------
+    # "output" sets one pin, or a list of pins to a list of values (like RPi.GPIO), with one ioctl
+    # ----------------
+    def output(self, pin, value):
+        self._sync()
+        if isinstance(pin, (list, tuple)):
+            if not isinstance(value, (list, tuple)):
+                value = [value] * len(pin)
+            for p, v in zip(pin, value):
+                self.values[self.pins.index(p)] = 1 if v else 0
+        else:
+            self.values[self.pins.index(pin)] = 1 if value else 0
+        fcntl.ioctl(self._handle, GPIOHANDLE_SET_LINE_VALUES_IOCTL, self._pack(self.values))
+
+    def _pack(self, values):
+        return _HANDLE_DATA.pack(*(list(values) + [0] * (GPIOHANDLES_MAX - len(values))))
+
+    # ----------------
+    # "prepare" packs a sequence of pin states for "output_sequence"
+    #
+    # Parameter:    states - List of {pin: value} changes, pins not given keep their value from the state before
+    #
+    # Return:       prepared - List of packed line values, one ioctl each
+    # ----------------
+    def prepare(self, states):
+        self._sync()
+        values = list(self.values)
+        prepared = []
+        for state in states:
+            for pin, value in state.items():
+                values[self.pins.index(pin)] = 1 if value else 0
+            prepared.append(self._pack(values))
+        return prepared
+
+    # ----------------
+    # "output_prepared" writes one prepared pin state (every output pin, one ioctl)
+    # ----------------
+    def output_prepared(self, data):
+        fcntl.ioctl(self._handle, GPIOHANDLE_SET_LINE_VALUES_IOCTL, data)
+        self._written = data
+
+    # ----------------
+    # "output_sequence" writes prepared pin states back to back, as fast as the ioctls go (no timing)
+    # ----------------
+    def output_sequence(self, prepared):
+        handle = self._handle
+        ioctl = fcntl.ioctl
+        request = GPIOHANDLE_SET_LINE_VALUES_IOCTL
+        for data in prepared:
+            ioctl(handle, request, data)
+        if prepared:
+            self._written = prepared[-1]
+
+    def _sync(self):
+        if self._written is not None:
+            self.values = list(_HANDLE_DATA.unpack(self._written)[:len(self.pins)])
+            self._written = None
+
+    def cleanup(self):
+        if self._handle is not None:
+            os.close(self._handle)
+            self._handle = None
+        if self._chip is not None:
+            os.close(self._chip)
+            self._chip = None
+        self.pins = []
+        self.values = []
+        self._written = None
+
+
+class _Pulser(object):
+
+    MAX_FREQUENCY = None
+
+    # ----------------
+    # Parameter:    now - Clock used to work out the number of pulses made (s)
+    # ----------------
+    def __init__(self, now=time.perf_counter):
+        self.now = now
+        self.frequency = 0.0
+        self._started = None
+
+    # ----------------
+    # "start" makes pulses at "frequency" (Hz), until "stop"
+    # ----------------
+    def start(self, frequency):
+        if frequency <= 0:
+            raise ValueError("pulse frequency must be positive, got %r" % (frequency,))
+        self._set(frequency)
+        self.frequency = frequency
+        self._started = self.now()
+
+    # ----------------
+    # "stop" ends the pulses
+    #
+    # Return:       pulses - Pulses made since "start"
+    # ----------------
+    def stop(self):
+        if self._started is None:
+            return 0
+        self._set(0.0)
+        pulses = int((self.now() - self._started) * self.frequency)
+        self.frequency = 0.0
+        self._started = None
+        return pulses
+
+    def _set(self, frequency):
+        raise NotImplementedError
+
+
+class SimulatedPulser(_Pulser):
+
+    def __init__(self, now=time.perf_counter):
+        super(SimulatedPulser, self).__init__(now)
+        self.events = []        # (timestamp, frequency) for every start and stop (frequency 0)
+
+    def _set(self, frequency):
+        self.events.append((self.now(), frequency))
+
+
+class GPIOPWMPulser(_Pulser):
+
+    MAX_FREQUENCY = 2000.0      # Hz, the RPi.GPIO PWM thread gets irregular above a few kHz
+
+    # ----------------
+    # Parameter:    gpio - RPi.GPIO module, the pin must be set up as an output
+    #               pin - STEP pin
+    # ----------------
+    def __init__(self, gpio, pin, now=time.perf_counter):
+        super(GPIOPWMPulser, self).__init__(now)
+        self.gpio = gpio
+        self.pin = pin
+        self._pwm = None
+
+    def _set(self, frequency):
+        if frequency <= 0:
+            self._pwm.stop()
+            self._pwm = None
+            return
+        self._pwm = self.gpio.PWM(self.pin, frequency)
+        self._pwm.start(50)         # 50% duty, STEP HIGH for half of each pulse like the step schedules
+
+
+class SysfsPWMPulser(_Pulser):
+
+    ROOT = '/sys/class/pwm'
+    MAX_FREQUENCY = 1e6         # Hz, far above the STEP input of the motor driver
+
+    # ----------------
+    # Parameter:    chip - PWM chip number (/sys/class/pwm/pwmchipN)
+    #               channel - PWM channel of the chip (0 = GPIO 12 / 18, 1 = GPIO 13 / 19)
+    # ----------------
+    def __init__(self, chip=0, channel=0, now=time.perf_counter):
+        super(SysfsPWMPulser, self).__init__(now)
+        chip_path = os.path.join(self.ROOT, 'pwmchip%d' % chip)
+        self.path = os.path.join(chip_path, 'pwm%d' % channel)
+        if not os.path.isdir(self.path):
+            with open(os.path.join(chip_path, 'export'), 'w') as f:
+                f.write(str(channel))
+            # the channel files are created by udev, wait for them to become writable
+            deadline = time.monotonic() + 1.0
+            while not os.access(os.path.join(self.path, 'enable'), os.W_OK) and time.monotonic() < deadline:
+                time.sleep(0.01)
+        log.info("Hardware PWM step pulser on " + self.path)
+
+    def _write(self, name, value):
+        with open(os.path.join(self.path, name), 'w') as f:
+            f.write(str(value))
+
+    def _set(self, frequency):
+        if frequency <= 0:
+            self._write('enable', 0)
+            return
+        period = int(round(1e9 / frequency))      # ns
+        self._write('enable', 0)
+        self._write('duty_cycle', 0)    # duty cycle must never be longer than the period, even for a moment
+        self._write('period', period)
+        self._write('duty_cycle', period // 2)
+        self._write('enable', 1)
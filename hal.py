@@ -0,0 +1,160 @@
+# --------------------------------
+# Written for the Cooler-Shaker System
+# Github: https://github.com/alopez505/cooler_shaker
+# --------------------------------
+#
+# --------------------------------
+# hal opens the serial port and GPIO pins of the chosen backend
+#
+#   BACKEND_HARDWARE - /dev/ttyUSB0 through pySerial and the Raspberry Pi pins through RPi.GPIO
+#   BACKEND_SIM      - tc36_sim.SimulatedTC36 and gpio_backends.SimulatedGPIO,
+#                      runs on any computer (no Raspberry Pi, controller or motor needed)
+#
+# pySerial and RPi.GPIO are only imported when the hardware backend is opened.
+#
+# The backend is chosen with "--backend sim" / "--backend hardware" on the command line,
+# or the COOLER_SHAKER_BACKEND environment variable. The default is the hardware backend.
+#
+# "--speed N" (or COOLER_SHAKER_SPEED) runs the program clock N times faster than real time (see clock.py).
+# The simulated backends follow that clock, the hardware backend only runs at speed 1.
+#
+# COOLER_SHAKER_GPIOCHIP=/dev/gpiochipN drives the hardware pins through the Linux GPIO character device
+# (gpio_backends.GpiochipGPIO) instead of RPi.GPIO.
+#
+# "max_step_rate" gives the fastest step rate MotionEngine times reliably on the GPIO backend, faster motor
+# speeds are limited to it. The defaults are estimates for a Raspberry Pi 3 with the GUI and Modbus server
+# running, leaving room below the rate benchmarks/bench_gpio_pulses.py reaches with nothing else running.
+# Measure on the Pi used and set COOLER_SHAKER_MAX_STEP_RATE (steps/s) to override it.
+#
+# The step pulser for continuous rotation (see gpio_backends.py) is the hardware PWM channel set with
+# COOLER_SHAKER_PWM="chip:channel" (ex: "0:0", STEP wired to GPIO 18), otherwise RPi.GPIO.PWM on the STEP pin.
+# --------------------------------
+import argparse
+import os
+import time
+
+BACKEND_HARDWARE = 'hardware'
+BACKEND_SIM = 'sim'
+BACKENDS = [BACKEND_HARDWARE, BACKEND_SIM]
+
+SERIAL_PORT = '/dev/ttyUSB0'        # USB to RS-485 converter on the Raspi
+BAUDRATE = 115200
+SERIAL_TIMEOUT = 1                  # deadline for a full controller reply (s)
+SIM_GPIO_EVENTS = 100000            # output changes kept by the simulated GPIO
+
+# Fastest step rate of each GPIO backend (steps/s, real time), see "max_step_rate"
+MAX_STEP_RATE_RPI_GPIO = 5000.0     # RPi.GPIO, one output call per edge
+MAX_STEP_RATE_GPIOCHIP = 8000.0     # GpiochipGPIO, one prepared ioctl per edge
+MAX_STEP_RATE_SIM = 20000.0         # SimulatedGPIO, no pins driven
+
+
+# ----------------
+# "options_from_args" reads the backend and clock speed from the command line or the environment
+#
+# Parameter:    argv - Command line arguments, other arguments are ignored
+#               default - Backend used if none is given
+#
+# Return:       backend - BACKEND_HARDWARE or BACKEND_SIM
+#               speed - Clock speed, 1 = real time
+# ----------------
+def options_from_args(argv, default=BACKEND_HARDWARE):
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--backend', choices=BACKENDS, default=os.environ.get('COOLER_SHAKER_BACKEND', default))
+    parser.add_argument('--speed', type=float, default=float(os.environ.get('COOLER_SHAKER_SPEED', 1.0)))
+    args, unknown = parser.parse_known_args(argv[1:])
+    if args.backend not in BACKENDS:
+        raise ValueError("unknown backend %r, use one of %s" % (args.backend, ', '.join(BACKENDS)))
+    if args.speed <= 0:
+        raise ValueError("clock speed must be positive, got %r" % (args.speed,))
+    if args.backend == BACKEND_HARDWARE and args.speed != 1.0:
+        raise ValueError("the hardware backend only runs in real time (--speed 1)")
+    return args.backend, args.speed
+
+
+# ----------------
+# "open_serial" opens the port connected to the temperature controller
+#
+# Parameter:    clock - Clock followed by the simulated controller (None for real time)
+#
+# Return:       port - serial.Serial or SimulatedTC36
+# ----------------
+def open_serial(backend, clock=None):
+    if backend == BACKEND_SIM:
+        from tc36_sim import SimulatedTC36
+        if clock is None:
+            return SimulatedTC36(timeout=SERIAL_TIMEOUT)
+        return SimulatedTC36(now=clock.now, timeout=SERIAL_TIMEOUT)
+    import serial
+    return serial.Serial(SERIAL_PORT, BAUDRATE, timeout=SERIAL_TIMEOUT)
+
+
+# ----------------
+# "open_gpio" returns the GPIO module of the backend and sets the motor driver pins as outputs
+#
+# Parameter:    pins - GPIO pins (BCM numbering) used as outputs
+#               clock - Clock used for the simulated pin timestamps (None for real time)
+#
+# Return:       gpio - RPi.GPIO module, GpiochipGPIO or SimulatedGPIO
+# ----------------
+def open_gpio(backend, pins, clock=None):
+    if backend == BACKEND_SIM:
+        from gpio_backends import SimulatedGPIO
+        if clock is None:
+            gpio = SimulatedGPIO(max_events=SIM_GPIO_EVENTS)
+        else:
+            gpio = SimulatedGPIO(now=clock.now, max_events=SIM_GPIO_EVENTS)
+    elif os.environ.get('COOLER_SHAKER_GPIOCHIP'):
+        from gpio_backends import GpiochipGPIO
+        gpio = GpiochipGPIO(os.environ['COOLER_SHAKER_GPIOCHIP'])
+    else:
+        import RPi.GPIO as gpio
+    gpio.setmode(gpio.BCM)
+    for pin in pins:
+        gpio.setup(pin, gpio.OUT)
+    return gpio
+
+
+# ----------------
+# "max_step_rate" returns the fastest step rate MotionEngine times reliably on a GPIO backend
+#
+# Parameter:    gpio - GPIO module returned by "open_gpio"
+#               speed - Clock speed, the simulated backend steps "speed" times faster in real time
+#
+# Return:       rate - Steps per second of the program clock
+# ----------------
+def max_step_rate(backend, gpio, speed=1.0):
+    rate = os.environ.get('COOLER_SHAKER_MAX_STEP_RATE')
+    if rate:
+        rate = float(rate)
+        if rate <= 0:
+            raise ValueError("COOLER_SHAKER_MAX_STEP_RATE must be positive, got %r" % (rate,))
+    elif backend == BACKEND_SIM:
+        rate = MAX_STEP_RATE_SIM
+    elif hasattr(gpio, 'output_prepared'):
+        rate = MAX_STEP_RATE_GPIOCHIP
+    else:
+        rate = MAX_STEP_RATE_RPI_GPIO
+    return rate / speed
+
+
+# ----------------
+# "open_pulser" returns the step pulser used to turn the motor continuously
+#
+# Parameter:    gpio - GPIO module returned by "open_gpio"
+#               step_pin - STEP pin
+#               clock - Clock used to count the pulses made (None for real time)
+#
+# Return:       pulser - SysfsPWMPulser, GPIOPWMPulser, SimulatedPulser or None if there is none
+# ----------------
+def open_pulser(backend, gpio, step_pin, clock=None):
+    import gpio_backends
+    now = time.perf_counter if clock is None else clock.now
+    if backend == BACKEND_SIM:
+        return gpio_backends.SimulatedPulser(now)
+    pwm = os.environ.get('COOLER_SHAKER_PWM')
+    if pwm:
+        chip, channel = [int(part) for part in pwm.split(':')]
+        return gpio_backends.SysfsPWMPulser(chip, channel, now)
+    if not hasattr(gpio, 'PWM'):
+        return None         # GpiochipGPIO, continuous jogs are stepped by MotionEngine
+    return gpio_backends.GPIOPWMPulser(gpio, step_pin, now)
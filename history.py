@@ -0,0 +1,181 @@
+# --------------------------------
+# Written for the Cooler-Shaker System
+# Github: https://github.com/alopez505/cooler_shaker
+# --------------------------------
+#
+# --------------------------------
+# TemperatureHistory is a fixed-size ring buffer of samples stored in a memory-mapped file
+#
+# Each sample is one 20 byte record:
+#   time        - float64, wall clock time (s since epoch)
+#   temp        - float32, current temperature (C)
+#   set_temp    - float32, set temperature (C)
+#   alarms      - uint16, alarm status bits of the temperature controller
+#   motor       - uint16, motor state (index in motor_service.MOTOR_STATES)
+#
+# File layout:  64 byte header (magic, version, record size, capacity, samples written) + capacity records
+#
+# "append" packs the sample straight into the mapped file at the write position and updates the
+# sample count in the header, so it takes the same time however full the buffer is and creates no lists.
+# The operating system writes the mapped pages to disk, "flush" forces it. The history is kept across restarts.
+#
+# Readers get the samples without copying them:
+#   "segments" - memoryviews of the mapped file (2 when the samples wrap around the end of the buffer)
+#   "records"  - tuples unpacked from the segments
+#   "arrays"   - numpy structured array (DTYPE) on top of the mapped file (copied only when wrapped)
+#
+# Time order: readers (ex: the graph, decimation.MinMaxPyramid) need the samples in time order, but the clock
+# can go backwards (NTP correcting the clock of a Raspberry Pi without a real time clock, a file written by
+# a sim run with "--speed 60" then used by a real time run). The time of the last sample is read when the
+# file is opened and every new sample is checked against it:
+#   - a sample up to MAX_STEP_BACK seconds before the last sample is saved with the time of the last sample
+#   - a sample further back starts the history again (all saved samples are dropped, "generation" goes up
+#     so readers know to read it again from the start), a warning is logged
+# When "now" is given on open, a file whose last sample is more than MAX_STEP_BACK after "now" also starts again.
+#
+# Only one thread may append. Readers may run in other threads, a reader asking for the whole buffer
+# can see the oldest sample replaced while it reads.
+# --------------------------------
+import logging
+import mmap
+import os
+import struct
+
+log = logging.getLogger(__name__)
+
+RECORD = struct.Struct('<dffHH')
+HEADER = struct.Struct('<8sIIQQ')       # magic, version, record size, capacity, samples written
+HEADER_SIZE = 64
+COUNT = struct.Struct('<Q')
+COUNT_OFFSET = 24                       # offset of "samples written" in the header
+MAGIC = b'CSHIST\x00\x00'
+VERSION = 1
+
+DTYPE = [('time', '<f8'), ('temp', '<f4'), ('set_temp', '<f4'), ('alarms', '<u2'), ('motor', '<u2')]
+
+DEFAULT_CAPACITY = 7 * 24 * 3600 * 4    # 7 days of 4 Hz samples (about 48 MB)
+MAX_STEP_BACK = 5.0                     # largest step back of the clock saved as the last sample time (s)
+
+
+# ----------------
+# Raised when an existing history file does not match the requested layout
+# ----------------
+class HistoryError(ValueError):
+    pass
+
+
+class TemperatureHistory(object):
+
+    # ----------------
+    # Parameter:    path - History file, created if it does not exist
+    #               capacity - Number of samples kept, the oldest sample is replaced when full
+    #               now - Current time (s since epoch), starts the history again if the file ends after it
+    # ----------------
+    def __init__(self, path, capacity=DEFAULT_CAPACITY, now=None):
+        self.path = path
+        self.capacity = capacity
+        size = HEADER_SIZE + capacity * RECORD.size
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            new = os.fstat(fd).st_size == 0
+            if new:
+                os.ftruncate(fd, size)
+            elif os.fstat(fd).st_size != size:
+                raise HistoryError("%s holds a different capacity, move it away or use its capacity" % path)
+            self._mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        if new:
+            HEADER.pack_into(self._mm, 0, MAGIC, VERSION, RECORD.size, capacity, 0)
+            self.count = 0
+        else:
+            magic, version, record_size, file_capacity, self.count = HEADER.unpack_from(self._mm, 0)
+            if magic != MAGIC or version != VERSION or record_size != RECORD.size or file_capacity != capacity:
+                self._mm.close()
+                raise HistoryError("%s is not a version %d history file with capacity %d" % (path, VERSION, capacity))
+        self.generation = 0     # goes up each time the history starts again
+        self.last_time = None   # time of the last sample
+        for record in self.records(1):
+            self.last_time = record[0]
+        if now is not None and self.last_time is not None and self.last_time > now + MAX_STEP_BACK:
+            self._restart("last saved sample is %.0f s after the current time" % (self.last_time - now))
+
+    # ----------------
+    # "append" adds one sample, replacing the oldest when the buffer is full
+    # ----------------
+    def append(self, t, temp, set_temp, alarms=0, motor=0):
+        last = self.last_time
+        if last is not None and t < last:
+            if t < last - MAX_STEP_BACK:
+                self._restart("clock went back %.1f s" % (last - t))
+            else:
+                t = last
+        self.last_time = t
+        RECORD.pack_into(self._mm, HEADER_SIZE + (self.count % self.capacity) * RECORD.size,
+                         t, temp, set_temp, alarms, motor)
+        self.count += 1
+        COUNT.pack_into(self._mm, COUNT_OFFSET, self.count)
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    # drops every sample, the history starts again
+    def _restart(self, reason):
+        log.warning("Temperature history %s starts again, %s (%d samples dropped)" % (self.path, reason, len(self)))
+        self.count = 0
+        COUNT.pack_into(self._mm, COUNT_OFFSET, 0)
+        self.last_time = None
+        self.generation += 1
+
+    # ----------------
+    # "segments" returns the last n samples as memoryviews of the mapped file, oldest first
+    #
+    # Parameter:    n - Number of samples, None for all samples kept
+    #               end - Sample count the samples end at (a value of "count" read earlier), None for the latest
+    #                     Lets a reader collect exactly the samples added since it last read, while appends go on
+    #
+    # Return:       segments - List of 0, 1 or 2 memoryviews, each holding whole records
+    # ----------------
+    def segments(self, n=None, end=None):
+        latest = self.count
+        count = latest if end is None else min(end, latest)
+        kept = max(count - max(latest - self.capacity, 0), 0)     # samples before "count" not yet replaced
+        n = kept if n is None else max(min(n, kept), 0)
+        if n == 0:
+            return []
+        view = memoryview(self._mm)
+        end = count % self.capacity or self.capacity
+        start = end - n
+        if start >= 0:
+            return [view[HEADER_SIZE + start * RECORD.size:HEADER_SIZE + end * RECORD.size]]
+        return [view[HEADER_SIZE + (self.capacity + start) * RECORD.size:HEADER_SIZE + self.capacity * RECORD.size],
+                view[HEADER_SIZE:HEADER_SIZE + end * RECORD.size]]
+
+    # ----------------
+    # "records" iterates over the last n samples as (time, temp, set_temp, alarms, motor) tuples, oldest first
+    # ----------------
+    def records(self, n=None, end=None):
+        for segment in self.segments(n, end):
+            for record in RECORD.iter_unpack(segment):
+                yield record
+
+    # ----------------
+    # "arrays" returns the last n samples as a numpy structured array with fields of DTYPE, oldest first
+    # The array shares memory with the mapped file unless the samples wrap around the end of the buffer
+    # ----------------
+    def arrays(self, n=None, end=None):
+        import numpy
+        dtype = numpy.dtype(DTYPE)
+        parts = [numpy.frombuffer(segment, dtype=dtype) for segment in self.segments(n, end)]
+        if not parts:
+            return numpy.zeros(0, dtype=dtype)
+        if len(parts) == 1:
+            return parts[0]
+        return numpy.concatenate(parts)
+
+    def flush(self):
+        self._mm.flush()
+
+    def close(self):
+        self._mm.flush()
+        self._mm.close()
@@ -0,0 +1,566 @@
+# --------------------------------
+# Written for the Cooler-Shaker System
+# Github: https://github.com/alopez505/cooler_shaker
+# --------------------------------
+#
+# --------------------------------
+# motion turns the motor settings (speed, degrees of rotation, dwell) into a step schedule
+# and plays the schedule on a STEP / DIR motor driver
+#
+# A schedule is worked out before the motor moves. It is a list of output changes, each with the
+# time it should happen at, measured from the start of the schedule:
+#       (offset, pin, value)
+#
+# MotionEngine plays a schedule against time.perf_counter. Every output change has an absolute deadline
+# (start + offset), so time lost on one step (interpreter, logging, GUI) is made up on the next step
+# instead of adding up over the whole run. If an output change is so late that making it up would
+# step the motor faster than requested, the rest of the schedule is shifted back instead (resync).
+#
+# One shake cycle is 2 strokes:
+#       dwell, DIR = CW,  steps, dwell, DIR = CCW, steps
+#
+# Each stroke starts and ends at rest. The speed along the stroke follows a profile:
+#   PROFILE_NONE       - jumps straight to the set speed (how the motor has always run)
+#   PROFILE_TRAPEZOID  - constant acceleration up to the set speed and constant deceleration back to rest
+#   PROFILE_SCURVE     - acceleration itself ramps up and down at the jerk limit (smoother, no acceleration steps)
+# If a stroke is too short to reach the set speed, the peak speed is lowered so it still ends at rest.
+#
+# Stopping: "request_stop" can be called from any thread. MotionEngine checks for it before every output
+# change and every STOP_POLL seconds while waiting (dwell). If the motor is moving, it slows down to rest at
+# the schedule's deceleration (the ramp acceleration, or STOP_DECEL when there is no ramp) instead of
+# stopping dead. Slowing down never takes more steps than are left in the schedule, so a stop never turns
+# the motor past the end of the stroke it is in (with no ramp, a stop late in a stroke ends at the end of
+# the stroke at full speed, like the stroke itself would have). Worst-case time from "request_stop" to the
+# last step:
+#
+#       longest step interval in the schedule (or STOP_POLL during dwell) + time to slow down
+#       (speed / deceleration, or less when the steps left run out first)
+#
+# "stop_latency_bound" works this out for a schedule.
+#
+# Position: MotionEngine counts every step it makes in "position" (steps from where the program started),
+# +1 for a step of a schedule with sign +1 (clockwise) and -1 for sign -1 (counterclockwise),
+# including the steps made while slowing down after a stop request.
+# "move_schedule" creates the stroke that takes the motor from its position to another.
+#
+# Steps: StepConfig gives the step angle from the motor's full steps per revolution and the microstep setting
+# of the driver (1, 2, 4, 8, 16 ...). Every step count, step rate, ramp and position is worked out from it,
+# a "step" is one STEP pulse (one microstep when microstepping).
+# The speed setting keeps the scale the motor has always run at: speed/0.2 full steps of 1.8 deg per second,
+# which is SPEED_SCALE = 9 deg/s of motor rotation per unit of speed.
+# MotionEngine.max_rate is the fastest step rate the engine times reliably, faster settings are limited to it
+# by MotorService.
+#
+# Prepared pin states: when the GPIO backend has "prepare" / "output_prepared" (GpiochipGPIO, SimulatedGPIO),
+# MotionEngine packs the pin states of every edge of a schedule once ("prepare", kept with the schedule)
+# and writes each with "output_prepared" at its deadline. With GpiochipGPIO every write sets DIR and STEP
+# together in one ioctl, with nothing else to work out per edge, which raises the fastest step rate.
+# Other backends (RPi.GPIO) are written one pin at a time with "output".
+#
+# Step timing: every STEP pulse MotionEngine makes (also while slowing down) is given with its time and
+# lateness to "step_timing" (StepTimingRecorder, see step_timing.py), which keeps the interval error
+# percentiles and histogram of the last steps.
+# --------------------------------
+import math
+import threading
+import time
+
+from step_timing import StepTimingRecorder
+
+STEPS_PER_REV = 200         # full steps per revolution of the NEMA 23 stepper
+DEG_PER_STEP = 360.0/STEPS_PER_REV      # full step angle (1.8 deg)
+SPEED_SCALE = 9.0           # deg/s of motor rotation per unit of the speed setting (speed/0.2 full steps/s)
+MAX_STEP_RATE = 5000.0      # fastest step rate MotionEngine times reliably on the Raspberry Pi 3 (steps/s)
+STOP_DECEL = 2000.0         # deceleration used to stop when no ramp is set (deg/s^2)
+STOP_POLL = 0.01            # longest wait between checks for a stop request (s)
+SPIN = 0.0005               # real time busy-waited before each deadline, covers the operating system wake up delay (s)
+
+PROFILE_NONE = 0
+PROFILE_TRAPEZOID = 1
+PROFILE_SCURVE = 2
+PROFILE_NAMES = ['No Ramp', 'Trapezoid', 'S-Curve']
+
+
+class StepConfig(object):
+
+    # ----------------
+    # Parameter:    steps_per_rev - Full steps per revolution of the motor
+    #               microsteps - Microsteps per full step set on the driver, 1 = full steps
+    # ----------------
+    def __init__(self, steps_per_rev=STEPS_PER_REV, microsteps=1):
+        if steps_per_rev <= 0 or microsteps < 1 or int(microsteps) != microsteps:
+            raise ValueError("bad step setting: %r steps per rev, %r microsteps" % (steps_per_rev, microsteps))
+        self.steps_per_rev = steps_per_rev
+        self.microsteps = int(microsteps)
+        self.pulses_per_rev = steps_per_rev * self.microsteps
+        self.deg_per_step = 360.0 / self.pulses_per_rev
+
+    # "steps" returns the nearest whole number of steps for an angle (deg)
+    def steps(self, degrees):
+        return int(round(degrees / self.deg_per_step))
+
+    # "degrees" returns the angle of a number of steps (deg)
+    def degrees(self, steps):
+        return steps * self.deg_per_step
+
+    # "rate" returns the step rate of a speed setting (steps/s)
+    def rate(self, speed):
+        return speed * SPEED_SCALE / self.deg_per_step
+
+    # "speed" returns the speed setting that gives a step rate
+    def speed(self, rate):
+        return rate * self.deg_per_step / SPEED_SCALE
+
+
+FULL_STEP = StepConfig()
+
+
+class StepSchedule(object):
+
+    # ----------------
+    # Parameter:    edges - List of (offset, pin, value), offsets in seconds from the start of the schedule
+    #               duration - Length of the schedule (s), the next schedule starts at start + duration
+    #               steps - Number of steps in the schedule
+    #               step_pin - Pin that receives the step pulses
+    #               decel - Deceleration used to stop part way through the schedule (steps/s^2)
+    #               sign - +1 if the steps turn clockwise, -1 if counterclockwise (counted in MotionEngine.position)
+    # ----------------
+    def __init__(self, edges, duration, steps, step_pin=None, decel=STOP_DECEL/DEG_PER_STEP, sign=1):
+        self.edges = edges
+        self.duration = duration
+        self.steps = steps
+        self.step_pin = step_pin
+        self.decel = decel
+        self.sign = sign
+        self.prepared = None        # pin states of the edges, made by MotionEngine.prepare
+        self.prepared_for = None    # GPIO backend "prepared" was made for
+
+
+class RampProfile(object):
+
+    # ----------------
+    # Acceleration ramp from rest to "rate", all values in steps (steps/s, steps/s^2, steps/s^3)
+    #
+    # Parameter:    rate - Speed at the end of the ramp (steps/s)
+    #               accel - Acceleration limit (steps/s^2)
+    #               jerk - Jerk limit (steps/s^3), None for a trapezoid (constant acceleration) ramp
+    # ----------------
+    def __init__(self, rate, accel, jerk=None):
+        self.rate = rate
+        if jerk is None:
+            self.t1 = 0.0                           # no jerk phase
+            self.peak_accel = accel
+            self.t2 = rate / accel                  # constant acceleration phase
+        elif accel * accel / jerk >= rate:
+            self.t1 = math.sqrt(rate / jerk)        # acceleration limit never reached
+            self.peak_accel = jerk * self.t1
+            self.t2 = 0.0
+        else:
+            self.t1 = accel / jerk
+            self.peak_accel = accel
+            self.t2 = rate / accel - self.t1
+        self.jerk = jerk or 0.0
+        self.duration = 2 * self.t1 + self.t2
+        self.distance = rate * self.duration / 2     # ramp is symmetric about its mid point
+
+    # ----------------
+    # "position" returns the distance covered at time t (steps)
+    # ----------------
+    def position(self, t):
+        j, a, t1, t2 = self.jerk, self.peak_accel, self.t1, self.t2
+        if t <= t1:
+            return j * t**3 / 6
+        x1 = j * t1**3 / 6
+        v1 = j * t1**2 / 2
+        if t <= t1 + t2:
+            tau = t - t1
+            return x1 + v1 * tau + a * tau**2 / 2
+        x2 = x1 + v1 * t2 + a * t2**2 / 2
+        v2 = v1 + a * t2
+        tau = min(t, self.duration) - t1 - t2
+        return x2 + v2 * tau + a * tau**2 / 2 - j * tau**3 / 6
+
+    # ----------------
+    # "time_at" returns the time the ramp reaches distance x (steps), x must be within the ramp
+    # ----------------
+    def time_at(self, x):
+        if x <= 0:
+            return 0.0
+        if self.t1 == 0.0:
+            return math.sqrt(2 * x / self.peak_accel)
+        lo, hi = 0.0, self.duration
+        for i in range(48):             # bisection, position only ever increases with time
+            mid = (lo + hi) / 2
+            if self.position(mid) < x:
+                lo = mid
+            else:
+                hi = mid
+        return hi
+
+
+# ----------------
+# "ramp_for_stroke" creates the acceleration ramp of a stroke, lowering the peak speed if
+# the stroke is too short to accelerate to "rate" and decelerate back to rest
+#
+# Return:       ramp - RampProfile
+# ----------------
+def ramp_for_stroke(steps, rate, accel, jerk=None):
+    ramp = RampProfile(rate, accel, jerk)
+    if 2 * ramp.distance <= steps:
+        return ramp
+    lo, hi = 0.0, rate
+    for i in range(48):
+        mid = (lo + hi) / 2
+        if 2 * RampProfile(mid, accel, jerk).distance <= steps:
+            lo = mid
+        else:
+            hi = mid
+    return RampProfile(lo, accel, jerk)
+
+
+# ----------------
+# "step_times" returns the time of each step of a stroke and the length of the stroke
+#
+# Step k is taken when the stroke has covered k steps, the stroke ends when it covered all of them.
+#
+# Parameter:    steps - Number of steps
+#               rate - Set speed (steps/s)
+#               accel - Acceleration limit (steps/s^2), 0 for no ramp
+#               jerk - Jerk limit (steps/s^3), None for a trapezoid ramp
+#
+# Return:       times - List of step times from the start of the stroke (s)
+#               duration - Length of the stroke (s)
+# ----------------
+def step_times(steps, rate, accel=0.0, jerk=None):
+    if not rate > 0:
+        raise ValueError("step rate must be positive, got %r" % (rate,))
+    if accel <= 0 or steps == 0:
+        return [k / rate for k in range(steps)], steps / rate
+    ramp = ramp_for_stroke(steps, rate, accel, jerk)
+    cruise = (steps - 2 * ramp.distance) / ramp.rate if ramp.rate > 0 else 0.0
+    duration = 2 * ramp.duration + cruise
+    times = []
+    for k in range(steps):
+        if k <= ramp.distance:
+            times.append(ramp.time_at(k))
+        elif k < steps - ramp.distance:
+            times.append(ramp.duration + (k - ramp.distance) / ramp.rate)
+        else:
+            times.append(duration - ramp.time_at(steps - k))
+    return times, duration
+
+
+# ----------------
+# "stroke_schedule" creates the schedule for one stroke: dwell, set direction, then step
+#
+# STEP is held HIGH for half the time to the next step, like the original loop did
+#
+# Parameter:    dir_pin, step_pin - GPIO pins of the motor driver
+#               direction - Value written to the DIR pin
+#               times - Step times from the start of the stroke (s), see "step_times"
+#               duration - Length of the stroke (s)
+#               dwell - Wait before the stroke starts (s)
+#               decel - Deceleration used to stop part way through the stroke (steps/s^2)
+#               sign - +1 for a clockwise stroke, -1 for counterclockwise
+#
+# Return:       schedule - StepSchedule
+# ----------------
+def stroke_schedule(dir_pin, step_pin, direction, times, duration, dwell=0.0, decel=STOP_DECEL/DEG_PER_STEP, sign=1):
+    edges = [(dwell, dir_pin, direction)]
+    count = len(times)
+    for k in range(count):
+        t = dwell + times[k]
+        following = dwell + (times[k+1] if k + 1 < count else duration)
+        edges.append((t, step_pin, 1))
+        edges.append(((t + following) / 2, step_pin, 0))
+    return StepSchedule(edges, dwell + duration, count, step_pin, decel, sign)
+
+
+# ----------------
+# "decel_times" returns the step times to slow from "rate" to rest
+#
+# Parameter:    rate - Speed when slowing starts (steps/s)
+#               decel - Deceleration (steps/s^2)
+#
+# Return:       times - Step times from the first slowing step (s), the first step is at 0
+#               duration - Time until rest (s)
+# ----------------
+def decel_times(rate, decel):
+    count = int(rate * rate / (2 * decel))
+    times = [0.0]
+    for x in range(1, count + 1):
+        times.append((rate - math.sqrt(max(rate * rate - 2 * decel * x, 0.0))) / decel)
+    return times, rate / decel
+
+
+# ----------------
+# "decel_time" returns the time from the first step until the motor is at rest when slowing down from
+# "rate" at "decel" with at most "steps" steps (None = no limit)
+# ----------------
+def decel_time(rate, decel, steps=None):
+    full = rate / decel
+    if steps is None or 2 * decel * steps >= rate * rate:
+        return full
+    return (rate - math.sqrt(rate * rate - 2 * decel * steps)) / decel
+
+
+# ----------------
+# "stop_latency_bound" returns the worst-case time from "request_stop" to the last step of a schedule (s)
+# A stop before step k slows down from the rate of step k with the steps left in the schedule (see "decelerate")
+# ----------------
+def stop_latency_bound(schedule):
+    times = [offset for offset, pin, value in schedule.edges if pin == schedule.step_pin and value]
+    bound = STOP_POLL
+    for k in range(1, len(times)):
+        interval = times[k] - times[k-1]
+        if interval > 0:
+            bound = max(bound, interval + decel_time(1.0 / interval, schedule.decel, len(times) - k))
+    return bound
+
+
+# ----------------
+# "shake_schedules" creates the 2 stroke schedules of one shake cycle
+#
+# Parameter:    dir_pin, step_pin - GPIO pins of the motor driver
+#               speed - Motor speed setting (deg/s)
+#               dor - Degrees of rotation (deg)
+#               dwell - Time between clockwise and counterclockwise rotation (s)
+#               cw, ccw - DIR pin values for clockwise and counterclockwise
+#               accel - Acceleration limit (deg/s^2), used by PROFILE_TRAPEZOID and PROFILE_SCURVE
+#               jerk - Jerk limit (deg/s^3), used by PROFILE_SCURVE
+#               profile - PROFILE_NONE, PROFILE_TRAPEZOID or PROFILE_SCURVE
+#               config - StepConfig of the motor and driver
+#
+# Return:       [cw_schedule, ccw_schedule]
+# ----------------
+def shake_schedules(dir_pin, step_pin, speed, dor, dwell, cw=1, ccw=0, accel=0.0, jerk=0.0, profile=PROFILE_NONE,
+                    config=FULL_STEP):
+    rate, step_accel, step_jerk, decel = step_limits(speed, accel, jerk, profile, config)
+    steps = config.steps(dor)
+    times, duration = step_times(steps, rate, step_accel, step_jerk)
+    return [stroke_schedule(dir_pin, step_pin, cw, times, duration, dwell, decel, 1),
+            stroke_schedule(dir_pin, step_pin, ccw, times, duration, dwell, decel, -1)]
+
+
+# ----------------
+# "move_schedule" creates the stroke that turns the motor a number of steps, with the ramp of the shake settings
+#
+# Parameter:    dir_pin, step_pin - GPIO pins of the motor driver
+#               steps - Steps to turn, more than 0 turns clockwise, less than 0 counterclockwise
+#               speed, accel, jerk, profile, config - As "shake_schedules"
+#               cw, ccw - DIR pin values for clockwise and counterclockwise
+#
+# Return:       schedule - StepSchedule
+# ----------------
+def move_schedule(dir_pin, step_pin, steps, speed, cw=1, ccw=0, accel=0.0, jerk=0.0, profile=PROFILE_NONE,
+                  config=FULL_STEP):
+    rate, step_accel, step_jerk, decel = step_limits(speed, accel, jerk, profile, config)
+    times, duration = step_times(abs(steps), rate, step_accel, step_jerk)
+    if steps >= 0:
+        return stroke_schedule(dir_pin, step_pin, cw, times, duration, 0.0, decel, 1)
+    return stroke_schedule(dir_pin, step_pin, ccw, times, duration, 0.0, decel, -1)
+
+
+# ----------------
+# "step_limits" converts the motor settings to step units
+#
+# Return:       rate - Step rate (steps/s)
+#               step_accel - Acceleration (steps/s^2), 0 = no ramp
+#               step_jerk - Jerk (steps/s^3), None = no jerk limit
+#               decel - Deceleration used to stop part way through a stroke (steps/s^2)
+# ----------------
+def step_limits(speed, accel=0.0, jerk=0.0, profile=PROFILE_NONE, config=FULL_STEP):
+    rate = config.rate(speed)       # full steps: speed/0.2 steps/s, the step timing the motor has always used
+    step_accel = 0.0
+    step_jerk = None
+    if profile != PROFILE_NONE and accel > 0:
+        step_accel = accel/config.deg_per_step
+        if profile == PROFILE_SCURVE and jerk > 0:
+            step_jerk = jerk/config.deg_per_step
+    decel = step_accel if step_accel > 0 else STOP_DECEL/config.deg_per_step
+    return rate, step_accel, step_jerk, decel
+
+
+class MotionEngine(object):
+
+    # ----------------
+    # Parameter:    gpio - GPIO backend (RPi.GPIO module or gpio_backends.SimulatedGPIO)
+    #               now - Clock used for the deadlines (s)
+    #               sleep - Sleep function matching "now"
+    #               spin - Time before each deadline that is busy-waited instead of slept, in units of "now"
+    #                      (SPIN times the clock speed when "now" runs faster than real time)
+    #               max_rate - Fastest step rate the engine times reliably with this GPIO backend (steps/s)
+    #               prepare - Write prepared pin states when the GPIO backend has them, False always uses "output"
+    # ----------------
+    def __init__(self, gpio, now=time.perf_counter, sleep=time.sleep, spin=SPIN, max_rate=MAX_STEP_RATE, prepare=True):
+        self.gpio = gpio
+        self.use_prepared = prepare and hasattr(gpio, 'prepare') and hasattr(gpio, 'output_prepared')
+        self.now = now
+        self.sleep = sleep
+        self.spin = spin
+        self.max_rate = max_rate
+        self.stop_event = threading.Event()
+        self.stopped = False        # True once a schedule was cut short by a stop request
+        self.position = 0           # steps from the start position, clockwise = positive
+        # Timing statistics
+        self.edges = 0
+        self.late_edges = 0         # output changes made after their deadline + spin
+        self.max_late = 0.0         # latest output change (s)
+        self.resyncs = 0            # times the schedule was shifted back
+        self.resync_time = 0.0      # time the schedules were shifted back by (s), the motor made no steps in it
+        self.step_timing = StepTimingRecorder()
+
+    # ----------------
+    # "request_stop" asks the engine to bring the motor to rest, can be called from any thread
+    # ----------------
+    def request_stop(self):
+        self.stop_event.set()
+
+    # ----------------
+    # "reset" clears a stop request so the engine can be used for the next move
+    # ----------------
+    def reset(self):
+        self.stop_event.clear()
+        self.stopped = False
+        self.step_timing.restart()
+
+    # ----------------
+    # "prepare" packs the pin states of a schedule's edges for the GPIO backend, if not done already
+    # Can be called before "play" (ex: while making the next schedule) so "play" does not have to
+    #
+    # Return:       prepared - List of prepared pin states, one per edge, None if the backend has none
+    # ----------------
+    def prepare(self, schedule):
+        if not self.use_prepared:
+            return None
+        if schedule.prepared_for is not self.gpio:
+            states = [{pin: value} for offset, pin, value in schedule.edges]
+            if states and schedule.step_pin is not None and schedule.step_pin not in states[0]:
+                states[0][schedule.step_pin] = 0        # start from STEP LOW, whatever was written before
+            schedule.prepared = self.gpio.prepare(states)
+            schedule.prepared_for = self.gpio
+        return schedule.prepared
+
+    # ----------------
+    # "wait_until" waits for a deadline, sleeping most of the time and busy-waiting the end
+    #
+    # Return:       True if a stop was requested while waiting
+    # ----------------
+    def wait_until(self, deadline):
+        stop = self.stop_event
+        remaining = deadline - self.now()
+        while remaining > self.spin:
+            if stop.is_set():
+                return True
+            self.sleep(min(remaining - self.spin, STOP_POLL))
+            remaining = deadline - self.now()
+        while self.now() < deadline:
+            pass
+        return stop.is_set()
+
+    # ----------------
+    # "play" makes each output change of a schedule at its deadline
+    #
+    # Parameter:    schedule - StepSchedule
+    #               start - Time the schedule starts (None starts now)
+    #
+    # Return:       end - Time the schedule ended, start of the next schedule
+    #               If a stop was requested, the motor is brought to rest, "stopped" is set and
+    #               the time it came to rest is returned
+    # ----------------
+    def play(self, schedule, start=None):
+        if start is None:
+            start = self.now()
+        output = self.gpio.output
+        prepared = self.prepare(schedule)
+        write = self.gpio.output_prepared if prepared is not None else None
+        now = self.now
+        edges = schedule.edges
+        step_pin = schedule.step_pin
+        sign = schedule.sign
+        record = self.step_timing.add
+        last_step = None            # offset of the last step pulse in this schedule
+        done = 0                    # steps made in this schedule
+        for i in range(len(edges)):
+            offset, pin, value = edges[i]
+            deadline = start + offset
+            if self.wait_until(deadline) and not (pin == step_pin and not value):
+                # finish the step pulse in progress, then slow down if moving
+                self.stopped = True
+                if pin == step_pin and last_step is not None and offset > last_step:
+                    return self.decelerate(1.0 / (offset - last_step), schedule.decel, step_pin, deadline, sign,
+                                           schedule.steps - done)
+                return now()
+            if write is None:
+                output(pin, value)
+            else:
+                write(prepared[i])
+            t = now()
+            late = t - deadline
+            self.edges += 1
+            if pin == step_pin and value:
+                last_step = offset
+                done += 1
+                self.position += sign
+                record(t, late)
+            if late > self.spin:
+                self.late_edges += 1
+                if late > self.max_late:
+                    self.max_late = late
+                # making up more than the time to the next change would squeeze steps together
+                if i + 1 < len(edges):
+                    gap = edges[i+1][0] - offset
+                    if gap > 0 and late > gap:
+                        start += late
+                        self.resyncs += 1
+                        self.resync_time += late
+        if self.stop_event.is_set():
+            self.stopped = True
+        return start + schedule.duration
+
+    # ----------------
+    # "decelerate" steps the motor from "rate" to rest, the first step is at "start"
+    #
+    # Parameter:    sign - Direction of the steps, counted in "position"
+    #               steps - Most steps made (the steps left in the stroke), None = as many as slowing down takes
+    #
+    # Return:       end - Time the motor came to rest
+    # ----------------
+    def decelerate(self, rate, decel, step_pin, start, sign=1, steps=None):
+        if self.use_prepared:
+            high, low = self.gpio.prepare([{step_pin: 1}, {step_pin: 0}])
+            write = self.gpio.output_prepared
+            step_high = lambda: write(high)
+            step_low = lambda: write(low)
+        else:
+            output = self.gpio.output
+            step_high = lambda: output(step_pin, 1)
+            step_low = lambda: output(step_pin, 0)
+        now = self.now
+        record = self.step_timing.add
+        times, duration = decel_times(rate, decel)
+        count = len(times) if steps is None else max(min(steps, len(times)), 0)
+        for k in range(count):
+            following = times[k+1] if k + 1 < len(times) else duration
+            deadline = start + times[k]
+            self._wait(deadline)
+            step_high()
+            t = now()
+            record(t, t - deadline)
+            self.position += sign
+            self._wait(start + (times[k] + following) / 2)
+            step_low()
+            self.edges += 2
+        return start + (times[count] if count < len(times) else duration)
+
+    # waits for a deadline without checking for a stop request
+    def _wait(self, deadline):
+        remaining = deadline - self.now()
+        if remaining > self.spin:
+            self.sleep(remaining - self.spin)
+        while self.now() < deadline:
+            pass
+
+    def stats(self):
+        return {'edges': self.edges, 'late_edges': self.late_edges, 'max_late': self.max_late, 'resyncs': self.resyncs,
+                'resync_time': self.resync_time}
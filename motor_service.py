@@ -0,0 +1,372 @@
+# --------------------------------
+# Written for the Cooler-Shaker System
+# Github: https://github.com/alopez505/cooler_shaker
+# --------------------------------
+#
+# --------------------------------
+# MotorService is the only thread that moves the motor
+#
+# It is started once with the program and runs until the program ends. The GUI and the Modbus server
+# send it commands through a queue instead of creating a new thread for every button press:
+#   shake   - start the shake cycle with the given ShakeParams
+#   halt    - bring the motor to rest
+#   jog     - turn a number of steps (or until halted) in one direction
+#             Turning until halted uses the step pulser when one is given (hardware PWM, see gpio_backends.py),
+#             the service thread then only sets the frequency and waits for the halt
+#   move_to - turn to an angle from the start position, with the speed and ramp of the shake parameters
+#   update  - change the shake parameters, also while shaking
+#
+# Commands that start or stop motion (shake, halt, jog, stop) interrupt the move in progress right away
+# through MotionEngine.request_stop, then run in the order they were sent. "update" never interrupts.
+#
+# Live updates: a running shake checks for new parameters at every stroke boundary and plays the next
+# stroke with them, the shaking does not stop. The new schedule is made during the dwell at the start of
+# that stroke, so it only costs time when the dwell is shorter than making the schedule.
+# A new degrees of rotation is only taken at the end of a full cycle (back at the start position),
+# so the shake stays centred on the start position.
+#
+# "add_callback" functions are called with the ShakeParams the motor is using whenever they change,
+# and with None when the shake ends. They run in the motor service thread.
+#
+# Steps: "config" (StepConfig) gives the step angle of the motor and driver, with microstepping every step
+# count, rate and position is in microsteps. A speed that needs a faster step rate than the engine times
+# reliably (MotionEngine.max_rate) or the pulser makes evenly is limited to it, with a warning, and the
+# limited speed is the one reported to "add_callback" functions. Jog rates are limited the same way.
+#
+# Position: every step is counted by the MotionEngine ("position" gives it in degrees, clockwise = positive,
+# 0 = where the motor was when the program started). "add_rest_callback" functions are called when the
+# motor comes to rest with no other command waiting, with the command that ended and the position.
+# A rest callback with CMD_SHAKE means the shake ended by itself (no valid speed, or an error), not by a halt.
+# --------------------------------
+import logging
+import queue
+import threading
+
+from motion import shake_schedules, move_schedule, step_times, stroke_schedule, stop_latency_bound
+from motion import FULL_STEP, STOP_DECEL, PROFILE_NONE, PROFILE_NAMES
+
+log = logging.getLogger(__name__)
+
+CMD_SHAKE = 'shake'
+CMD_HALT = 'halt'
+CMD_JOG = 'jog'
+CMD_MOVE = 'move'
+_STOP = 'stop'          # ends the service thread
+
+STATE_IDLE = 'idle'
+STATE_SHAKING = 'shaking'
+STATE_JOGGING = 'jogging'
+STATE_MOVING = 'moving'
+MOTOR_STATES = [STATE_IDLE, STATE_SHAKING, STATE_JOGGING, STATE_MOVING]   # index is the motor state code saved in the history
+
+JOG_CHUNK = 200         # full steps per schedule when jogging until halted
+
+
+class ShakeParams(object):
+
+    # ----------------
+    # Parameter:    speed - Motor speed (deg/s)
+    #               dor - Degrees of rotation (deg)
+    #               dwell - Time between clockwise and counterclockwise rotation (s)
+    #               accel - Acceleration limit (deg/s^2)
+    #               jerk - Jerk limit (deg/s^3)
+    #               profile - PROFILE_NONE, PROFILE_TRAPEZOID or PROFILE_SCURVE
+    # ----------------
+    def __init__(self, speed=0.0, dor=0.0, dwell=0.0, accel=0.0, jerk=0.0, profile=PROFILE_NONE):
+        self.speed = speed
+        self.dor = dor
+        self.dwell = dwell
+        self.accel = accel
+        self.jerk = jerk
+        self.profile = profile
+
+    def values(self):
+        return (self.speed, self.dor, self.dwell, self.accel, self.jerk, self.profile)
+
+    def __eq__(self, other):
+        return isinstance(other, ShakeParams) and self.values() == other.values()
+
+    def __ne__(self, other):
+        return not self == other
+
+
+class MotorService(threading.Thread):
+
+    # ----------------
+    # Parameter:    engine - MotionEngine driving the STEP / DIR pins, only used from this thread
+    #               dir_pin, step_pin - GPIO pins of the motor driver
+    #               cw, ccw - DIR pin values for clockwise and counterclockwise
+    #               pulser - Step pulser on the STEP pin for continuous jogs, None steps them with the engine
+    #               config - StepConfig of the motor and driver (steps per revolution, microsteps)
+    # ----------------
+    def __init__(self, engine, dir_pin, step_pin, cw=1, ccw=0, pulser=None, config=FULL_STEP):
+        super(MotorService, self).__init__(name="MotorService")
+        self.daemon = True
+        self.engine = engine
+        self.dir_pin = dir_pin
+        self.step_pin = step_pin
+        self.cw = cw
+        self.ccw = ccw
+        self.pulser = pulser
+        self.config = config
+        self.params = ShakeParams()
+        self.active = None          # ShakeParams of the running shake, None when not shaking
+        self.state = STATE_IDLE
+        self.callbacks = []
+        self.rest_callbacks = []
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._interrupts = 0        # queued commands that interrupt motion
+        self._pending = None        # ShakeParams sent by "update", not used yet
+
+    # ----------------
+    # "add_callback" registers a function called when the parameters in use change
+    #
+    # Parameter:    callback - function(params), params is a ShakeParams or None when the shake ended
+    # ----------------
+    def add_callback(self, callback):
+        self.callbacks.append(callback)
+
+    # ----------------
+    # "add_rest_callback" registers a function called when the motor comes to rest with no other command waiting
+    #
+    # Parameter:    callback - function(command, position), command is the last command run (CMD_SHAKE,
+    #                          CMD_HALT, CMD_JOG or CMD_MOVE), position is in degrees (see "position")
+    # ----------------
+    def add_rest_callback(self, callback):
+        self.rest_callbacks.append(callback)
+
+    # ----------------
+    # "position" returns the motor angle from the start position (degrees, clockwise = positive)
+    # ----------------
+    def position(self):
+        return self.config.degrees(self.engine.position)
+
+    # ----------------
+    # "max_speed" returns the fastest speed setting the engine can step
+    # ----------------
+    def max_speed(self):
+        return self.config.speed(self.engine.max_rate)
+
+    # ----------------
+    # "shake" starts the shake cycle, params None uses the last parameters sent
+    # ----------------
+    def shake(self, params=None):
+        if params is not None:
+            self.update(params)
+        self._send(CMD_SHAKE, interrupt=True)
+
+    def halt(self):
+        self._send(CMD_HALT, interrupt=True)
+
+    # ----------------
+    # Parameter:    direction - Value written to the DIR pin
+    #               steps - Number of steps, None turns until "halt"
+    #               rate - Step rate (steps/s, microsteps/s when microstepping)
+    # ----------------
+    def jog(self, direction, steps, rate):
+        self._send(CMD_JOG, direction, steps, rate, interrupt=True)
+
+    # ----------------
+    # "move_to" turns the motor to an angle, the nearest whole step is used
+    #
+    # Parameter:    angle - Angle from the start position (degrees, clockwise = positive)
+    # ----------------
+    def move_to(self, angle):
+        self._send(CMD_MOVE, angle, interrupt=True)
+
+    # ----------------
+    # "update" replaces the shake parameters, a running shake uses them from the next stroke boundary
+    # Parameters with a speed that is not above 0 are ignored (logged), the last parameters stay in use
+    # ----------------
+    def update(self, params):
+        if not params.speed > 0:
+            log.warning("Motor speed %r is not above 0, parameters ignored" % (params.speed,))
+            return
+        with self._lock:
+            self._pending = params
+
+    # ----------------
+    # "stop" halts the motor and ends the service thread
+    # ----------------
+    def stop(self):
+        self._send(_STOP, interrupt=True)
+
+    def _send(self, command, *args, **kwargs):
+        with self._lock:
+            self._queue.put((command, args))
+            if kwargs.get('interrupt'):
+                self._interrupts += 1
+                self.engine.request_stop()
+
+    def run(self):
+        log.debug("Motor service running")
+        while True:
+            command, args = self._queue.get()
+            with self._lock:
+                self._interrupts -= 1
+                if command == _STOP:
+                    break
+                if self._interrupts:
+                    continue        # a newer command already interrupted this one
+                self.engine.reset()
+            try:
+                if command == CMD_SHAKE:
+                    self.state = STATE_SHAKING
+                    self._shake()
+                elif command == CMD_JOG:
+                    self.state = STATE_JOGGING
+                    self._jog(*args)
+                elif command == CMD_MOVE:
+                    self.state = STATE_MOVING
+                    self._move(*args)
+            except Exception:
+                log.exception("Motor command " + command + " failed")
+            self.state = STATE_IDLE
+            self._at_rest(command)
+        log.debug("Motor service stopped")
+
+    # ----------------
+    # "_shake" plays the strokes of the shake cycle until interrupted, taking new parameters at stroke boundaries
+    # ----------------
+    def _shake(self):
+        engine = self.engine
+        params = self._take_pending(True) or self.params
+        if not params.speed > 0:
+            log.warning("Motor speed is 0, not shaking")
+            return
+        active = self._limit(params)
+        schedules = self._schedules(active)
+        self._set_active(active)
+        stroke = 0          # 0 = clockwise stroke, 1 = counterclockwise stroke
+        start = None
+        try:
+            while not engine.stopped:
+                start = engine.play(schedules[stroke], start)
+                stroke = 1 - stroke
+                new = self._take_pending(stroke == 0)
+                if new is not None and new != params:
+                    log.debug("Motor parameters changed while running, speed %.1f dor %.1f dwell %.1f" % (new.speed, new.dor, new.dwell))
+                    params = new
+                    active = self._limit(params)
+                    schedules = self._schedules(active)
+                    self._set_active(active)
+        finally:
+            self._set_active(None)
+        log.debug("Ended Motor Operation, timing: " + str(engine.stats()))
+
+    # ----------------
+    # "_take_pending" returns the parameters sent by "update" since the last call, or None
+    #
+    # Parameter:    at_start - True at the start position, a new degrees of rotation waits until then
+    # ----------------
+    def _take_pending(self, at_start):
+        with self._lock:
+            params = self._pending
+            if params is None:
+                return None
+            if not at_start and self.active is not None and params.dor != self.active.dor:
+                return None
+            self._pending = None
+        self.params = params
+        return params
+
+    def _schedules(self, params):
+        log.debug("Motor Running, ramp: " + PROFILE_NAMES[params.profile])
+        schedules = shake_schedules(self.dir_pin, self.step_pin, params.speed, params.dor, params.dwell,
+                                    self.cw, self.ccw, params.accel, params.jerk, params.profile, self.config)
+        log.debug("Worst-case stop time: %.3f s" % max(stop_latency_bound(schedule) for schedule in schedules))
+        for schedule in schedules:
+            self.engine.prepare(schedule)       # pin states are packed now, during the dwell, not while stepping
+        return schedules
+
+    # ----------------
+    # "_limit" returns the parameters with the speed limited to "max_speed"
+    # ----------------
+    def _limit(self, params):
+        top = self.max_speed()
+        if params.speed <= top:
+            return params
+        log.warning("Motor speed %.1f needs %.0f steps/s, faster than the %.0f steps/s the motor can be stepped at, using speed %.1f"
+                    % (params.speed, self.config.rate(params.speed), self.engine.max_rate, top))
+        return ShakeParams(top, params.dor, params.dwell, params.accel, params.jerk, params.profile)
+
+    # ----------------
+    # "_limit_rate" returns a step rate limited to "top" (steps/s)
+    # ----------------
+    def _limit_rate(self, rate, top):
+        if top is None or rate <= top:
+            return rate
+        log.warning("Jog rate %.0f steps/s limited to %.0f steps/s" % (rate, top))
+        return top
+
+    def _set_active(self, params):
+        self.active = params
+        for callback in self.callbacks:
+            try:
+                callback(params)
+            except Exception:
+                log.exception("Motor parameter callback failed")
+
+    def _at_rest(self, command):
+        with self._lock:
+            if self._interrupts:
+                return          # the next command moves the motor again
+        position = self.position()
+        for callback in self.rest_callbacks:
+            try:
+                callback(command, position)
+            except Exception:
+                log.exception("Motor rest callback failed")
+
+    def _move(self, angle):
+        params = self._limit(self._take_pending(True) or self.params)
+        steps = self.config.steps(angle) - self.engine.position
+        log.debug("Moving to %.1f deg (%d steps)" % (angle, steps))
+        if steps == 0:
+            return
+        if params.speed <= 0:
+            log.warning("Motor speed is 0, not moving")
+            return
+        schedule = move_schedule(self.dir_pin, self.step_pin, steps, params.speed, self.cw, self.ccw,
+                                 params.accel, params.jerk, params.profile, self.config)
+        self.engine.play(schedule)
+
+    def _jog(self, direction, steps, rate):
+        if steps is None and self.pulser is not None:
+            self._pulse(direction, self._limit_rate(rate, self.pulser.MAX_FREQUENCY))
+            return
+        rate = self._limit_rate(rate, self.engine.max_rate)
+        count = JOG_CHUNK * self.config.microsteps if steps is None else steps
+        times, duration = step_times(count, rate)
+        sign = 1 if direction == self.cw else -1
+        schedule = stroke_schedule(self.dir_pin, self.step_pin, direction, times, duration,
+                                   decel=STOP_DECEL/self.config.deg_per_step, sign=sign)
+        engine = self.engine
+        start = engine.play(schedule)
+        while steps is None and not engine.stopped:
+            start = engine.play(schedule, start)
+
+    # ----------------
+    # "_pulse" turns the motor with the step pulser until a halt (or any other command) arrives
+    #
+    # If the pulser fails to stop (ex: sysfs write error) the pulses are worked out from the time it ran,
+    # so the position is still counted, and the failure is logged
+    # ----------------
+    def _pulse(self, direction, rate):
+        engine = self.engine
+        engine.gpio.output(self.dir_pin, direction)
+        self.pulser.start(rate)
+        started = engine.now()
+        pulses = 0
+        try:
+            engine.stop_event.wait()
+        finally:
+            try:
+                pulses = self.pulser.stop()
+            except Exception:
+                pulses = int((engine.now() - started) * rate)
+                log.exception("Step pulser failed to stop, position counted from the time it ran (%d pulses)" % pulses)
+            engine.position += pulses if direction == self.cw else -pulses
+            engine.stopped = True
+        log.debug("Step pulser ran %d pulses at %.1f Hz" % (pulses, rate))
@@ -16,10 +16,18 @@
 # - Power Supply
 # --------------------------------
 #
+# --------------------------------
+# startup_timing measures each phase of the program start (see "Startup:" in the log)
+# Created first so the imports are part of the report
+# --------------------------------
+from startup_timing import StartupTimer
+startup = StartupTimer()
+
 # --------------------------------
 # PyQt5 is the main framework used to create the GUI
 #
 # Each window used in this program inherits QMainWindow
+# The settings windows are only built the first time they are opened
 #
 # QThread is used to take advantage of multithreading. The GUI controlls the main thread, 
 # therfore the Modbus server and motor worker must run in seperate threads
@@ -27,46 +35,65 @@
 from PyQt5 import QtWidgets, QtCore, QtGui
 from PyQt5.QtCore import QObject, QThread, pyqtSignal, QTimer, Qt
 from PyQt5.QtWidgets import QApplication, QMainWindow
+from view_model import set_value, set_index, ShownState, solid_palette     # only redraw widgets whose value changed
 
 # --------------------------------
 # PyQtGraph creates the graph on the mainscreen
 # note: Although graph can be turned of in "General Setting" menu, the graph is still running
+# pyqtgraph (and numpy) are imported by "MyWindow.initGraph" once the main screen is shown
 # --------------------------------
-from pyqtgraph import PlotWidget, mkPen
 
 # --------------------------------
 # PyModbus creates Modbus server
 # This code uses an asynchronous server
+# pymodbus is imported by "ServerWorker.work" in the Modbus server thread, so it does not hold up the main screen
+# --------------------------------
+from versioned_state import VersionedState          # passes main screen values to the Modbus server without waiting
+
 # --------------------------------
-from pymodbus.version import version
-from pymodbus.server.asynchronous import StartTcpServer
-from pymodbus.device import ModbusDeviceIdentification
-from pymodbus.datastore import ModbusSequentialDataBlock
-from pymodbus.datastore import ModbusSlaveContext, ModbusServerContext
-from pymodbus.transaction import ModbusRtuFramer, ModbusAsciiFramer
+# register_codec converts float values to and from 16-bit register values (IEEE 745 format)
+# --------------------------------
+from register_codec import floats_to_registers, registers_to_floats
 
 # --------------------------------
 # twisted is used for the LoopingCall functionality
-# LoopingCall alows a function to be called repeatedly
+# LoopingCall alows a function to be called repeatedly, TaskScheduler runs one LoopingCall per task
+# reactor.callFromThread runs a function in the Modbus server thread (see "ServerWorker.callInServer")
+# twisted is imported by "ServerWorker.work" in the Modbus server thread, "reactor" is None until then
 # --------------------------------
-from twisted.internet.task import LoopingCall
+reactor = None
 
 # --------------------------------
 # time for all time based events
+# All delays and timestamps go through "clock" (Clock), which can run faster than real time with the sim backend
 # --------------------------------
-import time
-from time import sleep
+from clock import Clock, ReactorClock
+clock = Clock()
 
 # --------------------------------
 # sys used to configure with Python runtime environment
 # --------------------------------
 import sys
 
+# --------------------------------
+# hal opens the serial port and GPIO pins of the backend chosen with "--backend hardware" or "--backend sim"
+# Nothing is opened at import, "openHardware" is called before the GUI starts
+# --------------------------------
+import hal
+
 # --------------------------------
 # serial module alows for communication with the "TE Tech TC-36-25-RS485" temperature controller
+# Each command is sent with one write and each reply read with one read via TC36Transport
+# The timeout is the deadline for a full reply
+# All commands to the controller go through "controller" (TC36Driver)
+# "arbiter" (SerialArbiter) is the only thread that uses "controller", commands are submitted to its priority queue
 # --------------------------------
-import serial
-ser=serial.Serial('/dev/ttyUSB0', 115200, timeout=1)       # using /dev/ttyUSB0 port on Raspi 
+from tc36_transport import TC36Transport
+from tc36_driver import TC36Driver
+from serial_arbiter import SerialArbiter, PRIORITY_SETPOINT, PRIORITY_ALARM, PRIORITY_TEMP
+ser = None
+controller = None
+arbiter = None
 
 # --------------------------------
 # logging module to keep track of changes in the system
@@ -77,39 +104,89 @@ log = logging.getLogger()
 log.setLevel(logging.DEBUG)
 
 # --------------------------------
-# RPi.GPIO module allows access to GPIO pins on Raspi
+# RPi.GPIO module allows access to GPIO pins on Raspi (or SimulatedGPIO with the sim backend)
 # Pins are connected to a "STEP & DIR" motor driver
 # --------------------------------
-
-import RPi.GPIO as GPIO         #RPIO module to use Raspi GPIO pins
+GPIO = None
 DIR = 20                        # pin 20
 STEP = 21                       # pin 21
 CW = 1                          # CW = 1, CCW = 0 for STEP & DIR controller
 CCW = 0                         
-# -- Setup --
-GPIO.setmode(GPIO.BCM)          
-GPIO.setup(DIR, GPIO.OUT)       
-GPIO.setup(STEP, GPIO.OUT)      
 
 
 # --------------------------------
 # Using a NEMA 23 stepper with 200 steps per rev
+# MICROSTEPS must match the microstep setting of the motor driver (DIP switches), 1 = full steps
+# Steps, rates and positions are in microsteps, the motor speed in deg/s stays the same for any setting
+# motion creates the step schedule of a shake cycle and plays it on the GPIO pins
+# "motor" (MotorService) is the only thread that moves the motor, shake / halt / jog commands are queued to it
 # --------------------------------
-motorSteps = 200  
+STEPS_PER_REV = 200
+MICROSTEPS = 1
+motorSteps = STEPS_PER_REV*MICROSTEPS
+JOG_CLICK_RATE = 500.0*MICROSTEPS       # steps/s of a rotate button click (0.001s HIGH and LOW at full steps)
+JOG_TOGGLE_RATE = MICROSTEPS/0.06       # steps/s while a rotate button is toggled on (0.03s HIGH and LOW at full steps), made by the step pulser
+from motion import MotionEngine, StepConfig, SPIN, PROFILE_NONE, PROFILE_NAMES
+from motor_service import MotorService, ShakeParams, MOTOR_STATES, STATE_IDLE, STATE_SHAKING, STATE_JOGGING, CMD_SHAKE
+motor = None
 
 # --------------------------------
-# Checksum function to send the correct values to controller
-# More information in: TE Tech TC-36-25 RS485 Manual
+# "history" (TemperatureHistory) keeps days of temperature samples in a memory-mapped file, kept across restarts
+# One file per backend, so simulated runs are not mixed with the real system
 # --------------------------------
-def calc_checksum(AA1,AA2,CC1,CC2,DD1,DD2,DD3,DD4,DD5,DD6,DD7,DD8):
-    command_string = [AA1,AA2,CC1,CC2,DD1,DD2,DD3,DD4,DD5,DD6,DD7,DD8]
-    val=0
-    for x in range (0,12):
-        val += ord(command_string[x])
-    val_hex=hex(val)
-    SS1=val_hex[-2]
-    SS2=val_hex[-1]
-    return SS1, SS2
+import os
+from history import TemperatureHistory
+history = None
+
+# --------------------------------
+# alarms keeps the alarm status bits of the temperature controller and a history of the alarms turned on and off
+# --------------------------------
+from alarms import AlarmEngine, alarm_text, event_text, events_to_registers, HISTORY_SIZE as ALARM_HISTORY_SIZE, EVENT_REGISTERS
+from alarms import ALARM_LOW_VOLTAGE, ALARM_OPEN_INPUT1, ALARM_OVER_CURRENT, ALARM_LOW_TEMP, ALARM_HIGH_TEMP
+IR_ALARMS = 14                  # first input register of the alarm section
+IR_POSITION = IR_ALARMS + 3 + ALARM_HISTORY_SIZE*EVENT_REGISTERS   # motor position input registers (81-82)
+HR_MOVE_TO = 14                 # "Move To Angle" holding registers (14-15)
+
+# --------------------------------
+# step_timing measures the error of the time between STEP pulses made by the motor engine (p50 / p99 / max, histogram)
+# --------------------------------
+from step_timing import timing_text, BINS as STEP_TIMING_BINS
+IR_STEP_TIMING = IR_POSITION + 2    # step timing input registers (83-99)
+
+# --------------------------------
+# The main screen graph is drawn from a min/max decimation pyramid fed from the history,
+# so any time range is drawn with about one point per pixel
+# --------------------------------
+from decimation import MinMaxPyramid
+GRAPH_HORIZON = 24*3600         # longest time range on the graph (s)
+GRAPH_RANGES = [('1 min', 60), ('10 min', 600), ('1 hour', 3600), ('6 hours', 6*3600), ('24 hours', 24*3600)]
+GRAPH_FPS = 4                   # graph frames per second, set in "General Settings" (1 to 30)
+
+startup.mark('imports')
+
+
+# --------------------------------
+# "openHardware" opens the serial port and GPIO pins and creates the serial bus and motor threads
+#
+# Parameter:    backend - hal.BACKEND_HARDWARE or hal.BACKEND_SIM
+#               speed - Clock speed, 1 = real time (more than 1 only with the sim backend)
+# --------------------------------
+def openHardware(backend, speed=1.0):
+    global clock, ser, controller, arbiter, GPIO, motor, history
+    log.info("Using " + backend + " backend, clock speed " + str(speed) + "x")
+    clock = Clock(speed)
+    ser = hal.open_serial(backend, clock)
+    controller = TC36Driver(TC36Transport(ser))
+    arbiter = SerialArbiter(controller)
+    GPIO = hal.open_gpio(backend, [DIR, STEP], clock)
+    pulser = hal.open_pulser(backend, GPIO, STEP, clock)       # hardware PWM for the toggle jog
+    max_rate = hal.max_step_rate(backend, GPIO, speed)
+    log.info("Fastest step rate: %.0f steps/s" % max_rate)
+    motor = MotorService(MotionEngine(GPIO, now=clock.now, sleep=clock.sleep, spin=SPIN*speed, max_rate=max_rate),
+                         DIR, STEP, CW, CCW, pulser, StepConfig(STEPS_PER_REV, MICROSTEPS))
+    history = TemperatureHistory(os.path.join(os.path.dirname(os.path.abspath(__file__)), "history_" + backend + ".dat"),
+                                 now=clock.time())
+    log.info("Temperature history: " + str(len(history)) + " samples in " + history.path)
 
 # --------------------------------
 # "ServerWorker" creates the Modbus server in seperate thread via QThread
@@ -129,6 +206,9 @@ def calc_checksum(AA1,AA2,CC1,CC2,DD1,DD2,DD3,DD4,DD5,DD6,DD7,DD8):
 # +---------+--------------+------+------------------------------------+--------------+
 # | 0       | Motor Status | BOOL | False = Motor off, True = Motor on | Read & Write |
 # +---------+--------------+------+------------------------------------+--------------+
+# | 1       | Move Done    | BOOL | False from a "Move To Angle" write | Read         |
+# |         |              |      | until the motor is at rest again   |              |
+# +---------+--------------+------+------------------------------------+--------------+
 #
 # DISCRETE INPUTS
 # +---------+---------------------------+------+------------------+--------------+
@@ -165,27 +245,114 @@ def calc_checksum(AA1,AA2,CC1,CC2,DD1,DD2,DD3,DD4,DD5,DD6,DD7,DD8):
 # +---------+-------------------------------+------------------+----------------------------------------------------------+--------------+
 # | 7       | Motor Dwell Time (2)          |                  |                                                          |              |
 # +---------+-------------------------------+------------------+----------------------------------------------------------+--------------+
+# | 8       | Motor Acceleration            | Float - IEEE 745 | Acceleration limit of each stroke (degrees/s^2)          | Read & Write |
+# +---------+-------------------------------+------------------+----------------------------------------------------------+--------------+
+# | 9       | Motor Acceleration (2)        |                  |                                                          |              |
+# +---------+-------------------------------+------------------+----------------------------------------------------------+--------------+
+# | 10      | Motor Jerk                    | Float - IEEE 745 | Jerk limit of each stroke, S-Curve only (degrees/s^3)    | Read & Write |
+# +---------+-------------------------------+------------------+----------------------------------------------------------+--------------+
+# | 11      | Motor Jerk (2)                |                  |                                                          |              |
+# +---------+-------------------------------+------------------+----------------------------------------------------------+--------------+
+# | 12      | Motor Ramp Profile            | Float - IEEE 745 | 0 = No Ramp, 1 = Trapezoid, 2 = S-Curve                  | Read & Write |
+# +---------+-------------------------------+------------------+----------------------------------------------------------+--------------+
+# | 13      | Motor Ramp Profile (2)        |                  |                                                          |              |
+# +---------+-------------------------------+------------------+----------------------------------------------------------+--------------+
+# | 14      | Move To Angle                 | Float - IEEE 745 | Writing turns the motor to this angle from the start     | Read & Write |
+# |         |                               |                  | position (degrees, clockwise = positive) at the motor    |              |
+# |         |                               |                  | speed and ramp. Ignored while shaking or jogging         |              |
+# +---------+-------------------------------+------------------+----------------------------------------------------------+--------------+
+# | 15      | Move To Angle (2)             |                  |                                                          |              |
+# +---------+-------------------------------+------------------+----------------------------------------------------------+--------------+
 #
 # INPUT REGISTERS
-# +---------+-------------------------+------------------+-------------------------------------------------+--------------+
-# | Address | Name                    | Type             | Description                                     | Read / Write |
-# +---------+-------------------------+------------------+-------------------------------------------------+--------------+
-# | 0       | Current Temperature     | Float - IEEE 745 | Current temperature reading from thermistor (C) | Read         |
-# +---------+-------------------------+------------------+-------------------------------------------------+--------------+
-# | 1       | Current Temperature (2) |                  |                                                 |              |
-# +---------+-------------------------+------------------+-------------------------------------------------+--------------+
+# +---------+--------------------------------------+------------------+--------------------------------------------------------+--------------+
+# | Address | Name                                 | Type             | Description                                            | Read / Write |
+# +---------+--------------------------------------+------------------+--------------------------------------------------------+--------------+
+# | 0       | Current Temperature                  | Float - IEEE 745 | Current temperature reading from thermistor (C)        | Read         |
+# +---------+--------------------------------------+------------------+--------------------------------------------------------+--------------+
+# | 1       | Current Temperature (2)              |                  |                                                        |              |
+# +---------+--------------------------------------+------------------+--------------------------------------------------------+--------------+
+# | 2       | Active Motor Speed                   | Float - IEEE 745 | Speed the motor is running at (degrees/s), 0 = stopped | Read         |
+# +---------+--------------------------------------+------------------+--------------------------------------------------------+--------------+
+# | 3       | Active Motor Speed (2)               |                  |                                                        |              |
+# +---------+--------------------------------------+------------------+--------------------------------------------------------+--------------+
+# | 4       | Active Motor Degrees of Rotation     | Float - IEEE 745 | Degrees of rotation the motor is using (degrees)       | Read         |
+# +---------+--------------------------------------+------------------+--------------------------------------------------------+--------------+
+# | 5       | Active Motor Degrees of Rotation (2) |                  |                                                        |              |
+# +---------+--------------------------------------+------------------+--------------------------------------------------------+--------------+
+# | 6       | Active Motor Dwell Time              | Float - IEEE 745 | Dwell time the motor is using (s)                      | Read         |
+# +---------+--------------------------------------+------------------+--------------------------------------------------------+--------------+
+# | 7       | Active Motor Dwell Time (2)          |                  |                                                        |              |
+# +---------+--------------------------------------+------------------+--------------------------------------------------------+--------------+
+# | 8       | Active Motor Acceleration            | Float - IEEE 745 | Acceleration limit the motor is using (degrees/s^2)    | Read         |
+# +---------+--------------------------------------+------------------+--------------------------------------------------------+--------------+
+# | 9       | Active Motor Acceleration (2)        |                  |                                                        |              |
+# +---------+--------------------------------------+------------------+--------------------------------------------------------+--------------+
+# | 10      | Active Motor Jerk                    | Float - IEEE 745 | Jerk limit the motor is using (degrees/s^3)            | Read         |
+# +---------+--------------------------------------+------------------+--------------------------------------------------------+--------------+
+# | 11      | Active Motor Jerk (2)                |                  |                                                        |              |
+# +---------+--------------------------------------+------------------+--------------------------------------------------------+--------------+
+# | 12      | Active Motor Ramp Profile            | Float - IEEE 745 | 0 = No Ramp, 1 = Trapezoid, 2 = S-Curve                | Read         |
+# +---------+--------------------------------------+------------------+--------------------------------------------------------+--------------+
+# | 13      | Active Motor Ramp Profile (2)        |                  |                                                        |              |
+# +---------+--------------------------------------+------------------+--------------------------------------------------------+--------------+
+# | 14      | Alarm Status                         | UINT16           | Alarm status bits of the temperature controller        | Read         |
+# |         |                                      |                  | (see alarms.py), 0 = No alarm                          |              |
+# +---------+--------------------------------------+------------------+--------------------------------------------------------+--------------+
+# | 15      | Alarm Change Counter                 | UINT16           | Goes up by 1 each time an alarm turns on or off,       | Read         |
+# |         |                                      |                  | wraps at 65536. Read 16-80 again only when it changed  |              |
+# +---------+--------------------------------------+------------------+--------------------------------------------------------+--------------+
+# | 16      | Alarm Events Stored                  | UINT16           | Number of alarm events in 17-80 (0 to 16)              | Read         |
+# +---------+--------------------------------------+------------------+--------------------------------------------------------+--------------+
+# | 17-80   | Alarm Events                         | 4 x UINT16 each  | Newest event first, each event is 4 registers:         | Read         |
+# |         |                                      |                  | time (s since epoch, high word, low word),             |              |
+# |         |                                      |                  | alarm bit, 1 = alarm on / 0 = alarm off                |              |
+# +---------+--------------------------------------+------------------+--------------------------------------------------------+--------------+
+# | 81      | Motor Position                       | Float - IEEE 745 | Motor angle from the position at program start         | Read         |
+# |         |                                      |                  | (degrees, clockwise = positive), counted from the steps |              |
+# +---------+--------------------------------------+------------------+--------------------------------------------------------+--------------+
+# | 82      | Motor Position (2)                   |                  |                                                        |              |
+# +---------+--------------------------------------+------------------+--------------------------------------------------------+--------------+
+# | 83      | Step Interval Error p50              | Float - IEEE 745 | Median error of the time between STEP pulses (us),     | Read         |
+# |         |                                      |                  | over the last 4096 steps (see step_timing.py)          |              |
+# +---------+--------------------------------------+------------------+--------------------------------------------------------+--------------+
+# | 84      | Step Interval Error p50 (2)          |                  |                                                        |              |
+# +---------+--------------------------------------+------------------+--------------------------------------------------------+--------------+
+# | 85      | Step Interval Error p99              | Float - IEEE 745 | 99th percentile of the step interval error (us)        | Read         |
+# +---------+--------------------------------------+------------------+--------------------------------------------------------+--------------+
+# | 86      | Step Interval Error p99 (2)          |                  |                                                        |              |
+# +---------+--------------------------------------+------------------+--------------------------------------------------------+--------------+
+# | 87      | Step Interval Error Max              | Float - IEEE 745 | Largest step interval error (us)                       | Read         |
+# +---------+--------------------------------------+------------------+--------------------------------------------------------+--------------+
+# | 88      | Step Interval Error Max (2)          |                  |                                                        |              |
+# +---------+--------------------------------------+------------------+--------------------------------------------------------+--------------+
+# | 89      | Step Intervals Measured              | UINT16           | Step intervals in 83-88 and 90-99 (0 to 4096)          | Read         |
+# +---------+--------------------------------------+------------------+--------------------------------------------------------+--------------+
+# | 90-99   | Step Interval Error Histogram        | 10 x UINT16      | Step intervals with an error up to 10, 20, 50, 100,    | Read         |
+# |         |                                      |                  | 200, 500, 1000, 2000, 5000 us and above 5000 us        |              |
+# +---------+--------------------------------------+------------------+--------------------------------------------------------+--------------+
 #
 # --------------------------------
 class ServerWorker(QThread):
 
-    # Signals used to send data between ServerWorker and main thread
-    updateModbusValues = pyqtSignal()
-    updateGUIValues = pyqtSignal()
-    updateCurrentTemp = pyqtSignal()
-    SendSetTemp = pyqtSignal()
-    setSetTemp = pyqtSignal()
-    sendAlarmStatus = pyqtSignal()
+    # Signals used to send data from ServerWorker to main thread
+    # Values are sent with the signal, so the main thread never reads ServerWorker variables
+    updateGUIValues = pyqtSignal(float, float, float, float, float, float, float)    # set temp, motor speed, dor, dwell, accel, jerk, profile
+    updateCurrentTemp = pyqtSignal(float)
+    SendSetTemp = pyqtSignal(float)
+    setSetTemp = pyqtSignal(float)
+    sendAlarmStatus = pyqtSignal(int)  # alarm status bits, sent only when an alarm turned on or off
+    sendStepTiming = pyqtSignal(float, float, float)   # step interval error p50, p99, max (us), sent only after new steps
     motorStatus = pyqtSignal()
+    motorStopped = pyqtSignal()         # the shake ended by itself, the Start/Stop button is turned off
+
+    # Period of each task run by the scheduler (s)
+    TEMP_PERIOD = 0.25          # 4 Hz
+    ALARM_PERIOD = 1.0          # 1 Hz
+    STATS_PERIOD = 60.0         # log scheduler and serial bus statistics
+    HISTORY_FLUSH_PERIOD = 60.0 # write the temperature history to disk
+    POSITION_PERIOD = 0.25      # motor position input registers while the motor moves
+    STEP_TIMING_PERIOD = 1.0    # step interval error input registers
 
     def __init__(self):
         super(ServerWorker, self).__init__()
@@ -197,24 +364,36 @@ class ServerWorker(QThread):
         self.MB_motor_speed = 0.0
         self.MB_motor_dor = 0.0
         self.MB_motor_dwell = 0.0
+        self.MB_motor_accel = 0.0
+        self.MB_motor_jerk = 0.0
+        self.MB_motor_profile = 0.0
 
         # --- FLAGS ---
 
-        # flags to determine if motor is running
+        # Values on the main screen [set temp, motor speed, motor dor, motor dwell, motor accel, motor jerk, motor profile]
+        # Published by the main thread whenever a value changes, "gui_version" is the last version copied to the server
+        self.gui_settings = VersionedState([0.0]*7)
+        self.gui_version = 0
+
+        # flag to determine if motor is running
         self.MB_motor_on = False
-        self.GUI_motorFlag = False
-        # Alarm flags stored as discrete inputs
-        self.MB_alarm_low_voltage = False
-        self.MB_alarm_therm = False
-        self.MB_alarm_overcurrent = False
-        self.MB_alarm_lowtemp = False
-        self.MB_alarm_hightemp = False
+        # Alarms turned on and off, written to the discrete inputs and input registers 14-80
+        self.alarms = AlarmEngine()
+        self.alarm_bits = 0         # last alarm status read from the temperature controller
+        # Temperature controller commands sent by "submitSerial" that have no result yet
+        self.serial_pending = set()
+        # Step intervals measured when the step timing input registers were last written
+        self.step_timing_total = 0
+        # First holding register of each float whose first (high) word was written from Modbus but not its second (low) word
+        self.hr_half_written = set()
 
     # ----------------
     # "work" is called once
     #
-    # At the end of "work", LoopingCall is used from twisted module
-    # This begins the updating writer function to be called repeatedly after a specified amount of time
+    # At the end of "work", TaskScheduler is started, it uses LoopingCall from twisted module
+    # Each task ("pollTemperature", "pollAlarms", "updateStepTiming", "logStats") is called repeatedly with its own period
+    # Tasks never wait for the temperature controller, serial commands are sent with "submitSerial"
+    # Main screen changes are copied to the server by "syncModbus" whenever they happen (see "requestSync")
     #
     # The function "ModbusSlaveContext" creates the variables in the Modbus Server
     #
@@ -223,18 +402,41 @@ class ServerWorker(QThread):
     #   hr = holding registers
     #   ir = input registers
     #
-    # ex:   hr=ModbusSequentialDataBlock(0, [0]*8),   
+    # ex:   hr=CallbackDataBlock(0, [0]*8),   
     # The line above creates 8 Holding Registers starting at address 0 (Address 0 for holding registers) with values of 0
+    #
+    # Writes from a Modbus master to the coils or holding registers call "coilsWritten" or "holdingWritten" right away
+    #
+    # pymodbus and twisted are imported here, in the Modbus server thread, while the main screen is shown
     # ----------------
     def work(self):
+        global reactor
         log.debug("Creating Modbus server in seperate thread via QThread")
         log.info(self.currentThread())
-        sleep(0.1)
+        start = startup.now()
+        from pymodbus.version import version
+        from pymodbus.server.asynchronous import StartTcpServer
+        from pymodbus.device import ModbusDeviceIdentification
+        from pymodbus.datastore import ModbusSlaveContext, ModbusServerContext
+        from callback_datastore import CallbackDataBlock     # data block that signals Modbus writes right away
+        from twisted.internet import reactor as twisted_reactor
+        from task_scheduler import TaskScheduler
+        reactor = twisted_reactor
+        startup.add('Modbus server imports', startup.now() - start)
+        clock.sleep(0.1)
+        self.co_block = CallbackDataBlock(0, [0, 1])
+        self.di_block = CallbackDataBlock(0, [0]*5)
+        self.hr_block = CallbackDataBlock(0, [0]*16)
+        self.ir_block = CallbackDataBlock(0, [0]*(IR_STEP_TIMING + 7 + STEP_TIMING_BINS))
+        self.co_block.add_callback(self.coilsWritten)
+        self.hr_block.add_callback(self.holdingWritten)
+        motor.add_callback(self.motorParamsChanged)
+        motor.add_rest_callback(self.motorAtRest)
         store = ModbusSlaveContext(
-            co=ModbusSequentialDataBlock(0, [0]*1),
-            di=ModbusSequentialDataBlock(0, [0]*5),
-            hr=ModbusSequentialDataBlock(0, [0]*8),
-            ir=ModbusSequentialDataBlock(0, [0]*2),zero_mode=True)      # zero_mode is true, so variables are stored starting at address 0, not 1
+            co=self.co_block,
+            di=self.di_block,
+            hr=self.hr_block,
+            ir=self.ir_block,zero_mode=True)      # zero_mode is true, so variables are stored starting at address 0, not 1
         context = ModbusServerContext(slaves=store, single=True)
         # ----------------------------------------------------------------------- # 
         # initialize the server information
@@ -247,330 +449,274 @@ class ServerWorker(QThread):
         identity.ProductName = 'pymodbus Server'
         identity.ModelName = 'pymodbus Server'
         identity.MajorMinorRevision = version.short()
-        time = 5  # 5 second delay for LoopingCall
-        loop = LoopingCall(f=self.updating_writer, a=(context,))
-        loop.start(time, now=False) 
-        sleep(0.1)  # initially delay by time
-        self.initSetTemp=self.readSetTemp()     # read set temp value saved on temperature controller
-        log.info("Set Temperature initialized from saved data on temerature controller: " + str(self.initSetTemp))
-        self.setSetTemp.emit()      # send set temperature value saved on temperature controller to GUI
-        initSetTemp_ieee1, initSetTemp_ieee2 = self.float_to_ieee(self.initSetTemp)
-        context[0x00].setValues(3, 0x00, [initSetTemp_ieee1, initSetTemp_ieee2, 17076, 0, 17332, 0, 16128, 0])
-        self.MB_set_temp=self.initSetTemp
+        self.scheduler = TaskScheduler(ReactorClock(clock, reactor))     # task periods follow the program clock
+        self.scheduler.add('temperature', self.TEMP_PERIOD, self.pollTemperature)
+        self.scheduler.add('alarms', self.ALARM_PERIOD, self.pollAlarms)
+        self.scheduler.add('stats', self.STATS_PERIOD, self.logStats)
+        self.scheduler.add('history', self.HISTORY_FLUSH_PERIOD, history.flush)
+        self.scheduler.add('position', self.POSITION_PERIOD, self.updatePosition)
+        self.scheduler.add('step timing', self.STEP_TIMING_PERIOD, self.updateStepTiming)
+        reactor.callWhenRunning(self.scheduler.start)
+        reactor.callWhenRunning(self.syncModbus)
+        self.hr_block.update(0x02, floats_to_registers([90.0, 360.0, 0.5, 2000.0, 20000.0, float(PROFILE_NONE)]))
+        self.submitSerial(PRIORITY_SETPOINT, 'read_set_temp', self.setTempRead)     # read set temp value saved on temperature controller
         StartTcpServer(context, identity=identity, address=("Localhost",5020))
 
     
     # ----------------
-    # "updating_writer" function is called repeatedly via "LoopingCall"
-    # 
-    # This function performs all the tasks that need to be done continously such as:
-    #       - Run asynchronous Modbus server
-    #       - Check variables from main screen GUI and compare to  variables in ModBus Server
-    #           -- Determine if changes were made via GUI changes or via Modbus writes
-    #       - Read current temperature
-    #       - Converts data
-    #       - Check for alarms
-    #
-    #  Broken into sections for looking at changes in HR, IR, DI, and CO 
+    # "requestSync" is called from the main thread when main screen values or the motor status change
+    # "syncModbus" then runs in the Modbus server thread
+    # Before twisted is imported there is nothing to do, "work" runs "syncModbus" when the server starts
     # ----------------
-    def updating_writer(self, a):
-        """ A worker process that runs every so often and
-        updates live values of the context. It should be noted
-        that there is a race condition for the update.
+    def requestSync(self):
+        if reactor is not None:
+            reactor.callFromThread(self.syncModbus)
 
-        :param arguments: The input arguments to the call
-        """
-        log.debug("Updating the context")
-        HR_values_old = [self.MB_set_temp, self.MB_motor_speed, self.MB_motor_dor, self.MB_motor_dwell]
-        log.info("Last Holding Register values in server: " + str(HR_values_old))
-        self.updateModbusValues.emit()      # signal that changes MB variables to ones in GUI
-        sleep(0.1)
-        HR_values_gui = [self.MB_set_temp, self.MB_motor_speed, self.MB_motor_dor, self.MB_motor_dwell]
-        log.info("Holding Register values in GUI: " + str(HR_values_gui))
-        context = a[0]
-        register_hr = 3        # 1=co , 2=di, 3=hr, 4=ir
-        register_ir = 4
-        register_di = 2
-        register_co = 1
-        slave_id = 0x00
+    # ----------------
+    # "syncModbus" copies main screen changes to the Modbus server
+    #       - Holding registers, only if the published main screen values changed (version number)
+    #       - Motor status coil
+    #
+    # Writes from a Modbus master are handled as they happen by "holdingWritten" and "coilsWritten"
+    # ----------------
+    def syncModbus(self):
+        version, HR_values_gui = self.gui_settings.read()
         address = 0x00      #starting address for values
-        # Convert each float variable to 2 seperate 16-bit values (HR's & IR's)
-        # Each variable set to ieee1 and ieee2
+        # Convert each float variable to 2 seperate 16-bit values
         # ---- HOLDING REGISTER SECTION ----
-        set_temp_ieee1, set_temp_ieee2 = self.float_to_ieee(self.MB_set_temp)
-        motor_speed_ieee1, motor_speed_ieee2 = self.float_to_ieee(self.MB_motor_speed)
-        motor_dor_ieee1, motor_dor_ieee2 = self.float_to_ieee(self.MB_motor_dor)
-        motor_dwell_ieee1, motor_dwell_ieee2 = self.float_to_ieee(self.MB_motor_dwell)
-        hr_values_ieee = [set_temp_ieee1, set_temp_ieee2, motor_speed_ieee1, motor_speed_ieee2, motor_dor_ieee1, motor_dor_ieee2, motor_dwell_ieee1, motor_dwell_ieee2]
-        hr_values_inServer_ieee = context[slave_id].getValues(register_hr, address, count=8)
-        log.info("Holding Register Values in GUI in IEEE format: " + str(hr_values_ieee))
-        log.info("Current Register Values in server in IEEE format: "+ str(hr_values_inServer_ieee))
-        # Compare variables to deterime if any changes
-        if HR_values_old != HR_values_gui:                    
+        if version != self.gui_version:
             # GUI Values Changed - Sets Modbus values to values set in GUI                  
-            log.debug("Last Holding Register Values do not match ones in GUI, changing to values set in GUI")
-            context[slave_id].setValues(register_hr, address, hr_values_ieee)
+            log.debug("Holding Register values changed in GUI (version " + str(version) + "), changing to values set in GUI")
+            self.gui_version = version
+            (self.MB_set_temp, self.MB_motor_speed, self.MB_motor_dor, self.MB_motor_dwell,
+             self.MB_motor_accel, self.MB_motor_jerk, self.MB_motor_profile) = HR_values_gui
+            self.hr_block.update(address, floats_to_registers(HR_values_gui))
+            self.hr_half_written.difference_update(range(address, HR_MOVE_TO))     # replaced by whole values
             log.debug("Set Holding Values to: " + str(HR_values_gui))
-        elif hr_values_inServer_ieee != hr_values_ieee:
-            # Server Values Changed - Sets GUI values to values set in server
-            log.debug("Holding Register Values IEEE do not match Holding Register values in GUI IEEE, changing to values set in server")
-            st=round(self.ieee745_to_float(bin(hr_values_inServer_ieee[0]).replace('0b','').zfill(16)+bin(hr_values_inServer_ieee[1]).replace('0b','').zfill(16)),2)
-            ms=round(self.ieee745_to_float(bin(hr_values_inServer_ieee[2]).replace('0b','').zfill(16)+bin(hr_values_inServer_ieee[3]).replace('0b','').zfill(16)),1)
-            mdor=round(self.ieee745_to_float(bin(hr_values_inServer_ieee[4]).replace('0b','').zfill(16)+bin(hr_values_inServer_ieee[5]).replace('0b','').zfill(16)),1)
-            md=round(self.ieee745_to_float(bin(hr_values_inServer_ieee[6]).replace('0b','').zfill(16)+bin(hr_values_inServer_ieee[7]).replace('0b','').zfill(16)),1)
-            if st != self.MB_set_temp:
-                # Send "set temp" to temp controller if write to modbus server
-                self.MB_set_temp = st
-                self.SendSetTemp.emit()
-            self.MB_set_temp = st
-            self.MB_motor_speed = ms
-            self.MB_motor_dor = mdor
-            self.MB_motor_dwell = md
-            sleep(0.1)
-            self.updateGUIValues.emit()
-            log.debug("Updated GUI with Modbus Inputs")
-        else:
-            pass
-        # ---- INPUT REGISTER SECTION ----
-        current_temp = round(self.read_current_temp(),2)
-        self.MB_current_temp = current_temp
-        log.info("Current temperature: " + str(current_temp))
-        log.debug("Writing Current temperature to Input Register")
-        current_temp_ieee1, current_temp_ieee2 = self.float_to_ieee(current_temp)
-        ir_values_ieee = [current_temp_ieee1, current_temp_ieee2]
-        log.info("New Input Register Values in IEEE : " + str(ir_values_ieee))
-        context[slave_id].setValues(register_ir, address, ir_values_ieee)
-        self.updateCurrentTemp.emit()
-        # ---- DISCRETE INPUTS SECTION ----
-        self.alarm_lst=self.checkAlarms()
-        self.sendAlarmStatus.emit()
-        co_values_inserver = context[slave_id].getValues(register_co, address, count=1)
-        sleep(0.1)
-        di_values = [self.MB_alarm_low_voltage, self.MB_alarm_therm, self.MB_alarm_overcurrent, self.MB_alarm_lowtemp, self.MB_alarm_hightemp]
-        context[slave_id].setValues(register_di, address, di_values)
-        self.GUI_motorFlag = False
         # ---- COILS SECTION ----
-        if (co_values_inserver[0] != self.MB_motor_on) and (self.GUI_motorFlag == False):
-            log.debug("Coils changed from Modbus, setting motor to off/on determined from Modbus")
-            self.motorStatus.emit()
-        else:
-            co_values = [self.MB_motor_on]
-            context[slave_id].setValues(register_co, address, co_values)
+        self.co_block.update(address, [self.MB_motor_on])
 
     # ----------------
-    # "float_to_ieee" function is used to convert the float values in Python into 2 16-bit values that represent a 32-bit IEEE 745 float value
-    # 
-    # Parameter:    n - Floating point value
+    # "submitSerial" sends a command to the temperature controller without waiting for it
+    #
+    # "handler" is called with the result in the Modbus server thread once the serial arbiter ran the command,
+    # so Modbus clients are served while the serial bus is busy (or the controller does not answer).
+    # A command that failed is logged by the arbiter and "handler" is not called.
+    # While a command is still waiting for its result the same command is not sent again, a task that runs
+    # faster than the controller answers skips its turn instead of filling the arbiter queue.
     #
-    # Return:       fin1 - First 16-bits of float value "n", in IEEE 745 format (bits 0-15)
-    #               fin2 - Last 16-bits of float value "n", in IEEE 745 format (bits 16-31)
+    # Parameter:    priority - PRIORITY_SETPOINT, PRIORITY_ALARM or PRIORITY_TEMP
+    #               command - TC36Driver function name
+    #               handler - function(result)
     # ----------------
-    def float_to_ieee(self,n):
-        sign = '0'            # 0=positive, 1=negative
-        if n < 0:
-            sign = '1'
-            n = n * -1
-        elif n==0.0:
-            return 0, 0
-        whole_num, dec_num = str(n).split('.')
-        dec = str(bin(int(whole_num)))[2:]+'.'
-        for x in range(30):
-            dec_num = str('0.')+dec_num
-            temp = str(float(dec_num)*2)
-            whole_num, dec_num = temp.split('.')
-            dec+=whole_num
-        dotPlace = dec.find('.')
-        onePlace = dec.find('1')
-        dec = dec.replace(".","")
-        dotPlace -= 1
-        if onePlace > dotPlace:     # n < 1
-            onePlace -= 1
-        mantissa = dec[onePlace+1:]
-        mantissa = mantissa[0:23]
-        exp = dotPlace - onePlace
-        exp_bits = exp + 127
-        exp_bits = bin(exp_bits)[2:].zfill(8)
-        ieee_num = sign + exp_bits + mantissa
-        fin1, fin2 = ieee_num[0:16], ieee_num[16:32]
-        fin1, fin2 = int(fin1,2), int(fin2,2)
-        return fin1, fin2
+    def submitSerial(self, priority, command, handler):
+        if command in self.serial_pending:
+            log.debug("Temperature controller command " + command + " still waiting, skipped")
+            return
+        self.serial_pending.add(command)
+        future = arbiter.submit(priority, command)
+        future.add_done_callback(lambda future: reactor.callFromThread(self.serialDone, command, future, handler))
+
+    def serialDone(self, command, future, handler):
+        self.serial_pending.discard(command)
+        if future.cancelled() or future.exception() is not None:
+            return
+        handler(future.result())
 
     # ----------------
-    # "ieee745_to_float" function is used to convert 32-bit binary IEEE 745 values to floating point values
-    # 
-    # Parameter:    N - binary 32-bit IEEE 745 floating point value
-    #
-    # Return:       x - Value of "N" in floating point format (decimal)
+    # "setTempRead" takes the set temperature saved on the temperature controller at start
     # ----------------
-    def ieee745_to_float(self,N): # ieee-745 bits (max 32 bit)
-        if N =='00000000000000000000000000000000':
-            return 0.0
-        a = int(N[0])        # sign,     1 bit
-        b = int(N[1:9],2)    # exponent, 8 bits
-        c = int("1"+N[9:], 2)# fraction, len(N)-9 bits
-        x = (-1)**a * c /( 1<<( len(N)-9 - (b-127) ))
-        return x
+    def setTempRead(self, set_temp):
+        self.initSetTemp = set_temp
+        log.info("Set Temperature initialized from saved data on temerature controller: " + str(self.initSetTemp))
+        self.setSetTemp.emit(self.initSetTemp)      # send set temperature value saved on temperature controller to GUI
+        self.hr_block.update(0x00, floats_to_registers([self.initSetTemp]))
+        self.MB_set_temp=self.initSetTemp
 
     # ----------------
-    # "read_current_temp" function polls the temperature controller to read the temperature of the thermistor
-    #
-    # Parameter:    n/a
+    # "pollTemperature" reads the current temperature, "temperatureRead" writes it to the input registers
+    # and saves it in the history
+    # ----------------
+    def pollTemperature(self):
+        self.submitSerial(PRIORITY_TEMP, 'read_current_temp', self.temperatureRead)
+
+    def temperatureRead(self, current_temp):
+        current_temp = round(current_temp, 2)
+        self.MB_current_temp = current_temp
+        log.debug("Current temperature: " + str(current_temp))
+        self.ir_block.update(0x00, floats_to_registers([current_temp]))
+        history.append(clock.time(), current_temp, self.MB_set_temp, self.alarm_bits, MOTOR_STATES.index(motor.state))
+        self.updateCurrentTemp.emit(current_temp)
+
+    # ----------------
+    # "pollAlarms" reads the alarm status bits from the temperature controller, "alarmsRead" handles them
     #
-    # Return:       crnt_temp - Temperature detected by thermistor
+    # Only when an alarm turned on or off are the discrete inputs and alarm input registers written
+    # and the main screen told
     # ----------------
-    def read_current_temp(self):
-        buf=['*','0','0','0','0','0','0','0','0','0','0','^']
-        A1,A2 = '0','2'
-        C1,C2 = '0','1'
-        D1,D2,D3,D4,D5,D6,D7,D8='0','0','0','0','0','0','0','0'
-        S1,S2=calc_checksum(A1,A2,C1,C2,D1,D2,D3,D4,D5,D6,D7,D8)
-        bst=['*',A1,A2,C1,C2,D1,D2,D3,D4,D5,D6,D7,D8,S1,S2,'\r']
-        for pn in range(0,16):
-            ser.write(bst[pn].encode())
-        for pn in range(0,12):
-            buf[pn]=ser.read(1)
-        crnt_temp  = self.hexc2dec(buf) / 100
-        return crnt_temp
+    def pollAlarms(self):
+        self.submitSerial(PRIORITY_ALARM, 'read_alarms', self.alarmsRead)
+
+    def alarmsRead(self, alarm_bits):
+        self.alarm_bits = alarm_bits
+        raised, cleared = self.alarms.update(self.alarm_bits, clock.time())
+        if not (raised or cleared):
+            return
+        bits, changes, events = self.alarms.snapshot()
+        di_values = [bool(bits & bit) for bit in (ALARM_LOW_VOLTAGE, ALARM_OPEN_INPUT1, ALARM_OVER_CURRENT, ALARM_LOW_TEMP, ALARM_HIGH_TEMP)]
+        self.di_block.update(0x00, di_values)
+        self.ir_block.update(IR_ALARMS, [bits, changes, len(events)] + events_to_registers(events, ALARM_HISTORY_SIZE))
+        self.sendAlarmStatus.emit(bits)
 
     # ----------------
-    # "readSetTemp" function polls to temperature controller to read the set temperature
-    # 
-    # Parameter:    n/a
+    # "motorParamsChanged" is called from the motor service thread when the motor starts using new parameters
+    # "updateActiveMotor" then writes them to input registers 2-13 in the Modbus server thread
     #
-    # Return:       x - Value of "N"
+    # Parameter:    params - ShakeParams in use, None when the motor stopped
     # ----------------
-    def readSetTemp(self):
-        buf=['*','0','0','0','0','0','0','0','0','0','0','^']
-        A1,A2 = '0','2'
-        C1,C2 = '5','0'
-        D1,D2,D3,D4,D5,D6,D7,D8='0','0','0','0','0','0','0','0'
-        S1,S2=calc_checksum(A1,A2,C1,C2,D1,D2,D3,D4,D5,D6,D7,D8)
-        bst=['*',A1,A2,C1,C2,D1,D2,D3,D4,D5,D6,D7,D8,S1,S2,'\r']
-        for pn in range(0,16):
-            ser.write(bst[pn].encode())
-        for pn in range(0,12):
-            buf[pn]=ser.read(1)
-        read_set_temp=self.hexc2dec(buf)/100
-        return read_set_temp
+    def motorParamsChanged(self, params):
+        reactor.callFromThread(self.updateActiveMotor, params)
+
+    def updateActiveMotor(self, params):
+        values = [0.0]*6 if params is None else [float(value) for value in params.values()]
+        log.debug("Active motor parameters: " + str(values))
+        self.ir_block.update(0x02, floats_to_registers(values))
 
     # ----------------
-    # "checkAlarms" function polls to temperature controller to detect if any alarms have been triggered
-    # 
-    # Parameter:    n/a
+    # "motorAtRest" is called from the motor service thread when the motor comes to rest
+    # "updatePosition" then writes the position and sets the "Move Done" coil in the Modbus server thread
     #
-    # Return:       alarm_list - List of binary values with size of 7. Each binary value represents a different alarm
+    # Parameter:    command - Last motor command run
+    #               position - Motor position (degrees)
+    # ----------------
+    def motorAtRest(self, command, position):
+        reactor.callFromThread(self.updatePosition, True)
+        if command == CMD_SHAKE:
+            reactor.callFromThread(self.shakeEnded)
+
+    # ----------------
+    # "shakeEnded" turns the motor status coil and the Start/Stop button off when a shake ended without a halt
+    # (no valid speed, or a motor error), so they show what the motor is doing
     # ----------------
-    def checkAlarms(self):
-        buf=['*','0','0','0','0','0','0','0','0','0','0','^']
-        A1,A2 = '0','2'
-        C1,C2='0','5'
-        D1,D2,D3,D4,D5,D6,D7,D8='0','0','0','0','0','0','0','0'
-        S1,S2=calc_checksum(A1,A2,C1,C2,D1,D2,D3,D4,D5,D6,D7,D8)
-        bst=['*',A1,A2,C1,C2,D1,D2,D3,D4,D5,D6,D7,D8,S1,S2,'\r']
-        for pn in range(0,16):
-            ser.write(bst[pn].encode())
-        for pn in range(0,12):
-            buf[pn]=ser.read(1)
-        alarm_int=int(self.hexc2dec(buf))
-        alarm_list=[int(i) for i in bin(alarm_int)[2:]]
-        while len(alarm_list) < 7:
-            alarm_list.insert(0,0)
-        return alarm_list
+    def shakeEnded(self):
+        if not self.MB_motor_on or motor.state != STATE_IDLE:
+            return
+        log.warning("Motor stopped by itself, turning motor status off")
+        self.MB_motor_on = False
+        self.co_block.update(0x00, [False])
+        self.motorStopped.emit()
+
+    def updatePosition(self, done=False):
+        self.ir_block.update(IR_POSITION, floats_to_registers([motor.position()]))
+        if done:
+            self.co_block.update(0x01, [True])
+
+    # ----------------
+    # "updateStepTiming" writes the step interval error percentiles and histogram to input registers 83-99
+    # and sends them to the main screen, only when the motor made steps since the last time
+    # ----------------
+    def updateStepTiming(self):
+        stats = motor.engine.step_timing.snapshot()
+        if stats.total == self.step_timing_total:
+            return
+        self.step_timing_total = stats.total
+        self.ir_block.update(IR_STEP_TIMING, floats_to_registers([stats.p50*1e6, stats.p99*1e6, stats.max*1e6])
+                             + [stats.count] + [min(n, 0xFFFF) for n in stats.histogram])
+        self.sendStepTiming.emit(stats.p50*1e6, stats.p99*1e6, stats.max*1e6)
 
     # ----------------
-    # "hex2dec" function converts data in the form of hex values in string format to decimal values
-    # Used when reading the TE Tech TC-36-25-RS485 temperature controller
-    # Takes the hex values saved as char values in positions 1-9 of the list. 
-    # Positions [1-9] contain the data meant to be converted
-    # See TC-36-25-RS485 Manual for more info
+    # "logStats" logs the overrun and missed deadline counters of each task and the serial bus wait times
+    # ----------------
+    def logStats(self):
+        self.scheduler.report()
+        log.info("Serial arbiter: " + str(arbiter.stats()))
+        log.info("Step timing: " + timing_text(motor.engine.step_timing.snapshot()))
+
+    # ----------------
+    # "holdingWritten" is called when a Modbus master writes to the holding registers
+    #
+    # Sends a new set temperature to the temperature controller, gives the motor settings to the motor
+    # and updates the main screen, then handles "Move To Angle" if it was written
+    # The settings come first, so a write holding both the motor settings and "Move To Angle" moves with the new settings
     #
-    # Parameter:    bufp - List of hex values saved as individual char values within a list. Data is stored in bufp[1:9]
+    # A float is only used once both of its registers are written. A master writing one register at a time
+    # (function 06) writes the first (high) word, then the second (low) word, nothing is done until the second
+    # write, so the motor never runs with a value made of a new and an old half
     #
-    # Return:       newval - Data from bufp converted to decimal
+    # Parameter:    address - First holding register written
+    #               values - Values written
     # ----------------
-    def hexc2dec(self,bufp):
-        newval=0
-        divvy=pow(16,7)
-        #sets the word size to DDDDDDDD
-        for pn in range (1,9):
-            vally=ord(bufp[pn])
-            if(vally < 97):
-                subby=48
+    def holdingWritten(self, address, values):
+        end = address + len(values)
+        for register in range(address, end):
+            if register % 2:
+                self.hr_half_written.discard(register - 1)
             else:
-                subby=87
-                    # ord() converts the character to the ascii number value
-            newval+=((ord(bufp[pn])-subby)*divvy)
-            divvy/=16
-            if(newval > pow(16,8)/2-1):
-                newval=newval-pow(16,8)
-                   #distinguishes between positive and negative numbers
-        return newval
+                self.hr_half_written.add(register)
+        if end % 2:
+            log.debug("Holding register " + str(end - 1) + " written, waiting for the second half of the float")
+        if address < HR_MOVE_TO and not any(register < HR_MOVE_TO for register in self.hr_half_written):
+            self.settingsWritten()
+        if end > HR_MOVE_TO and HR_MOVE_TO not in self.hr_half_written:
+            self.moveWritten()
+
+    def settingsWritten(self):
+        log.debug("Holding Registers written from Modbus, changing to values set in server")
+        st, ms, mdor, md, macc, mjerk, mprof = registers_to_floats(self.hr_block.getValues(0x00, 14))
+        st = round(st,2)
+        ms = round(ms,1)
+        mdor = round(mdor,1)
+        md = round(md,1)
+        macc = round(macc,0)
+        mjerk = round(mjerk,0)
+        mprof = float(min(max(int(round(mprof)), 0), len(PROFILE_NAMES)-1)) if mprof == mprof else 0.0    # NaN -> No Ramp
+        if not ms > 0:
+            # the motor cannot run at 0 or a negative speed (or NaN), the speed in use is written back
+            log.warning("Motor speed " + str(ms) + " written from Modbus is not above 0, keeping " + str(self.MB_motor_speed))
+            ms = self.MB_motor_speed
+            self.hr_block.update(0x02, floats_to_registers([ms]))
+        if st != self.MB_set_temp:
+            # Send "set temp" to temp controller if write to modbus server
+            self.MB_set_temp = st
+            self.SendSetTemp.emit(st)
+        self.MB_motor_speed = ms
+        self.MB_motor_dor = mdor
+        self.MB_motor_dwell = md
+        self.MB_motor_accel = macc
+        self.MB_motor_jerk = mjerk
+        self.MB_motor_profile = mprof
+        motor.update(ShakeParams(ms, mdor, md, macc, mjerk, int(mprof)))     # before the main screen, for a move queued next
+        self.updateGUIValues.emit(st, ms, mdor, md, macc, mjerk, mprof)
+        log.debug("Updated GUI with Modbus Inputs")
 
+    # ----------------
+    # "moveWritten" turns the motor to the "Move To Angle" holding register value
+    # The "Move Done" coil is cleared until the motor is at rest again (see "motorAtRest")
+    # ----------------
+    def moveWritten(self):
+        angle = registers_to_floats(self.hr_block.getValues(HR_MOVE_TO, 2))[0]
+        if angle != angle or self.MB_motor_on or motor.state == STATE_JOGGING:
+            log.warning("Move to angle ignored, the motor is running or the angle is not a number")
+            return
+        log.debug("Move to " + str(angle) + " deg from Modbus")
+        self.co_block.update(0x01, [False])
+        motor.move_to(angle)
 
-# --------------------------------
-# MotorWorker performs motor operations in a seperate thread via QThread
-# Used in Start/Stop button toggle and with rotate fwd and rotate rev buttons
-# --------------------------------
-class MotorWorker(QThread):
-    finished = pyqtSignal()  # our signal out to the main thread to alert it we've completed our work
+    # ----------------
+    # "coilsWritten" is called when a Modbus master writes to the coils
+    #
+    # Starts or stops the motor if the motor status coil changed
+    #
+    # Parameter:    address - First coil written
+    #               values - Values written
+    # ----------------
+    def coilsWritten(self, address, values):
+        motor_on = bool(self.co_block.getValues(0x00, 1)[0])
+        if motor_on != self.MB_motor_on:
+            log.debug("Coils changed from Modbus, setting motor to off/on determined from Modbus")
+            self.MB_motor_on = motor_on         # set now so a repeated write does not toggle the motor twice
+            self.motorStatus.emit()
 
-    def __init__(self):
-        super(MotorWorker, self).__init__()
-        self.working = True  # this is our flag to control our loop
-        self.fwd_working = True
-        self.rev_working = True
-        self.speed = 0.0
-        self.dor = 0.0
-        self.dwell = 0.0
-
-    # work called when Start/Stop Button is toggled
-    def work(self):
-        log.debug("Motor Running")
-        sec_per_step = 0.1/self.speed
-        while self.working:
-            time.sleep(self.dwell)
-            #print("sec perstep: ", sec_per_step)
-            GPIO.output(DIR,CW)
-            i = 0
-            for x in range(round(self.dor/1.8)):
-                print ('CW'+str(i))
-                GPIO.output(STEP,GPIO.HIGH)
-                time.sleep(sec_per_step)
-                GPIO.output(STEP,GPIO.LOW)
-                time.sleep(sec_per_step)
-            time.sleep(self.dwell)
-            GPIO.output(DIR,CCW)
-            i = 0
-            for x in range(round(self.dor/1.8)):
-                print ('CCW'+str(i))
-                GPIO.output(STEP,GPIO.HIGH)
-                time.sleep(sec_per_step)
-                GPIO.output(STEP,GPIO.LOW)
-                time.sleep(sec_per_step)
-                i +=1
-        log.debug("Ended Motor Operation")
-        self.finished.emit() # alert our gui that the loop stopped
-
-
-    def work_fwd(self):
-        GPIO.output(DIR,CW)
-        while self.fwd_working:
-            GPIO.output(STEP,GPIO.HIGH)
-            sleep(0.03)
-            GPIO.output(STEP,GPIO.LOW)
-            sleep(0.03)
-            log.debug("Rotate Forward Toggle")
-        self.finished.emit() # alert our gui that the loop stopped
-
-    def work_rev(self):
-        GPIO.output(DIR,CCW)
-        while self.rev_working:
-            GPIO.output(STEP,GPIO.HIGH)
-            sleep(0.03)
-            GPIO.output(STEP,GPIO.LOW)
-            sleep(0.03)
-            log.debug("Rotate Reverse Toggle")
-        self.finished.emit() # alert our gui that the loop stopped
 
 # --------------------------------
 # MotorWindow creates the Motor Settings window
@@ -727,6 +873,7 @@ class MotorWindow(QMainWindow):
         self.msSpinBox.setReadOnly(False)
         self.msSpinBox.setButtonSymbols(QtWidgets.QAbstractSpinBox.NoButtons)
         self.msSpinBox.setDecimals(0)
+        self.msSpinBox.setMinimum(1.0)
         self.msSpinBox.setMaximum(360.0)
         self.msSpinBox.setSingleStep(15.0)
         self.msSpinBox.setProperty("value", 90.0)
@@ -826,7 +973,7 @@ class MotorWindow(QMainWindow):
         self.Motor_speed_label.setObjectName("Motor_speed_label")
 
         self.SaveAndCloseMotor = QtWidgets.QPushButton(self.centralwidget)
-        self.SaveAndCloseMotor.setGeometry(QtCore.QRect(20, 20, 221, 141))
+        self.SaveAndCloseMotor.setGeometry(QtCore.QRect(20, 10, 221, 71))
         font = QtGui.QFont()
         font.setFamily("Leelawadee UI")
         font.setPointSize(13)
@@ -834,6 +981,39 @@ class MotorWindow(QMainWindow):
         self.SaveAndCloseMotor.setCursor(QtGui.QCursor(QtCore.Qt.ArrowCursor))
         self.SaveAndCloseMotor.setObjectName("SaveAndCloseMotor")
 
+        # Ramp settings: profile, acceleration (deg/s^2) and jerk (deg/s^3)
+        self.profileComboBox = QtWidgets.QComboBox(self.centralwidget)
+        self.profileComboBox.setGeometry(QtCore.QRect(20, 88, 221, 35))
+        font = QtGui.QFont()
+        font.setFamily("Leelawadee UI")
+        font.setPointSize(12)
+        self.profileComboBox.setFont(font)
+        self.profileComboBox.addItems(PROFILE_NAMES)
+        self.profileComboBox.setCurrentIndex(PROFILE_NONE)
+        self.profileComboBox.setObjectName("profileComboBox")
+
+        self.accSpinBox = QtWidgets.QDoubleSpinBox(self.centralwidget)
+        self.accSpinBox.setGeometry(QtCore.QRect(20, 128, 108, 40))
+        self.accSpinBox.setFont(font)
+        self.accSpinBox.setAlignment(QtCore.Qt.AlignCenter)
+        self.accSpinBox.setPrefix("A ")
+        self.accSpinBox.setDecimals(0)
+        self.accSpinBox.setMaximum(20000.0)
+        self.accSpinBox.setSingleStep(250.0)
+        self.accSpinBox.setProperty("value", 2000.0)
+        self.accSpinBox.setObjectName("accSpinBox")
+
+        self.jerkSpinBox = QtWidgets.QDoubleSpinBox(self.centralwidget)
+        self.jerkSpinBox.setGeometry(QtCore.QRect(133, 128, 108, 40))
+        self.jerkSpinBox.setFont(font)
+        self.jerkSpinBox.setAlignment(QtCore.Qt.AlignCenter)
+        self.jerkSpinBox.setPrefix("J ")
+        self.jerkSpinBox.setDecimals(0)
+        self.jerkSpinBox.setMaximum(500000.0)
+        self.jerkSpinBox.setSingleStep(5000.0)
+        self.jerkSpinBox.setProperty("value", 20000.0)
+        self.jerkSpinBox.setObjectName("jerkSpinBox")
+
         self.dwell_sec_label = QtWidgets.QLabel(self.centralwidget)
         self.dwell_sec_label.setGeometry(QtCore.QRect(660, 140, 51, 31))
         font = QtGui.QFont()
@@ -1017,6 +1197,8 @@ class MotorWindow(QMainWindow):
         self.DwellLabel.setText(_translate("Motor Settings", "Dwell Time +/- [0.5]"))
         self.Motor_dor_label.setText(_translate("Motor Settings", "Degrees of Rotation"))
         self.dor_deg_label.setText(_translate("Motor Settings", "(deg)"))
+        self.accSpinBox.setToolTip(_translate("Motor Settings", "Acceleration (deg/sec^2)"))
+        self.jerkSpinBox.setToolTip(_translate("Motor Settings", "Jerk, S-Curve only (deg/sec^3)"))
     
     # SaCM - Saves motor settings and sends changes to main screen
     def SaCM(self):
@@ -1245,6 +1427,36 @@ class GenWindow(QMainWindow):
         self.Exit_B.setChecked(False)
         self.Exit_B.setObjectName("Exit_B")
 
+        self.Fps_label = QtWidgets.QLabel(self.centralwidget)
+        self.Fps_label.setGeometry(QtCore.QRect(20, 200, 221, 41))
+        font = QtGui.QFont()
+        font.setFamily("Leelawadee")
+        font.setPointSize(18)
+        self.Fps_label.setFont(font)
+        self.Fps_label.setAlignment(QtCore.Qt.AlignCenter)
+        self.Fps_label.setObjectName("Fps_label")
+
+        self.fpsSpinBox = QtWidgets.QSpinBox(self.centralwidget)
+        self.fpsSpinBox.setGeometry(QtCore.QRect(20, 245, 221, 61))
+        font = QtGui.QFont()
+        font.setFamily("Leelawadee UI")
+        font.setPointSize(24)
+        self.fpsSpinBox.setFont(font)
+        self.fpsSpinBox.setAlignment(QtCore.Qt.AlignCenter)
+        self.fpsSpinBox.setMinimum(1)
+        self.fpsSpinBox.setMaximum(30)
+        self.fpsSpinBox.setValue(GRAPH_FPS)
+        self.fpsSpinBox.setObjectName("fpsSpinBox")
+
+        self.Step_timing_label = QtWidgets.QLabel(self.centralwidget)
+        self.Step_timing_label.setGeometry(QtCore.QRect(20, 310, 221, 85))
+        font = QtGui.QFont()
+        font.setFamily("Leelawadee")
+        font.setPointSize(10)
+        self.Step_timing_label.setFont(font)
+        self.Step_timing_label.setAlignment(QtCore.Qt.AlignCenter)
+        self.Step_timing_label.setObjectName("Step_timing_label")
+
         self.textBrowser = QtWidgets.QTextBrowser(self.centralwidget)
         self.textBrowser.setGeometry(QtCore.QRect(300, 350, 461, 121))
         font.setPointSize(9)
@@ -1284,6 +1496,8 @@ class GenWindow(QMainWindow):
         self.Click_B.setText(_translate("General Settings", "Click"))
         self.Alarm_label.setText(_translate("General Settings", "Alarm Status"))
         self.Exit_B.setText(_translate("General Settings", "Exit GUI"))
+        self.Fps_label.setText(_translate("General Settings", "Graph Frames/s"))
+        self.Step_timing_label.setText(_translate("General Settings", "Step timing error\nno steps yet"))
 
 
     # SaCG - Saves general settings and sends changes to main screen
@@ -2073,6 +2287,7 @@ class MyWindow(QMainWindow):        # can name MyWindow anything, inherit QMainW
         self.MS_SB.setReadOnly(False)
         self.MS_SB.setButtonSymbols(QtWidgets.QAbstractSpinBox.NoButtons)
         self.MS_SB.setDecimals(0)
+        self.MS_SB.setMinimum(1.0)                              # the motor cannot run at speed 0
         self.MS_SB.setMaximum(360.0)                            #
         self.MS_SB.setSingleStep(1.0)
         self.MS_SB.setProperty("value", 90.0)
@@ -2321,26 +2536,33 @@ class MyWindow(QMainWindow):        # can name MyWindow anything, inherit QMainW
         self.alarm_graphicsView.setGeometry(QtCore.QRect(150, 420, 101, 51))
         self.alarm_graphicsView.setObjectName("alarm_graphicsView")
 
-        # Initialize graph using PyQtGraph
-        self.temp_graph = PlotWidget(self.centralwidget)
-        self.temp_graph.setGeometry(QtCore.QRect(270, 260, 521, 211))
-        self.temp_graph.setFrameShape(QtWidgets.QFrame.NoFrame)
-        self.temp_graph.setFrameShadow(QtWidgets.QFrame.Sunken)
-        self.temp_graph.setBackground((43,43,43))
-        self.temp_graph.setObjectName("temp_graph")
-        styles = {'color':'#fff', 'font-size':'14px'}
-        pen = mkPen(color=(255, 64, 64), width=3)
-        self.temp_graph.getAxis('left').setPen('w')
-        self.temp_graph.getAxis('bottom').setPen('w')
-        self.temp_graph.getAxis('left').setTextPen('w')
-        self.temp_graph.getAxis('bottom').setTextPen('w')
-        self.x = [0.0] * 20
-        self.y = [0.0] * 20
-        self.temp_graph.setLabel('left', 'Temperature (°C)', **styles)
-        self.temp_graph.setLabel('bottom', 'Time (sec)', **styles)
-        self.data=self.temp_graph.plot(self.x, self.y, pen=pen)
-
-        self.initTime = round(time.time(),1)
+        # Time range shown on the graph
+        self.graphRange_CB = QtWidgets.QComboBox(self.centralwidget)
+        self.graphRange_CB.setGeometry(QtCore.QRect(685, 264, 101, 28))
+        font = QtGui.QFont()
+        font.setFamily("Leelawadee UI")
+        font.setPointSize(11)
+        self.graphRange_CB.setFont(font)
+        self.graphRange_CB.addItems([name for name, seconds in GRAPH_RANGES])
+        self.graphRange_CB.setCurrentIndex(0)
+        self.graphRange_CB.setObjectName("graphRange_CB")
+        self.graphRange_CB.currentIndexChanged.connect(self.graphRangeChanged)
+
+        # Alarm light palettes are made once and reused, "shown" remembers what the alarm widgets show
+        self.no_alarm_palette = solid_palette(QtGui.QPalette.Base, (43, 43, 43), (43, 43, 43))
+        self.alarm_palette = solid_palette(QtGui.QPalette.Base, (255, 0, 0), (43, 43, 43))
+        self.shown = ShownState()
+
+        # The graph is redrawn by a frame timer, not by each temperature reading
+        # The timer only runs while the graph is shown
+        self.graph_timer = QTimer(self)
+        self.graph_timer.setInterval(int(1000 / GRAPH_FPS))
+        self.graph_timer.timeout.connect(self.updateGraph)
+        self.temp_graph = None
+        self.graph_enabled = True
+        QTimer.singleShot(0, self.initGraph)    # graph is made once the main screen is shown
+
+        self.initTime = round(clock.time(),1)
         self.yy = 0.0
         
         
@@ -2379,28 +2601,43 @@ class MyWindow(QMainWindow):        # can name MyWindow anything, inherit QMainW
         self.retranslateUi(self)
         QtCore.QMetaObject.connectSlotsByName(self)
 
+        # Motor ramp settings, set in Motor Settings window or via Modbus writes
+        self.motor_accel = 2000.0
+        self.motor_jerk = 20000.0
+        self.motor_profile = PROFILE_NONE
+
+        # Fastest motor speed the motor service can step (lower when microstepping), faster speeds are limited to it
+        self.max_motor_speed = float(int(min(360.0, motor.max_speed())))
+        self.MS_SB.setMaximum(self.max_motor_speed)
+
         # Create Modbus server
         self.StartServer()
 
-        # Create each settings window
-        self.tempwindow = TempWindow()
-        self.motorwindow = MotorWindow()
-        self.genwindow = GenWindow()
+        # Settings windows are built the first time they are opened (see "...click" functions)
+        # Until then the values they would show are kept here
+        self.tempwindow = None
+        self.motorwindow = None
+        self.genwindow = None
+        self.init_set_temp = None       # set temperature read from the temperature controller at start
+        self.alarm_bits = 0
+        self.step_timing = None         # step interval error (p50, p99, max in us), None before the first steps
+        self.jog_click = True           # rotate buttons move one step per click (False = toggle on / off)
 
         # Connecting Signals/Slots
         self.TempSettings_B.clicked.connect(self.tempclick)
         self.MotorSettings_B.clicked.connect(self.motorclick)
         self.GenSettings_B.clicked.connect(self.genclick)
-        self.tempwindow.saveTempSettings.connect(self.updateST)     # on save aand close, updates main window
-        self.motorwindow.saveMotorSettings.connect(self.updateMS)
-        self.genwindow.saveGenSettings.connect(self.updateGenSettings)
-        self.serverworker.updateModbusValues.connect(self.updateMB)
+        for spinbox in (self.ST_SB, self.MS_SB, self.MDOR_SB, self.MD_SB):
+            spinbox.setKeyboardTracking(False)      # a typed value is published once Enter is pressed or the box loses focus
+            spinbox.valueChanged.connect(self.updateMB)     # any change on main screen is published to the Modbus server
         self.serverworker.updateGUIValues.connect(self.updateMainGUIValues)
         self.serverworker.updateCurrentTemp.connect(self.updateGUICurrentTemp)
         self.serverworker.SendSetTemp.connect(self.send_temp_fromMB)
         self.serverworker.sendAlarmStatus.connect(self.updateAlarms)
+        self.serverworker.sendStepTiming.connect(self.updateStepTiming)
         self.serverworker.setSetTemp.connect(self.initialSetTemp)
         self.serverworker.motorStatus.connect(self.modbusMotorChange)
+        self.serverworker.motorStopped.connect(self.motorStopped)
         self.RotateFwd_B.clicked.connect(self.Forward)
         self.RotateRev_B.clicked.connect(self.Reverse)
         self.StartStopMotor_B.clicked.connect(self.StartStopHandler)
@@ -2472,7 +2709,12 @@ class MyWindow(QMainWindow):        # can name MyWindow anything, inherit QMainW
         self.MD_SB.setFont(font)
         font.setPointSize(52)
         self.ST_SB.setFont(font)
-        self.temp_graph.show()
+        self.graph_enabled = True
+        self.graphRange_CB.show()
+        if self.temp_graph is not None:
+            self.temp_graph.show()
+            self.graph_drawn = -1
+            self.graph_timer.start()
     
     # Changes screen to hide graph
     def withoutGraph(self):
@@ -2516,77 +2758,63 @@ class MyWindow(QMainWindow):        # can name MyWindow anything, inherit QMainW
         self.MD_SB.setFont(font)
         font.setPointSize(44)
         self.ST_SB.setFont(font)
-        self.temp_graph.hide()
+        self.graph_enabled = False
+        if self.temp_graph is not None:
+            self.temp_graph.hide()
+        self.graphRange_CB.hide()
+        self.graph_timer.stop()         # no frames are drawn while the graph is hidden
 
     # Rotates forward, determines if click or toggle is set in general settings
     def Forward(self):
         steps=int(round((motorSteps/12),0))
-        if self.genwindow.Click_B.isChecked():
+        if self.jog_click:
+            if motor.state == STATE_SHAKING:
+                return          # a jog would end the shake, the rotate buttons are off while shaking
             log.debug("Rotate forward clicked")
-            GPIO.output(DIR,CW)
-            for x in range (steps):
-                GPIO.output(STEP,GPIO.HIGH)
-                time.sleep(.001)
-                GPIO.output(STEP,GPIO.LOW)
-                time.sleep(.001)
+            motor.jog(CW, steps, JOG_CLICK_RATE)
         else:
             if self.RotateFwd_B.isChecked():
                 self.StartStopMotor_B.setEnabled(False)
                 self.RotateRev_B.setEnabled(False)
                 self.GenSettings_B.setEnabled(False)
-                self.motorthread = QThread(parent=self)  # a new thread to run our background tasks in
-                self.motorthread.daemon = True
-                self.motorworker = MotorWorker()  # a new worker to perform those tasks
-                self.motorworker.moveToThread(self.motorthread)  # move the worker into the thread, do this first before connecting the signals
-                self.motorthread.started.connect(self.motorworker.work_fwd)  # begin our worker object's loop when the thread starts running
-                self.motorthread.start()
+                log.debug("Rotate forward toggled on")
+                motor.jog(CW, None, JOG_TOGGLE_RATE)
             else:
                 self.StartStopMotor_B.setEnabled(True)
                 self.RotateRev_B.setEnabled(True)
                 self.GenSettings_B.setEnabled(True)
-                self.motorworker.fwd_working = False
-                self.motorworker.finished.connect(self.motorthread.quit)  # tell the thread it's time to stop running
-                self.motorworker.finished.connect(self.motorworker.deleteLater)  # have worker mark itself for deletion
-                self.motorthread.finished.connect(self.motorthread.deleteLater)  # have thread mark itself for deletion
+                motor.halt()
 
     # Rotates reverse, determines if click or toggle is set in general settings
     def Reverse(self):
         steps=int(round((motorSteps/12),0))
-        if self.genwindow.Click_B.isChecked():
+        if self.jog_click:
+            if motor.state == STATE_SHAKING:
+                return          # a jog would end the shake, the rotate buttons are off while shaking
             log.debug("Rotate reverse clicked")
-            GPIO.output(DIR,CCW)
-            for x in range (steps):
-                GPIO.output(STEP,GPIO.HIGH)
-                time.sleep(.001)
-                GPIO.output(STEP,GPIO.LOW)
-                time.sleep(.001)
+            motor.jog(CCW, steps, JOG_CLICK_RATE)
         else:
             if self.RotateRev_B.isChecked():
                 self.StartStopMotor_B.setEnabled(False)
                 self.RotateFwd_B.setEnabled(False)
                 self.GenSettings_B.setEnabled(False)
-                self.motorthread = QThread(parent=self)  # a new thread to run our background tasks in
-                self.motorthread.daemon = True
-                self.motorworker = MotorWorker()  # a new worker to perform those tasks
-                self.motorworker.moveToThread(self.motorthread)  # move the worker into the thread, do this first before connecting the signals
-                self.motorthread.started.connect(self.motorworker.work_rev)  # begin our worker object's loop when the thread starts running
-                self.motorthread.start()
+                log.debug("Rotate reverse toggled on")
+                motor.jog(CCW, None, JOG_TOGGLE_RATE)
             else:
                 self.StartStopMotor_B.setEnabled(True)
                 self.RotateFwd_B.setEnabled(True)
                 self.GenSettings_B.setEnabled(True)
-                self.motorworker.rev_working = False
-                self.motorworker.finished.connect(self.motorthread.quit)  # tell the thread it's time to stop running
-                self.motorworker.finished.connect(self.motorworker.deleteLater)  # have worker mark itself for deletion
-                self.motorthread.finished.connect(self.motorthread.deleteLater)  # have thread mark itself for deletion
+                motor.halt()
 
 
     # Updates main screen from settings chosen in general settings window
     def updateGenSettings(self):
+        self.graph_timer.setInterval(int(1000 / self.genwindow.fpsSpinBox.value()))
         if self.genwindow.Enable_on_B.isChecked():
             self.withGraph()
         else:
             self.withoutGraph()
+        self.jog_click = self.genwindow.Click_B.isChecked()
         if self.genwindow.Toggle_B.isChecked():
             self.RotateFwd_B.setCheckable(True)
             self.RotateRev_B.setCheckable(True)
@@ -2597,18 +2825,53 @@ class MyWindow(QMainWindow):        # can name MyWindow anything, inherit QMainW
     # Start/Stop Motor via Modbus write
     def modbusMotorChange(self):
         self.StartStopMotor_B.click()
+
+    # Motor stopped by itself, the Start/Stop button shows it is off
+    def motorStopped(self):
+        self.StartStopMotor_B.setChecked(False)
+        self.RotateFwd_B.setEnabled(True)
+        self.RotateRev_B.setEnabled(True)
     
-    # "...click" functions show the settings windows
+    # "...click" functions show the settings windows, each window is built the first time it is opened
+    # A new window is given the values it would have been kept up to date with
     def tempclick(self):
         log.debug("Opening Temperature Settings window")
+        if self.tempwindow is None:
+            start = startup.now()
+            self.tempwindow = TempWindow()
+            self.tempwindow.saveTempSettings.connect(self.updateST)     # on save aand close, updates main window
+            self.tempwindow.currentSpinBox.setValue(self.CT_SB.value())
+            if self.init_set_temp is not None:
+                self.tempwindow.setSpinBox.setValue(self.init_set_temp)
+            log.info("Built Temperature Settings window in %.0f ms" % ((startup.now() - start) * 1e3))
         self.tempwindow.show()
 
     def motorclick(self):
         log.debug("Opening Motor Settings window")
+        if self.motorwindow is None:
+            start = startup.now()
+            self.motorwindow = MotorWindow()
+            self.motorwindow.saveMotorSettings.connect(self.updateMS)
+            self.motorwindow.msSpinBox.setMaximum(self.max_motor_speed)
+            self.motorwindow.accSpinBox.setValue(self.motor_accel)
+            self.motorwindow.jerkSpinBox.setValue(self.motor_jerk)
+            self.motorwindow.profileComboBox.setCurrentIndex(self.motor_profile)
+            log.info("Built Motor Settings window in %.0f ms" % ((startup.now() - start) * 1e3))
         self.motorwindow.show()
 
     def genclick(self):
         log.debug("Opening General Settings window")
+        if self.genwindow is None:
+            start = startup.now()
+            self.genwindow = GenWindow()
+            self.genwindow.saveGenSettings.connect(self.updateGenSettings)
+            self.shown.forget('gen_alarm_light')
+            self.shown.forget('alarm_text')
+            self.updateAlarms(self.alarm_bits)
+            if self.step_timing is not None:
+                self.shown.forget('step_timing')
+                self.updateStepTiming(*self.step_timing)
+            log.info("Built General Settings window in %.0f ms" % ((startup.now() - start) * 1e3))
         self.genwindow.show()
 
     # Update functions used to update main screen when closing temperature settings or motor settings windows
@@ -2617,137 +2880,108 @@ class MyWindow(QMainWindow):        # can name MyWindow anything, inherit QMainW
         self.send_temp()
 
     def updateMS(self):
-        self.MS_SB.setValue(self.motorwindow.msSpinBox.value())
-        self.MDOR_SB.setValue(self.motorwindow.dorSpinBox.value())
-        self.MD_SB.setValue(self.motorwindow.dwellSpinBox.value())
-
+        self.motor_accel = self.motorwindow.accSpinBox.value()
+        self.motor_jerk = self.motorwindow.jerkSpinBox.value()
+        self.motor_profile = self.motorwindow.profileComboBox.currentIndex()
+        boxes = ((self.MS_SB, self.motorwindow.msSpinBox), (self.MDOR_SB, self.motorwindow.dorSpinBox),
+                 (self.MD_SB, self.motorwindow.dwellSpinBox))
+        for spinbox, source in boxes:
+            spinbox.blockSignals(True)          # published once below, not once per box
+            spinbox.setValue(source.value())
+            spinbox.blockSignals(False)
+        self.updateMB()     # ramp settings are not on the main screen, publish them here
+
+    # Publishes main screen values to the Modbus server and the motor
+    # A running motor takes new motor settings at its next stroke
     def updateMB(self):
-        log.debug("Updating ModBus values")
-        self.serverworker.MB_set_temp = self.ST_SB.value()
-        self.serverworker.MB_current_temp = self.CT_SB.value()
-        self.serverworker.MB_motor_speed = self.MS_SB.value()
-        self.serverworker.MB_motor_dor = self.MDOR_SB.value()
-        self.serverworker.MB_motor_dwell = self.MD_SB.value()
+        version = self.serverworker.gui_settings.publish([self.ST_SB.value(), self.MS_SB.value(), self.MDOR_SB.value(), self.MD_SB.value(),
+                                                          self.motor_accel, self.motor_jerk, float(self.motor_profile)])
+        log.debug("Updating ModBus values, version " + str(version))
+        self.serverworker.requestSync()
+        motor.update(self.motorParams())
+
+    # Motor settings on the main screen and in the motor settings window
+    def motorParams(self):
+        return ShakeParams(self.MS_SB.value(), self.MDOR_SB.value(), self.MD_SB.value(),
+                           self.motor_accel, self.motor_jerk, self.motor_profile)
 
     # Updates main screen if variables changed via Modbus writes
-    def updateMainGUIValues(self):
-        self.ST_SB.setValue(self.serverworker.MB_set_temp)
-        self.MS_SB.setValue(self.serverworker.MB_motor_speed)
-        self.MDOR_SB.setValue(self.serverworker.MB_motor_dor)
-        self.MD_SB.setValue(self.serverworker.MB_motor_dwell)
-
-    # Updates current temperature and graph when called via LoopingCall
-    def updateGUICurrentTemp(self):
-        self.CT_SB.setValue(self.serverworker.MB_current_temp)
-        self.tempwindow.currentSpinBox.setValue(self.serverworker.MB_current_temp)
-        self.updateGraph()
+    def updateMainGUIValues(self, set_temp, speed, dor, dwell, accel, jerk, profile):
+        self.motor_accel = accel
+        self.motor_jerk = jerk
+        self.motor_profile = int(profile)
+        if self.motorwindow is not None:
+            set_value(self.motorwindow.accSpinBox, accel)
+            set_value(self.motorwindow.jerkSpinBox, jerk)
+            set_index(self.motorwindow.profileComboBox, self.motor_profile)
+        set_value(self.ST_SB, set_temp)
+        set_value(self.MS_SB, speed)
+        set_value(self.MDOR_SB, dor)
+        set_value(self.MD_SB, dwell)
+
+    # Updates current temperature when called via "pollTemperature", the graph is drawn by its frame timer
+    def updateGUICurrentTemp(self, current_temp):
+        set_value(self.CT_SB, current_temp)
+        if self.tempwindow is not None:
+            set_value(self.tempwindow.currentSpinBox, current_temp)
     
-    # Updates alarm light and alarm info in general settings window
-    # Sends alarm info to Modbus server by writing to discrete inputs
-    def updateAlarms(self):
-        self.alarm_info_str = "Alarms: "
-        self.Alarm_List=[0,0,0,0,0,0,0]
-        self.Alarm_List=self.serverworker.alarm_lst
-        if self.Alarm_List[6] == 1:  #b[0]
-            log.warning('High Alarm Detected')
-            self.alarm_info_str += "High Temperature Alarm Detected!\n"
-            self.serverworker.MB_alarm_hightemp = True
-        else:
-            self.serverworker.MB_alarm_hightemp = False
-        if self.Alarm_List[5] == 1:  #b[1]
-            log.warning('Low Alarm Detected')
-            self.alarm_info_str += "Low Temperature Alarm Detected!\n"
-            self.serverworker.MB_alarm_lowtemp = True
-        else:
-            self.serverworker.MB_alarm_lowtemp = False
-        if self.Alarm_List[4] == 1:  #b[2]
-            log.warning('Computer Controlled Alarm Detected')
-            self.alarm_info_str += "Computer Controlled Alarm Detected!\n"
-        if self.Alarm_List[3] == 1:  #b[3]
-            log.warning('Over Current Detected')
-            self.alarm_info_str += "Over Current Detected! TEC attempted to draw more current than allowed.\n"
-            self.serverworker.MB_alarm_overcurrent = True
-        else:
-            self.serverworker.MB_alarm_overcurrent = False
-        if self.Alarm_List[2] == 1:  #b[4]
-            log.warning('Open Input 1 Detected')
-            self.alarm_info_str += "OPEN INPUT1! There is a problem with the primary temperature sensor.\n"
-            self.serverworker.MB_alarm_therm = True
-        else:
-            self.serverworker.MB_alarm_therm = False
-        if self.Alarm_List[1] == 1:  #b[5]
-            log.warning('Open Input 2 Detected')
-            self.alarm_info_str += "OPEN INPUT2! There is a problem with the secondary temperature sensor.\n"       #should never trigger unless 2nd thermister
-        if self.Alarm_List[0] == 1:  #b[3]
-            log.warning('Driver Low Input Voltage Detected')
-            self.alarm_info_str += "Driver Low Input Voltage Detected! The controller does not have a high enough voltage to properly operate.\n"
-            self.serverworker.MB_alarm_low_voltage = True
-        else:
-            self.serverworker.MB_alarm_low_voltage = False
-        if self.Alarm_List == [0,0,0,0,0,0,0]:
-            self.alarm_bool=False
-            palette = QtGui.QPalette()
-            brush = QtGui.QBrush(QtGui.QColor(43, 43, 43))
-            brush.setStyle(QtCore.Qt.SolidPattern)
-            palette.setBrush(QtGui.QPalette.Active, QtGui.QPalette.Base, brush)
-            brush = QtGui.QBrush(QtGui.QColor(43, 43, 43))
-            brush.setStyle(QtCore.Qt.SolidPattern)
-            palette.setBrush(QtGui.QPalette.Inactive, QtGui.QPalette.Base, brush)
-            brush = QtGui.QBrush(QtGui.QColor(43, 43, 43))
-            brush.setStyle(QtCore.Qt.SolidPattern)
-            palette.setBrush(QtGui.QPalette.Disabled, QtGui.QPalette.Base, brush)
+    # Updates alarm light and alarm info in general settings window when an alarm turned on or off
+    # Alarm info lists the active alarms, then the alarm history (newest first)
+    # (alarm discrete inputs and input registers are written by ServerWorker)
+    def updateAlarms(self, alarm_bits):
+        self.alarm_bits = alarm_bits
+        self.alarm_bool = alarm_bits != 0
+        palette = self.alarm_palette if self.alarm_bool else self.no_alarm_palette
+        if self.shown.changed('alarm_light', self.alarm_bool):
             self.alarm_graphicsView.setPalette(palette)
+        if self.genwindow is None:
+            return          # the general settings window is given the alarms when it is built
+        if self.shown.changed('gen_alarm_light', self.alarm_bool):
             self.genwindow.Alarm_stat_graphicsView.setPalette(palette)
-            self.genwindow.textBrowser.setText("")
-        else:
-            self.alarm_bool=True
-            palette = QtGui.QPalette()
-            brush = QtGui.QBrush(QtGui.QColor(255, 0, 0))
-            brush.setStyle(QtCore.Qt.SolidPattern)
-            palette.setBrush(QtGui.QPalette.Active, QtGui.QPalette.Base, brush)
-            brush = QtGui.QBrush(QtGui.QColor(255, 0, 0))
-            brush.setStyle(QtCore.Qt.SolidPattern)
-            palette.setBrush(QtGui.QPalette.Inactive, QtGui.QPalette.Base, brush)
-            brush = QtGui.QBrush(QtGui.QColor(43, 43, 43))
-            brush.setStyle(QtCore.Qt.SolidPattern)
-            palette.setBrush(QtGui.QPalette.Disabled, QtGui.QPalette.Base, brush)
-            self.alarm_graphicsView.setPalette(palette)
-            self.genwindow.Alarm_stat_graphicsView.setPalette(palette)
-            self.genwindow.textBrowser.setText(self.alarm_info_str)
+        info = "Alarms: " + alarm_text(alarm_bits) if self.alarm_bool else ""
+        events = self.serverworker.alarms.events()
+        if events:
+            info += "\nAlarm history:\n" + "\n".join(event_text(event) for event in events)
+        if self.shown.changed('alarm_text', info):
+            self.genwindow.textBrowser.setText(info)
+
+    # Shows the step interval error in the general settings window
+    def updateStepTiming(self, p50, p99, max_error):
+        self.step_timing = (p50, p99, max_error)
+        if self.genwindow is None:
+            return          # the general settings window is given the step timing when it is built
+        text = "Step timing error\np50 %.0f us\np99 %.0f us\nmax %.0f us" % self.step_timing
+        if self.shown.changed('step_timing', text):
+            self.genwindow.Step_timing_label.setText(text)
 
     # Updates set temp on main screen via writes to Modbus server
-    def send_temp_fromMB(self):
-        self.ST_SB.setValue(self.serverworker.MB_set_temp)
+    def send_temp_fromMB(self, set_temp):
+        self.ST_SB.setValue(set_temp)
         self.send_temp()
 
     # Sets initial set temp on main screen by checking saved set temp on temp controller
-    def initialSetTemp(self):
-        self.ST_SB.setValue(self.serverworker.initSetTemp)
-        self.tempwindow.setSpinBox.setValue(self.serverworker.initSetTemp)
+    def initialSetTemp(self, set_temp):
+        self.ST_SB.setValue(set_temp)
+        self.init_set_temp = set_temp
+        if self.tempwindow is not None:
+            self.tempwindow.setSpinBox.setValue(set_temp)
 
     # Handler for Start/Stop button press
+    # The settings go with the shake command, so the motor never starts with old values
+    # The rotate buttons are off while shaking, a jog would end the shake
     def StartStopHandler(self):
         if self.StartStopMotor_B.isChecked():
-            self.motorthread = QThread(parent=self)  # a new thread to run our background tasks in
-            self.motorthread.daemon = True
-            self.motorworker = MotorWorker()  # a new worker to perform those tasks
-            self.motorworker.moveToThread(self.motorthread)  # move the worker into the thread, do this first before connecting the signals
-            self.motorthread.started.connect(self.motorworker.work)  # begin our worker object's loop when the thread starts running
-            self.motorthread.start()
-            self.motorworker.speed = self.MS_SB.value()
-            self.motorworker.dor = self.MDOR_SB.value()
-            self.motorworker.dwell = self.MD_SB.value()
+            self.RotateFwd_B.setEnabled(False)
+            self.RotateRev_B.setEnabled(False)
+            motor.shake(self.motorParams())
             self.serverworker.MB_motor_on = True
-            self.serverworker.GUI_motorFlag = True
+            self.serverworker.requestSync()
         else:
             self.serverworker.MB_motor_on = False
-            self.serverworker.GUI_motorFlag = True
-            self.motorworker.working = False
-            #self.motorworker.finished.connect(self.loop_finished)  # do something in the gui when the worker loop ends
-            self.motorworker.finished.connect(self.motorthread.quit)  # tell the thread it's time to stop running
-            self.motorworker.finished.connect(self.motorworker.deleteLater)  # have worker mark itself for deletion
-            self.motorthread.finished.connect(self.motorthread.deleteLater)  # have thread mark itself for deletion
-            # make sure those last two are connected to themselves or you will get random crashes
+            self.serverworker.requestSync()
+            motor.halt()
+            self.RotateFwd_B.setEnabled(True)
+            self.RotateRev_B.setEnabled(True)
 
     # Creates modbus server in seperate thread via ServerWorker class
     def StartServer(self):
@@ -2757,47 +2991,90 @@ class MyWindow(QMainWindow):        # can name MyWindow anything, inherit QMainW
         self.serverworker.moveToThread(self.serverthread)  # move the worker into the thread, do this first before connecting the signals
         self.serverthread.started.connect(self.serverworker.work)  # begin our worker object's loop when the thread starts running
         self.serverthread.start()
-        self.serverworker.MB_set_temp = self.ST_SB.value()
-        self.serverworker.MB_current_temp = self.CT_SB.value()
-        self.serverworker.MB_motor_speed = self.MS_SB.value()
-        self.serverworker.MB_motor_dor = self.MDOR_SB.value()
-        self.serverworker.MB_motor_dwell = self.MD_SB.value()
+        self.updateMB()
 
     # Sends set temp to temp controller
+    # Does not wait for the reply, the write is queued ahead of any polls
     def send_temp(self):
-        buf=['*','0','0','0','0','0','0','0','0','0','0','^']
-        A1, A2='0','2'
-        C1,C2='1','c'
-        set_temp=float(self.ST_SB.value())
-        desired_temp = set_temp * 100
-        desired_temp = int(round(desired_temp))
-        if desired_temp < 0:
-            desired_temp = (0xffffffff - (-desired_temp)) + 1
-        desired_temp=hex(desired_temp)[2:]
-        desired_temp=list(desired_temp)
-        while len(desired_temp) < 8:
-            desired_temp.insert(0,'0')
-        D1,D2,D3,D4,D5,D6,D7,D8=desired_temp
-        S1,S2=calc_checksum(A1,A2,C1,C2,D1,D2,D3,D4,D5,D6,D7,D8)
-        bst=['*',A1,A2,C1,C2,D1,D2,D3,D4,D5,D6,D7,D8,S1,S2,'\r']
-        for pn in range(0,16):
-            ser.write(bst[pn].encode())
-        for pn in range(0,12):
-            buf[pn]=ser.read(1)
+        arbiter.submit(PRIORITY_SETPOINT, 'write_set_temp', float(self.ST_SB.value()))
     
-    # Updates graph with current temp reading (y-axis) and time since start (x-axis)
+    # Creates the graph using PyQtGraph, called once the main screen is shown
+    # pyqtgraph is imported here, and the pyramid filled with the saved history, so neither holds up the main screen
+    def initGraph(self):
+        from pyqtgraph import PlotWidget, mkPen
+        self.temp_graph = PlotWidget(self.centralwidget)
+        self.temp_graph.setGeometry(QtCore.QRect(270, 260, 521, 211))
+        self.temp_graph.setFrameShape(QtWidgets.QFrame.NoFrame)
+        self.temp_graph.setFrameShadow(QtWidgets.QFrame.Sunken)
+        self.temp_graph.setBackground((43,43,43))
+        self.temp_graph.setObjectName("temp_graph")
+        styles = {'color':'#fff', 'font-size':'14px'}
+        pen = mkPen(color=(255, 64, 64), width=3)
+        self.temp_graph.getAxis('left').setPen('w')
+        self.temp_graph.getAxis('bottom').setPen('w')
+        self.temp_graph.getAxis('left').setTextPen('w')
+        self.temp_graph.getAxis('bottom').setTextPen('w')
+        self.temp_graph.setLabel('left', 'Temperature (°C)', **styles)
+        self.temp_graph.setLabel('bottom', 'Time (sec)', **styles)
+        self.data=self.temp_graph.plot([], [], pen=pen)
+
+        self.fillGraph()
+
+        self.graphRange_CB.raise_()     # range selection stays on top of the graph
+        if self.graph_enabled:
+            self.temp_graph.show()
+            self.graph_timer.start()
+        startup.mark('graph')
+
+    # Graph data at every zoom level, filled with the saved history then with each new sample
+    # Made again from the history when the history started again (clock went back, see history.py)
+    def fillGraph(self):
+        self.graph_pyramid = MinMaxPyramid(int(GRAPH_HORIZON / ServerWorker.TEMP_PERIOD))
+        self.graph_generation = history.generation
+        self.graph_count = history.count
+        for record in history.records(self.graph_pyramid.capacity, self.graph_count):
+            self.graph_pyramid.append(record[0], record[1])
+        self.graph_drawn = -1       # history count drawn in the last frame, -1 forces a redraw
+
+    # Redraws the graph with a new time range on the next frame
+    def graphRangeChanged(self):
+        self.graph_drawn = -1
+
+    # Draws one graph frame, called by the frame timer
+    # Graph shows the temperature readings (y-axis) and time since start (x-axis) of the chosen time range
+    # New samples are read from the history into the pyramid, then the zoom level with about one point per pixel is drawn
+    # The frame is skipped if no sample arrived since the last frame
     def updateGraph(self):
-        self.x=self.x[1:]
-        self.x.append(round(time.time(),2)-self.initTime)
-        self.y=self.y[1:]
-        self.y.append(self.CT_SB.value())
-        self.data.setData(self.x, self.y)
+        import numpy
+        if history.generation != self.graph_generation:
+            self.fillGraph()
+        count = history.count
+        if count == self.graph_drawn:
+            return
+        for record in history.records(count - self.graph_count, count):
+            self.graph_pyramid.append(record[0], record[1])
+        self.graph_count = count
+        self.graph_drawn = count
+        now = clock.time()
+        x, y, level = self.graph_pyramid.query(now - GRAPH_RANGES[self.graphRange_CB.currentIndex()][1], now, self.temp_graph.width())
+        self.data.setData(numpy.frombuffer(x) - self.initTime, numpy.frombuffer(y))
     
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)    # config for OS
+    startup.mark('Qt application')
+    openHardware(*hal.options_from_args(sys.argv))
+    startup.mark('hardware')
+    arbiter.start()                 # serial bus thread, must run before the Modbus server starts
+    motor.start()                   # motor thread, runs until the program ends
+    startup.mark('threads')
     win = MyWindow()                # creates main window
+    startup.mark('main window')
 
     win.show()                      # show main window
+    startup.mark('show')
+    QTimer.singleShot(0, startup.report)    # runs after the first events (graph) are handled
 
-    sys.exit(app.exec())
\ No newline at end of file
+    status = app.exec()
+    history.flush()                 # save the temperature history before exiting
+    sys.exit(status)
\ No newline at end of file
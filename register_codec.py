@@ -0,0 +1,83 @@
+# --------------------------------
+# Written for the Cooler-Shaker System
+# Github: https://github.com/alopez505/cooler_shaker
+# --------------------------------
+#
+# --------------------------------
+# register_codec packs and unpacks 32-bit IEEE 754 float values to and from 16-bit Modbus registers
+#
+# Each float value takes 2 registers, the high 16 bits are stored at the first address and the
+# low 16 bits at the second address (same word order used by the Modbus server since the beginning)
+# ex: 90.0 -> [17076, 0]
+#
+# struct is used so whole register blocks are converted in a single call. struct rounds the
+# mantissa to nearest (ties to even) and keeps NaN, +/-inf and -0.0 intact.
+# Values too large for a 32-bit float are stored as +/-inf instead of raising an error.
+# --------------------------------
+import math
+import struct
+
+FLOAT32_OVERFLOW = 3.4028235677973366e+38     # largest 32-bit float + half an ulp, rounds to inf
+
+# Precompiled Struct objects, keyed by the number of float values in the block
+_float_structs = {}
+_word_structs = {}
+
+
+def _float_struct(count):
+    s = _float_structs.get(count)
+    if s is None:
+        s = _float_structs[count] = struct.Struct('>%df' % count)
+    return s
+
+
+def _word_struct(count):
+    s = _word_structs.get(count)
+    if s is None:
+        s = _word_structs[count] = struct.Struct('>%dH' % count)
+    return s
+
+
+# ----------------
+# "_clamp" replaces values that overflow a 32-bit float with +/-inf
+# (IEEE 754 round to nearest overflows to infinity, struct raises OverflowError instead)
+# ----------------
+def _clamp(values):
+    fixed = []
+    for v in values:
+        if abs(v) >= FLOAT32_OVERFLOW:
+            v = math.copysign(math.inf, v)
+        fixed.append(v)
+    return fixed
+
+
+# ----------------
+# "floats_to_registers" converts a block of float values to 16-bit register values
+#
+# Parameter:    values - List (or array) of float values
+#
+# Return:       registers - List of 16-bit values, 2 per float value (high word first)
+# ----------------
+def floats_to_registers(values):
+    count = len(values)
+    try:
+        raw = _float_struct(count).pack(*values)
+    except OverflowError:
+        raw = _float_struct(count).pack(*_clamp(values))
+    return list(_word_struct(count * 2).unpack(raw))
+
+
+# ----------------
+# "registers_to_floats" converts a block of 16-bit register values to float values
+#
+# Parameter:    registers - List (or array) of 16-bit values, length must be even (high word first)
+#
+# Return:       values - List of float values, 1 per 2 registers
+# ----------------
+def registers_to_floats(registers):
+    count = len(registers)
+    if count % 2:
+        raise ValueError("register block must hold an even number of registers, got %d" % count)
+    raw = _word_struct(count).pack(*registers)
+    return list(_float_struct(count // 2).unpack(raw))
+
@@ -0,0 +1,120 @@
+# --------------------------------
+# Written for the Cooler-Shaker System
+# Github: https://github.com/alopez505/cooler_shaker
+# --------------------------------
+#
+# --------------------------------
+# SerialArbiter is the only thread allowed to use the RS-485 port
+#
+# The Modbus server thread and the GUI thread both send commands to the temperature controller.
+# Instead of calling the driver directly, each command is put in a priority queue and the
+# arbiter thread runs them one at a time, so frames never interleave on the bus.
+#
+# Lower priority number runs first:
+#   PRIORITY_SETPOINT - set temperature reads/writes (operator is waiting on these)
+#   PRIORITY_ALARM    - alarm polls
+#   PRIORITY_TEMP     - temperature polls
+# Commands with the same priority run in the order they were submitted.
+#
+# "submit" returns a concurrent.futures.Future holding the result of the command
+# --------------------------------
+import itertools
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+log = logging.getLogger(__name__)
+
+PRIORITY_SETPOINT = 0
+PRIORITY_ALARM = 1
+PRIORITY_TEMP = 2
+
+PRIORITY_NAMES = {PRIORITY_SETPOINT: 'setpoint', PRIORITY_ALARM: 'alarm', PRIORITY_TEMP: 'temp'}
+
+_STOP = -1      # stop request jumps ahead of every command
+
+
+class SerialArbiter(threading.Thread):
+
+    # ----------------
+    # Parameter:    driver - TC36Driver that owns the serial port, only used from this thread
+    # ----------------
+    def __init__(self, driver):
+        super(SerialArbiter, self).__init__(name="SerialArbiter")
+        self.daemon = True
+        self.driver = driver
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()       # keeps FIFO order within a priority
+        self._stats_lock = threading.Lock()
+        self._wait_count = dict((p, 0) for p in PRIORITY_NAMES)
+        self._wait_total = dict((p, 0.0) for p in PRIORITY_NAMES)
+        self._wait_max = dict((p, 0.0) for p in PRIORITY_NAMES)
+
+    # ----------------
+    # "submit" queues a driver command
+    #
+    # Parameter:    priority - PRIORITY_SETPOINT, PRIORITY_ALARM or PRIORITY_TEMP
+    #               command - Name of the TC36Driver method (ex: 'read_current_temp')
+    #               args - Arguments of the method
+    #
+    # Return:       future - Future that holds the value returned by the command
+    # ----------------
+    def submit(self, priority, command, *args):
+        if priority not in PRIORITY_NAMES:
+            raise ValueError("unknown priority %r" % (priority,))
+        future = Future()
+        self._queue.put((priority, next(self._seq), time.perf_counter(), future, command, args))
+        return future
+
+    # ----------------
+    # "stop" ends the arbiter thread after the command currently running, queued commands are cancelled
+    # ----------------
+    def stop(self):
+        self._queue.put((_STOP, next(self._seq), time.perf_counter(), None, None, ()))
+
+    def run(self):
+        log.debug("Serial arbiter running")
+        while True:
+            priority, seq, queued_at, future, command, args = self._queue.get()
+            if priority == _STOP:
+                break
+            if not future.set_running_or_notify_cancel():
+                continue
+            waited = time.perf_counter() - queued_at
+            with self._stats_lock:
+                self._wait_count[priority] += 1
+                self._wait_total[priority] += waited
+                if waited > self._wait_max[priority]:
+                    self._wait_max[priority] = waited
+            try:
+                result = getattr(self.driver, command)(*args)
+            except Exception as e:
+                log.warning("Temperature controller command " + command + " failed: " + str(e))
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+        while not self._queue.empty():
+            future = self._queue.get_nowait()[3]
+            if future is not None:
+                future.cancel()
+        log.debug("Serial arbiter stopped")
+
+    # ----------------
+    # "stats" reports the queue depth and how long commands waited in the queue
+    #
+    # Return:       stats - {'queue_depth': n, 'setpoint': {'count', 'mean_wait', 'max_wait'}, 'alarm': {...}, 'temp': {...}}
+    #               wait times are in seconds
+    # ----------------
+    def stats(self):
+        stats = {'queue_depth': self._queue.qsize()}
+        with self._stats_lock:
+            for p, name in PRIORITY_NAMES.items():
+                count = self._wait_count[p]
+                stats[name] = {
+                    'count': count,
+                    'mean_wait': self._wait_total[p] / count if count else 0.0,
+                    'max_wait': self._wait_max[p],
+                }
+        return stats
@@ -0,0 +1,80 @@
+# --------------------------------
+# Written for the Cooler-Shaker System
+# Github: https://github.com/alopez505/cooler_shaker
+# --------------------------------
+#
+# --------------------------------
+# StartupTimer measures how long each phase of the program start takes
+#
+# The timer starts when it is created (the first thing the program does). "mark" ends the current phase,
+# its time is measured from the end of the phase before. Work done in other threads during the start
+# (ex: Modbus server imports) is measured on its own and given with "add".
+#
+# "report" logs every phase and the total time to a usable main screen, ex:
+#
+#   Startup: imports 412 ms, Qt application 95 ms, hardware 38 ms, threads 2 ms, main window 310 ms, ...
+#   Startup: usable after 1003 ms (background: Modbus server imports 690 ms)
+#
+# Real time (time.perf_counter) is used, not the program clock, so the report is right with a warped clock.
+# --------------------------------
+import logging
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+
+class StartupTimer(object):
+
+    # ----------------
+    # Parameter:    now - Time source (s)
+    # ----------------
+    def __init__(self, now=time.perf_counter):
+        self.now = now
+        self.start = now()
+        self._last = self.start
+        self._lock = threading.Lock()
+        self.phases = []            # (phase, seconds) in order, main thread
+        self.background = []        # (name, seconds), other threads
+        self.reported = False
+
+    # ----------------
+    # "mark" ends the current phase
+    #
+    # Parameter:    phase - Name of the phase that just ended
+    # ----------------
+    def mark(self, phase):
+        now = self.now()
+        with self._lock:
+            self.phases.append((phase, now - self._last))
+            self._last = now
+
+    # ----------------
+    # "add" records work measured outside the main thread
+    #
+    # Parameter:    name - What was measured
+    #               seconds - How long it took
+    # ----------------
+    def add(self, name, seconds):
+        with self._lock:
+            self.background.append((name, seconds))
+        if self.reported:
+            log.info("Startup: %s %.0f ms" % (name, seconds * 1e3))
+
+    # ----------------
+    # "report" ends the last phase and logs the time of each phase and the total
+    #
+    # Parameter:    phase - Name of the last phase
+    #
+    # Return:       total - Time from the start to the end of the last phase (s)
+    # ----------------
+    def report(self, phase='first events'):
+        self.mark(phase)
+        with self._lock:
+            total = self._last - self.start
+            phases = ", ".join("%s %.0f ms" % (name, seconds * 1e3) for name, seconds in self.phases)
+            background = ", ".join("%s %.0f ms" % (name, seconds * 1e3) for name, seconds in self.background)
+            self.reported = True
+        log.info("Startup: " + phases)
+        log.info("Startup: usable after %.0f ms" % (total * 1e3) + (" (background: " + background + ")" if background else ""))
+        return total
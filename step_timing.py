@@ -0,0 +1,95 @@
+# --------------------------------
+# Written for the Cooler-Shaker System
+# Github: https://github.com/alopez505/cooler_shaker
+# --------------------------------
+#
+# --------------------------------
+# StepTimingRecorder measures how far the STEP pulses of the motor drift from their schedule
+#
+# MotionEngine gives "add" the time of every STEP pulse (rising edge) and how late it was made.
+# The interval error of a pulse is the time since the pulse before minus the time the schedule wanted
+# between them (= its lateness minus the lateness of the pulse before), ex: +120 us = the step came
+# 120 us after it should have, counted from the step before.
+#
+# The pulse times and interval errors are written to preallocated ring buffers holding the last
+# BUFFER_SIZE intervals, so "add" never allocates memory and costs the motor thread very little.
+# The first pulse after "restart" (a new motor command) starts a new interval, the time the motor was
+# stopped is not counted as an interval.
+#
+# "snapshot" works out the rolling histogram of the buffered intervals when it is read, from any thread:
+#   p50, p99, max   - size of the interval error (s), 50th / 99th percentile and largest
+#   histogram       - number of intervals with an error (size) up to each of BIN_EDGES, the last bin
+#                     counts every interval above the last edge
+# --------------------------------
+import array
+import bisect
+import collections
+
+BUFFER_SIZE = 4096
+BIN_EDGES = [10e-6, 20e-6, 50e-6, 100e-6, 200e-6, 500e-6, 1e-3, 2e-3, 5e-3]   # s, upper edge of each bin
+BINS = len(BIN_EDGES) + 1
+
+# total - Intervals measured since the start
+# count - Intervals in the buffer (at most BUFFER_SIZE)
+# p50, p99, max - Interval error (s, size)
+# histogram - Intervals in each bin, BINS values
+StepTimingStats = collections.namedtuple('StepTimingStats', ['total', 'count', 'p50', 'p99', 'max', 'histogram'])
+
+
+class StepTimingRecorder(object):
+
+    # ----------------
+    # Parameter:    size - Number of intervals kept
+    # ----------------
+    def __init__(self, size=BUFFER_SIZE):
+        self.size = size
+        self.times = array.array('d', [0.0]) * size     # time of the pulse ending each interval
+        self.errors = array.array('d', [0.0]) * size    # interval error (s), negative = early
+        self.total = 0
+        self._late = None           # lateness of the last pulse, None when the next pulse starts a new interval
+
+    # ----------------
+    # "restart" makes the next pulse the start of a new interval
+    # ----------------
+    def restart(self):
+        self._late = None
+
+    # ----------------
+    # "add" records a STEP pulse, called from the motor thread
+    #
+    # Parameter:    t - Time the pulse was made (s)
+    #               late - Time after its deadline the pulse was made (s)
+    # ----------------
+    def add(self, t, late):
+        last = self._late
+        self._late = late
+        if last is None:
+            return
+        i = self.total % self.size
+        self.times[i] = t
+        self.errors[i] = late - last
+        self.total += 1
+
+    # ----------------
+    # "snapshot" returns StepTimingStats of the intervals in the buffer
+    # ----------------
+    def snapshot(self):
+        total = self.total
+        count = min(total, self.size)
+        errors = sorted(abs(error) for error in self.errors[:count])
+        histogram = [0] * BINS
+        for error in errors:
+            histogram[bisect.bisect_left(BIN_EDGES, error)] += 1
+        if not count:
+            return StepTimingStats(total, 0, 0.0, 0.0, 0.0, histogram)
+        return StepTimingStats(total, count, errors[(count - 1) // 2], errors[min(count - 1, int(count * 0.99))],
+                               errors[-1], histogram)
+
+
+# ----------------
+# "timing_text" returns the interval error percentiles of StepTimingStats in us (ex: "p50 12 us  p99 240 us  max 1310 us")
+# ----------------
+def timing_text(stats):
+    if not stats.count:
+        return "no steps yet"
+    return "p50 %.0f us  p99 %.0f us  max %.0f us" % (stats.p50 * 1e6, stats.p99 * 1e6, stats.max * 1e6)
@@ -0,0 +1,147 @@
+# --------------------------------
+# Written for the Cooler-Shaker System
+# Github: https://github.com/alopez505/cooler_shaker
+# --------------------------------
+#
+# --------------------------------
+# TaskScheduler runs several periodic tasks in the twisted reactor, each with its own period
+#
+# Each task is a twisted LoopingCall. LoopingCall schedules calls at absolute times (start + n * period),
+# so a late call does not push back the calls after it. If the reactor is too busy to make a call in time,
+# LoopingCall skips it and reports how many periods passed, which is counted as a missed deadline.
+#
+# Statistics kept for each task:
+#   runs        - number of calls
+#   missed      - deadlines skipped because the reactor was late
+#   overruns    - calls that took longer than the period
+#   drift       - how late each call started compared to its deadline (mean / max, seconds)
+#   runtime     - how long each call took (mean / max, seconds)
+# --------------------------------
+import logging
+
+from twisted.internet.task import LoopingCall
+
+log = logging.getLogger(__name__)
+
+
+class PeriodicTask(object):
+
+    # ----------------
+    # Parameter:    name - Name used in the statistics
+    #               period - Time between calls (s)
+    #               func - Function called with no arguments
+    # ----------------
+    def __init__(self, name, period, func):
+        self.name = name
+        self.period = period
+        self.func = func
+        self.loop = LoopingCall.withCount(self._tick)
+        self.runs = 0
+        self.missed = 0
+        self.overruns = 0
+        self.drift_total = 0.0
+        self.drift_max = 0.0
+        self.runtime_total = 0.0
+        self.runtime_max = 0.0
+        self._start_time = 0.0
+        self._periods = 0
+
+    # ----------------
+    # Parameter:    clock - IReactorTime provider used for timing (None uses the reactor)
+    #               now - True calls the task right away, False waits one period
+    # ----------------
+    def start(self, clock=None, now=True):
+        if clock is not None:
+            self.loop.clock = clock
+        self._start_time = self.loop.clock.seconds()
+        self._periods = -1 if now else 0       # the first call is counted as 1 period by LoopingCall
+        self.loop.start(self.period, now=now)
+
+    def stop(self):
+        if self.loop.running:
+            self.loop.stop()
+
+    def _tick(self, count):
+        clock = self.loop.clock
+        started = clock.seconds()
+        self._periods += count
+        self.missed += count - 1
+        deadline = self._start_time + self._periods * self.period
+        drift = max(started - deadline, 0.0)
+        self.drift_total += drift
+        if drift > self.drift_max:
+            self.drift_max = drift
+        try:
+            self.func()
+        except Exception:
+            log.exception("Periodic task " + self.name + " failed")     # keep the task running
+        runtime = clock.seconds() - started
+        self.runs += 1
+        self.runtime_total += runtime
+        if runtime > self.runtime_max:
+            self.runtime_max = runtime
+        if runtime > self.period:
+            self.overruns += 1
+
+    def stats(self):
+        runs = self.runs or 1
+        return {
+            'period': self.period,
+            'runs': self.runs,
+            'missed': self.missed,
+            'overruns': self.overruns,
+            'mean_drift': self.drift_total / runs,
+            'max_drift': self.drift_max,
+            'mean_runtime': self.runtime_total / runs,
+            'max_runtime': self.runtime_max,
+        }
+
+
+class TaskScheduler(object):
+
+    # ----------------
+    # Parameter:    clock - IReactorTime provider shared by all tasks (None uses the reactor)
+    # ----------------
+    def __init__(self, clock=None):
+        self.clock = clock
+        self.tasks = []
+        self.running = False
+
+    # ----------------
+    # "add" creates a periodic task, tasks added after "start" are started right away
+    #
+    # Return:       task - PeriodicTask
+    # ----------------
+    def add(self, name, period, func):
+        task = PeriodicTask(name, period, func)
+        self.tasks.append(task)
+        if self.running:
+            task.start(self.clock)
+        return task
+
+    def start(self):
+        self.running = True
+        for task in self.tasks:
+            if not task.loop.running:
+                task.start(self.clock)
+
+    def stop(self):
+        self.running = False
+        for task in self.tasks:
+            task.stop()
+
+    # ----------------
+    # "stats" returns the statistics of every task by task name
+    # ----------------
+    def stats(self):
+        return dict((task.name, task.stats()) for task in self.tasks)
+
+    # ----------------
+    # "report" logs one line per task with the overrun and missed deadline counters
+    # ----------------
+    def report(self):
+        for task in self.tasks:
+            st = task.stats()
+            log.info("Task %-12s period %.3fs runs %d missed %d overruns %d drift mean %.1fms max %.1fms runtime max %.1fms" % (
+                task.name, st['period'], st['runs'], st['missed'], st['overruns'],
+                st['mean_drift'] * 1e3, st['max_drift'] * 1e3, st['max_runtime'] * 1e3))
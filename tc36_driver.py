@@ -0,0 +1,162 @@
+# --------------------------------
+# Written for the Cooler-Shaker System
+# Github: https://github.com/alopez505/cooler_shaker
+# --------------------------------
+#
+# --------------------------------
+# tc36_driver describes the command set of the "TE Tech TC-36-25-RS485" temperature controller
+# and is the single entry point used by the program to talk to the controller
+#
+# Command frame:    *AACCDDDDDDDDSS\r
+#   AA - controller address ('00' to 'ff', address of this controller is '02')
+#   CC - command code (hex)
+#   DD - 32-bit data value in two's complement hex, '00000000' for read commands
+#   SS - 8-bit sum of the characters AA through DD, lower case hex
+#
+# Reply frame:      *DDDDDDDDSS^
+#   DD - 32-bit data value in two's complement hex
+#   SS - 8-bit sum of the characters DD, lower case hex
+#   The controller replies with DD = 'XXXXXXXX' if the command checksum was wrong
+#
+# See TC-36-25-RS485 Manual for more info
+# --------------------------------
+from tc36_transport import TransportError
+
+DEFAULT_ADDRESS = '02'
+
+# --------------------------------
+# Controller command table
+#
+#   name: (read command, write command, scale)
+#
+# Values are sent to and received from the controller as integers, "scale" converts them to
+# engineering units (ex: 2150 / 100 = 21.50 C). None means the command can not be read or written.
+# --------------------------------
+COMMANDS = {
+    'current_temp':             ('01', None, 100),      # input1 thermistor temperature (C)
+    'desired_control':          ('03', None, 100),      # control temperature in use (C)
+    'output_power':             ('04', None, 1),        # output power, -511 to 511 = -100% to 100%
+    'alarm_status':             ('05', None, 1),        # alarm bits, see alarms.py
+    'set_temp':                 ('50', '1c', 100),      # fixed set temperature (C)
+    'proportional_bandwidth':   ('51', '1d', 100),      # P (C)
+    'integral_gain':            ('52', '1e', 100),      # I (repeats/min)
+    'derivative_gain':          ('53', '1f', 100),      # D (min)
+    'high_alarm':               ('57', '23', 100),      # high temperature alarm setting (C)
+    'low_alarm':                ('58', '24', 100),      # low temperature alarm setting (C)
+    'control_deadband':         ('59', '25', 100),      # control deadband (C)
+    'input1_offset':            ('5a', '26', 100),      # thermistor offset (C)
+    'output_enable':            ('64', '2d', 1),        # 0 = output off, 1 = output on
+}
+
+
+# ----------------
+# Raised when a reply frame is malformed, fails its checksum or the controller rejected the command
+# ----------------
+class ReplyError(TransportError):
+    pass
+
+
+# ----------------
+# "build_frame" creates a complete command frame
+#
+# Parameter:    address - Controller address as 2 hex characters
+#               command - Command code as 2 hex characters
+#               value - Integer data value (signed 32-bit)
+#
+# Return:       frame - Command frame as bytes
+# ----------------
+def build_frame(address, command, value=0):
+    body = '%s%s%08x' % (address, command, value & 0xffffffff)
+    checksum = sum(body.encode()) & 0xff
+    return ('*%s%02x\r' % (body, checksum)).encode()
+
+
+# ----------------
+# "decode_reply" checks a reply frame and returns its data value
+#
+# Parameter:    reply - Reply frame as bytes (b'*DDDDDDDDSS^')
+#
+# Return:       value - Signed 32-bit data value
+# ----------------
+def decode_reply(reply):
+    if reply[:1] != b'*' or reply[11:12] != b'^':
+        raise ReplyError("malformed reply " + repr(reply))
+    data = reply[1:9]
+    if data == b'XXXXXXXX':
+        raise ReplyError("controller rejected command checksum")
+    if int(reply[9:11], 16) != sum(data) & 0xff:
+        raise ReplyError("reply checksum mismatch " + repr(reply))
+    value = int(data, 16)
+    if value & 0x80000000:
+        value -= 0x100000000          # negative values are sent as two's complement
+    return value
+
+
+# Read commands never change, so their frames are built once for the default address
+_read_frames = dict((name, build_frame(DEFAULT_ADDRESS, read, 0))
+                    for name, (read, write, scale) in COMMANDS.items() if read is not None)
+
+
+class TC36Driver(object):
+
+    # ----------------
+    # Parameter:    transport - TC36Transport used to send frames
+    #               address - Controller address as 2 hex characters
+    # ----------------
+    def __init__(self, transport, address=DEFAULT_ADDRESS):
+        self.transport = transport
+        self.address = address
+        if address == DEFAULT_ADDRESS:
+            self.read_frames = _read_frames
+        else:
+            self.read_frames = dict((name, build_frame(address, read, 0))
+                                    for name, (read, write, scale) in COMMANDS.items() if read is not None)
+
+    # ----------------
+    # "read" reads a value from the controller
+    #
+    # Parameter:    name - Name of the command in COMMANDS
+    #
+    # Return:       value - Value in engineering units
+    # ----------------
+    def read(self, name):
+        scale = COMMANDS[name][2]
+        frame = self.read_frames.get(name)
+        if frame is None:
+            raise ValueError(name + " can not be read")
+        value = decode_reply(self.transport.transact(frame))
+        if scale == 1:
+            return value
+        return value / scale
+
+    # ----------------
+    # "write" writes a value to the controller
+    #
+    # Parameter:    name - Name of the command in COMMANDS
+    #               value - Value in engineering units
+    #
+    # Return:       value - Value echoed back by the controller in engineering units
+    # ----------------
+    def write(self, name, value):
+        read, write, scale = COMMANDS[name]
+        if write is None:
+            raise ValueError(name + " can not be written")
+        frame = build_frame(self.address, write, int(round(value * scale)))
+        echo = decode_reply(self.transport.transact(frame))
+        if scale == 1:
+            return echo
+        return echo / scale
+
+    # Commands used by the Modbus server and the main screen
+
+    def read_current_temp(self):
+        return self.read('current_temp')
+
+    def read_set_temp(self):
+        return self.read('set_temp')
+
+    def read_alarms(self):
+        return self.read('alarm_status')
+
+    def write_set_temp(self, set_temp):
+        return self.write('set_temp', set_temp)
@@ -0,0 +1,196 @@
+# --------------------------------
+# Written for the Cooler-Shaker System
+# Github: https://github.com/alopez505/cooler_shaker
+# --------------------------------
+#
+# --------------------------------
+# SimulatedTC36 stands in for the serial port connected to the "TE Tech TC-36-25-RS485" temperature controller
+#
+# It has the serial port functions used by TC36Transport (write, read, reset_input_buffer, timeout) and
+# answers each command frame (*AACCDDDDDDDDSS\r) with a reply frame (*DDDDDDDDSS^) like the controller:
+#   - commands for another address get no reply (the read times out)
+#   - commands with a wrong checksum or an unknown command code get 'XXXXXXXX' as data
+#   - write commands save the value and echo it back
+#
+# ThermalPlant is a simple model of the sample holder on the Peltier module:
+#
+#       dT/dt = (ambient - T) / tau + rate * output
+#
+#   output      - controller output, -1 (full cooling) to 1 (full heating)
+#   tau         - time constant of the heat leak to the room (s)
+#   rate        - temperature change at full output (C/s)
+#
+# The controller output is a PI loop using the proportional bandwidth and integral gain registers,
+# like the TC-36-25 in PID mode. The plant is advanced to the current time before every command.
+# --------------------------------
+import time
+
+from tc36_driver import COMMANDS, DEFAULT_ADDRESS
+
+MAX_STEP = 0.1          # longest model time step (s)
+MAX_CATCH_UP = 3600.0   # longest gap the model catches up on in one go (s)
+
+# Alarm status bits, see alarms.py
+ALARM_HIGH_TEMP = 0x01
+ALARM_LOW_TEMP = 0x02
+
+_reply_xxx = ('*XXXXXXXX%02x^' % (sum(b'XXXXXXXX') & 0xff)).encode()
+
+
+class ThermalPlant(object):
+
+    # ----------------
+    # Parameter:    temp - Starting temperature (C)
+    #               ambient - Room temperature (C)
+    #               tau - Time constant of the heat leak to the room (s)
+    #               rate - Temperature change at full output (C/s)
+    # ----------------
+    def __init__(self, temp=22.0, ambient=22.0, tau=600.0, rate=0.07):
+        self.temp = temp
+        self.ambient = ambient
+        self.tau = tau
+        self.rate = rate
+
+    # ----------------
+    # "step" advances the model by dt seconds with a constant output (-1 to 1)
+    # ----------------
+    def step(self, dt, output):
+        self.temp += ((self.ambient - self.temp) / self.tau + self.rate * output) * dt
+
+
+class SimulatedTC36(object):
+
+    # ----------------
+    # Parameter:    plant - ThermalPlant, None creates one at room temperature
+    #               address - Controller address as 2 hex characters
+    #               now - Clock used to advance the plant (s)
+    #               timeout - Read timeout, kept for TC36Transport, a missing reply returns right away
+    # ----------------
+    def __init__(self, plant=None, address=DEFAULT_ADDRESS, now=time.monotonic, timeout=1):
+        self.plant = plant or ThermalPlant()
+        self.address = address
+        self.now = now
+        self.timeout = timeout
+        self.last_time = now()
+        self.integral = 0.0
+        self.output = 0.0
+        self.frames = 0             # command frames received
+        self.bad_frames = 0         # frames answered with 'XXXXXXXX' or not answered
+        self._reply = b''
+        # Controller settings in engineering units, named like tc36_driver.COMMANDS
+        self.settings = {
+            'set_temp': 20.0,
+            'proportional_bandwidth': 5.0,
+            'integral_gain': 1.0,
+            'derivative_gain': 0.0,
+            'high_alarm': 50.0,
+            'low_alarm': 0.0,
+            'control_deadband': 0.0,
+            'input1_offset': 0.0,
+            'output_enable': 1,
+        }
+        self.reads = dict((read, name) for name, (read, write, scale) in COMMANDS.items() if read is not None)
+        self.writes = dict((write, name) for name, (read, write, scale) in COMMANDS.items() if write is not None)
+
+    # Serial port functions used by TC36Transport
+
+    def reset_input_buffer(self):
+        self._reply = b''
+
+    def write(self, frame):
+        self.frames += 1
+        self._reply = self.handle(bytes(frame))
+        return len(frame)
+
+    def read(self, size=1):
+        data = self._reply[:size]
+        self._reply = self._reply[size:]
+        return data
+
+    # ----------------
+    # "handle" answers one command frame
+    #
+    # Return:       reply - Reply frame as bytes, b'' when the controller would not answer
+    # ----------------
+    def handle(self, frame):
+        if len(frame) != 16 or frame[:1] != b'*' or frame[15:16] != b'\r':
+            self.bad_frames += 1
+            return b''
+        body = frame[1:13]
+        try:
+            address = body[0:2].decode()
+            command = body[2:4].decode()
+            data = int(body[4:12], 16)
+            checksum = int(frame[13:15], 16)
+        except ValueError:
+            self.bad_frames += 1
+            return _reply_xxx
+        if address != self.address:
+            self.bad_frames += 1
+            return b''
+        if checksum != sum(body) & 0xff:
+            self.bad_frames += 1
+            return _reply_xxx
+        if data & 0x80000000:
+            data -= 0x100000000
+        self.advance()
+        if command in self.writes:
+            name = self.writes[command]
+            self.settings[name] = data / float(COMMANDS[name][2]) if COMMANDS[name][2] != 1 else data
+            return self._frame(data)
+        if command in self.reads:
+            name = self.reads[command]
+            return self._frame(int(round(self.value(name) * COMMANDS[name][2])))
+        self.bad_frames += 1
+        return _reply_xxx
+
+    # ----------------
+    # "value" returns the value a read command reports, in engineering units
+    # ----------------
+    def value(self, name):
+        if name == 'current_temp':
+            return self.plant.temp + self.settings['input1_offset']
+        if name == 'desired_control':
+            return self.settings['set_temp']
+        if name == 'output_power':
+            return int(round(self.output * 511))
+        if name == 'alarm_status':
+            return self.alarms()
+        return self.settings[name]
+
+    def alarms(self):
+        temp = self.plant.temp + self.settings['input1_offset']
+        bits = 0
+        if temp > self.settings['high_alarm']:
+            bits |= ALARM_HIGH_TEMP
+        if temp < self.settings['low_alarm']:
+            bits |= ALARM_LOW_TEMP
+        return bits
+
+    # ----------------
+    # "advance" runs the PI controller and the plant up to the current time
+    # ----------------
+    def advance(self):
+        t = self.now()
+        elapsed = min(t - self.last_time, MAX_CATCH_UP)
+        self.last_time = t
+        settings = self.settings
+        while elapsed > 0:
+            dt = min(elapsed, MAX_STEP)
+            elapsed -= dt
+            if not settings['output_enable']:
+                self.output = 0.0
+            else:
+                error = settings['set_temp'] - (self.plant.temp + settings['input1_offset'])
+                if abs(error) <= settings['control_deadband']:
+                    error = 0.0
+                band = max(settings['proportional_bandwidth'], 0.01)
+                self.integral += error / band * settings['integral_gain'] / 60.0 * dt
+                self.integral = min(max(self.integral, -1.0), 1.0)
+                self.output = min(max(error / band + self.integral, -1.0), 1.0)
+            self.plant.step(dt, self.output)
+
+    @staticmethod
+    def _frame(value):
+        data = ('%08x' % (value & 0xffffffff)).encode()
+        return b'*' + data + ('%02x' % (sum(data) & 0xff)).encode() + b'^'
@@ -0,0 +1,58 @@
+# --------------------------------
+# Written for the Cooler-Shaker System
+# Github: https://github.com/alopez505/cooler_shaker
+# --------------------------------
+#
+# --------------------------------
+# tc36_transport sends whole frames to the "TE Tech TC-36-25-RS485" temperature controller
+#
+# Every command sent to the controller is a 16 character frame:    *AACCDDDDDDDDSS\r
+# Every reply from the controller is a 12 character frame:         *DDDDDDDDSS^
+# See TC-36-25-RS485 Manual for more info
+#
+# One round trip is one write of the full command frame and one read of the full reply frame.
+# The read is bounded by the serial port timeout, which pySerial applies to the whole read call,
+# so the timeout is the deadline for the complete reply and not for each byte.
+# --------------------------------
+import logging
+
+log = logging.getLogger(__name__)
+
+FRAME_SIZE = 16         # *AACCDDDDDDDDSS\r
+REPLY_SIZE = 12         # *DDDDDDDDSS^
+
+
+# ----------------
+# Raised when the controller does not answer with a full reply before the deadline
+# ----------------
+class TransportError(IOError):
+    pass
+
+
+class TC36Transport(object):
+
+    # ----------------
+    # Parameter:    port - Open serial port (serial.Serial or any object with write, read and reset_input_buffer)
+    #               timeout - Deadline in seconds for a full reply, None keeps the timeout already set on the port
+    # ----------------
+    def __init__(self, port, timeout=None):
+        self.port = port
+        if timeout is not None:
+            self.port.timeout = timeout
+
+    # ----------------
+    # "transact" sends one command frame and reads one reply frame
+    #
+    # Parameter:    frame - Complete command frame as bytes (b'*AACCDDDDDDDDSS\r')
+    #               reply_size - Number of bytes in the reply
+    #
+    # Return:       reply - Complete reply frame as bytes (b'*DDDDDDDDSS^')
+    # ----------------
+    def transact(self, frame, reply_size=REPLY_SIZE):
+        self.port.reset_input_buffer()      # drop late bytes left over from an earlier timeout
+        self.port.write(frame)
+        reply = self.port.read(reply_size)
+        if len(reply) != reply_size:
+            log.warning("Temperature controller reply timed out: " + repr(reply))
+            raise TransportError("expected %d byte reply, got %d bytes" % (reply_size, len(reply)))
+        return reply
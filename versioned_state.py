@@ -0,0 +1,49 @@
+# --------------------------------
+# Written for the Cooler-Shaker System
+# Github: https://github.com/alopez505/cooler_shaker
+# --------------------------------
+#
+# --------------------------------
+# VersionedState passes a group of values from one thread to another without waiting
+#
+# The writer thread publishes the whole group at once, the version number goes up every time the values change.
+# The reader thread reads the version and values together and compares the version with the last one it used,
+# so it always sees a complete and up to date group of values, and knows whether anything changed.
+# --------------------------------
+import threading
+
+
+class VersionedState(object):
+
+    # ----------------
+    # Parameter:    values - Initial values (version 0)
+    # ----------------
+    def __init__(self, values):
+        self._lock = threading.Lock()
+        self._version = 0
+        self._values = tuple(values)
+
+    # ----------------
+    # "publish" replaces the values, the version only goes up if the values are different
+    #
+    # Parameter:    values - New values
+    #
+    # Return:       version - Version of the values now stored
+    # ----------------
+    def publish(self, values):
+        values = tuple(values)
+        with self._lock:
+            if values != self._values:
+                self._values = values
+                self._version += 1
+            return self._version
+
+    # ----------------
+    # "read" returns the version and the values stored with it
+    #
+    # Return:       version - Version number
+    #               values - Tuple of values
+    # ----------------
+    def read(self):
+        with self._lock:
+            return self._version, self._values
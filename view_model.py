@@ -0,0 +1,89 @@
+# --------------------------------
+# Written for the Cooler-Shaker System
+# Github: https://github.com/alopez505/cooler_shaker
+# --------------------------------
+#
+# --------------------------------
+# view_model keeps the GUI from redrawing widgets whose value did not change
+#
+# Every setValue / setPalette / setText on a widget makes Qt repaint it, which is slow on the Pi's touchscreen.
+# The helpers here compare the new value with what is already shown and only touch the widget if it differs:
+#
+#   set_value       - spin boxes, compared with the value the spin box holds (after rounding to its decimals),
+#                     so a value typed in by the operator is never mistaken for the last value the program set
+#   set_index       - combo boxes, compared with the current index
+#   ShownState      - remembers the last value the program showed under a key, for widgets only the program
+#                     changes (alarm lights, alarm text)
+#
+# "solid_palette" builds a palette once so the same QPalette can be reused instead of rebuilt every update.
+# --------------------------------
+from PyQt5 import QtGui, QtCore
+
+_UNSET = object()
+
+
+# ----------------
+# "set_value" sets a spin box only if it shows a different value
+#
+# Return:       True if the spin box was changed
+# ----------------
+def set_value(spinbox, value):
+    decimals = getattr(spinbox, 'decimals', None)
+    if decimals is not None:
+        value = round(value, decimals())
+    if spinbox.value() == value:
+        return False
+    spinbox.setValue(value)
+    return True
+
+
+# ----------------
+# "set_index" sets a combo box only if a different item is selected
+#
+# Return:       True if the combo box was changed
+# ----------------
+def set_index(combobox, index):
+    if combobox.currentIndex() == index:
+        return False
+    combobox.setCurrentIndex(index)
+    return True
+
+
+class ShownState(object):
+
+    def __init__(self):
+        self.shown = {}
+
+    # ----------------
+    # "changed" records "value" under "key" and returns True if it differs from the value recorded before
+    # ----------------
+    def changed(self, key, value):
+        if self.shown.get(key, _UNSET) == value:
+            return False
+        self.shown[key] = value
+        return True
+
+    # ----------------
+    # "forget" makes the next "changed" call for key (or every key) return True
+    # ----------------
+    def forget(self, key=None):
+        if key is None:
+            self.shown.clear()
+        else:
+            self.shown.pop(key, None)
+
+
+# ----------------
+# "solid_palette" creates a palette with a solid colour for one colour role
+#
+# Parameter:    role - QPalette colour role (ex: QtGui.QPalette.Base)
+#               active - (r, g, b) used for the active and inactive states
+#               disabled - (r, g, b) used for the disabled state
+# ----------------
+def solid_palette(role, active, disabled):
+    palette = QtGui.QPalette()
+    for group, color in ((QtGui.QPalette.Active, active), (QtGui.QPalette.Inactive, active), (QtGui.QPalette.Disabled, disabled)):
+        brush = QtGui.QBrush(QtGui.QColor(*color))
+        brush.setStyle(QtCore.Qt.SolidPattern)
+        palette.setBrush(group, role, brush)
+    return palette